@@ -0,0 +1,242 @@
+# CDP/bet_indexer.py
+
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from eth_utils import keccak, to_checksum_address
+
+from CDP.bet_reader import BetReader, bet_reader
+from CDP.contract import contract_addr
+from config.config import redis_client, indexer_start_block, indexer_max_blocks, indexer_confirmations, \
+    indexer_poll_interval
+from utils.lease import Lease, decode as _decode
+from utils.metrics import timed
+
+# Topic of BetCreated(address indexed betAddress, address indexed initiator)
+BET_CREATED_TOPIC = "0x" + keccak(text="BetCreated(address,address)").hex()
+
+# Fields of a bet read through the bet reader
+_BET_FIELDS = ("message", "token", "minValue", "endTime", "judge")
+
+
+def message_key(message: str) -> str:
+    """Key of a bet message, ignoring case and whitespace."""
+    return hashlib.sha256(" ".join(message.split()).lower().encode("utf-8")).hexdigest()
+
+
+class BetEventIndexer:
+    """
+    Indexes the bets created by the factory from its BetCreated logs.
+
+    The logs are pulled with eth_getLogs over block ranges that halve when
+    the node rejects a range and double again after each successful one, up
+    to `max_blocks`. Each bet is enriched with its fields through the bet
+    reader and stored in Redis together with the last indexed block, so
+    indexing resumes where it stopped; a range whose bets cannot be read is
+    indexed again, and a bet stored without its fields (e.g. not opened yet)
+    is read again on lookup. Only blocks with `confirmations` confirmations
+    are indexed, so reorganizations do not leave stale bets.
+    When several processes run the indexer, a Redis lease elects the one
+    that pulls logs; every process keeps a local copy of the index for
+    lookups without a chain or Redis round trip.
+    """
+
+    def __init__(self, redis_client, reader: BetReader, factory: str, start_block: Optional[int] = None,
+                 max_blocks: int = 2000, confirmations: int = 5, poll_interval: float = 5, lease_ttl: int = 60,
+                 namespace: str = "csb_bet_index"):
+        """
+        Initialize the indexer.
+
+        Args:
+            redis_client: The async Redis client persisting the index and checkpoint.
+            reader (BetReader): Reads the chain and the fields of new bets.
+            factory (str): Address of the bet factory contract.
+            start_block (int): Block to start from without a checkpoint; the current head if None,
+                i.e. bets created before the first start are not backfilled.
+            max_blocks (int): Maximum number of blocks per eth_getLogs request.
+            confirmations (int): Blocks a log must be buried under before it is indexed.
+            poll_interval (float): Seconds between two polls once the index is caught up.
+            lease_ttl (int): Lifetime in seconds of the indexer lease.
+            namespace (str): Prefix of the Redis keys.
+        """
+        self.redis_client = redis_client
+        self.reader = reader
+        self.factory = to_checksum_address(factory)
+        self.start_block = start_block
+        self.max_blocks = max_blocks
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        self.checkpoint_key = f"{namespace}:checkpoint"
+        self.bets_key = f"{namespace}:bets"
+        self.messages_key = f"{namespace}:messages"
+        self.lease = Lease(redis_client, f"{namespace}:lease", ttl=lease_ttl)
+        self._range = max_blocks
+        self._bets: Dict[str, Dict] = {}
+        self._by_message: Dict[str, str] = {}
+        self._task = None
+
+    def __len__(self):
+        return len(self._bets)
+
+    async def start(self):
+        """Load the index and start indexing in the background."""
+        await self._sync()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop indexing and release the lease if this process holds it."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.lease.release()
+
+    async def get(self, address: str) -> Optional[Dict]:
+        """
+        Return an indexed bet, or None if it is not indexed (yet).
+
+        Args:
+            address (str): Address of the bet contract.
+        """
+        address = to_checksum_address(address)
+        bet = self._bets.get(address)
+        if bet is None:
+            # Indexed by another process since the last sync
+            raw = await self.redis_client.hget(self.bets_key, address)
+            if raw is not None:
+                bet = json.loads(raw)
+                self._add_local(bet)
+        if bet is not None and bet.get("message") is None:
+            bet = await self._refresh(bet)
+        return bet
+
+    async def _refresh(self, bet: Dict) -> Dict:
+        """Read the fields of a bet stored without them, saving them once available."""
+        try:
+            state = (await self.reader.get_bets([bet["address"]]))[0]
+        except Exception as e:
+            print(f"Failed to read bet {bet['address']}: {e}")
+            return bet
+        if state.get("message") is None:
+            return bet
+        bet = {**bet, **{field: state.get(field) for field in _BET_FIELDS}}
+        await self._save([bet])
+        return bet
+
+    async def find_by_message(self, message: str) -> Optional[Dict]:
+        """
+        Return the indexed bet created with this message, ignoring case and whitespace.
+        """
+        address = self._by_message.get(message_key(message))
+        if address is None:
+            address = _decode(await self.redis_client.hget(self.messages_key, message_key(message)))
+        return await self.get(address) if address else None
+
+    def _add_local(self, bet: Dict):
+        self._bets[bet["address"]] = bet
+        if bet.get("message"):
+            self._by_message[message_key(bet["message"])] = bet["address"]
+
+    async def _sync(self):
+        """Reload the local index when other processes added bets to it."""
+        if await self.redis_client.hlen(self.bets_key) == len(self._bets):
+            return
+        for raw in (await self.redis_client.hgetall(self.bets_key)).values():
+            self._add_local(json.loads(raw))
+
+    async def _run(self):
+        while True:
+            caught_up = True
+            try:
+                if await self.lease.hold():
+                    caught_up = await self._index_next()
+                else:
+                    await self._sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Bet indexer failed: {e}")
+            if caught_up:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _index_next(self) -> bool:
+        """
+        Index the next block range.
+
+        Returns:
+            bool: True once the index has caught up with the confirmed head.
+        """
+        head = int(await self.reader.rpc("eth_blockNumber", []), 16) - self.confirmations
+        checkpoint = await self.redis_client.get(self.checkpoint_key)
+        if checkpoint is None:
+            start = head if self.start_block is None else self.start_block
+            print(f"Bet indexer starts at block {start}")
+            checkpoint = start - 1
+            await self.redis_client.set(self.checkpoint_key, checkpoint)
+        from_block = int(checkpoint) + 1
+        if from_block > head:
+            return True
+
+        to_block = min(head, from_block + self._range - 1)
+        try:
+            with timed("rpc_get_logs"):
+                logs = await self.reader.rpc("eth_getLogs", [{
+                    "address": self.factory,
+                    "topics": [BET_CREATED_TOPIC],
+                    "fromBlock": hex(from_block),
+                    "toBlock": hex(to_block),
+                }])
+        except Exception as e:
+            if self._range == 1:
+                raise
+            # Most nodes cap the blocks or logs per request; retry with a smaller range
+            self._range = max(1, self._range // 2)
+            print(f"eth_getLogs rejected blocks {from_block}-{to_block}, retrying with {self._range} blocks: {e}")
+            return False
+
+        await self._store([log for log in logs if not log.get("removed")])
+        await self.redis_client.set(self.checkpoint_key, to_block)
+        self._range = min(self.max_blocks, self._range * 2)
+        return to_block >= head
+
+    async def _store(self, logs: List[Dict]):
+        if not logs:
+            return
+        bets = [{
+            "address": to_checksum_address("0x" + log["topics"][1][-40:]),
+            "initiator": to_checksum_address("0x" + log["topics"][2][-40:]),
+            "block": int(log["blockNumber"], 16),
+            "tx_hash": log["transactionHash"],
+        } for log in logs]
+
+        # Raises on failure, so the checkpoint stays before this range and it is indexed again
+        states = await self.reader.get_bets([bet["address"] for bet in bets])
+        for bet, state in zip(bets, states):
+            for field in _BET_FIELDS:
+                bet[field] = state.get(field)
+        await self._save(bets)
+        print(f"Indexed {len(bets)} new bet(s) up to block {bets[-1]['block']}")
+
+    async def _save(self, bets: List[Dict]):
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            for bet in bets:
+                pipe.hset(self.bets_key, bet["address"], json.dumps(bet))
+                if bet["message"]:
+                    pipe.hset(self.messages_key, message_key(bet["message"]), bet["address"])
+            await pipe.execute()
+        for bet in bets:
+            self._add_local(bet)
+
+
+# Indexer of the factory's bets, started by the FastAPI app
+bet_indexer = BetEventIndexer(
+    redis_client,
+    bet_reader,
+    contract_addr,
+    start_block=indexer_start_block,
+    max_blocks=indexer_max_blocks,
+    confirmations=indexer_confirmations,
+    poll_interval=indexer_poll_interval,
+)
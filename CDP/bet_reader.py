@@ -0,0 +1,223 @@
+# CDP/bet_reader.py
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+from config.config import redis_client, rpc_url, multicall_address, multicall_batch_size, bet_state_ttl
+from utils.cache import TieredCache
+from utils.http_clients import http_clients
+from utils.metrics import timed
+
+# Fields set when the bet is opened and never changed afterwards: signature and output type
+IMMUTABLE_FIELDS = {
+    "initiator": ("initiator()", "address"),
+    "token": ("token()", "address"),
+    "minValue": ("minValue()", "uint256"),
+    "message": ("message()", "string"),
+    "endTime": ("endTime()", "uint256"),
+    "judge": ("judge()", "address"),
+}
+
+# LazyBet.BetState
+BET_STATES = ("none", "open", "closed", "cancelled")
+_FINAL_STATES = (2, 3)
+
+_AGGREGATE3 = function_signature_to_4byte_selector("aggregate3((address,bool,bytes)[])")
+_STATE = function_signature_to_4byte_selector("state()")
+_PARTICIPANTS = function_signature_to_4byte_selector("participants(uint256)")
+_SELECTORS = {name: function_signature_to_4byte_selector(signature)
+              for name, (signature, _) in IMMUTABLE_FIELDS.items()}
+
+_ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+class BetReader:
+    """
+    Reads the state of many bet contracts with batched view calls.
+
+    Every call of a read is packed into Multicall3 `aggregate3` calls of at
+    most `batch_size` calls each, or sent as a JSON-RPC batch when no
+    Multicall3 address is configured (e.g. a local node without it). Fields
+    set when a bet is opened are cached forever; the state and participants
+    of an open bet are cached for `state_ttl` seconds, and forever once the
+    bet is closed or cancelled. The participants array has no length getter,
+    so it is read in pages until an index reverts.
+    """
+
+    def __init__(self, redis_client, rpc_url: str, multicall: Optional[str], batch_size: int = 200,
+                 state_ttl: int = 15, participants_page: int = 16):
+        """
+        Initialize the reader.
+
+        Args:
+            redis_client: The async Redis client backing the caches.
+            rpc_url (str): JSON-RPC endpoint of the chain.
+            multicall (str): Address of the Multicall3 contract, or None to send JSON-RPC batches.
+            batch_size (int): Maximum view calls per request.
+            state_ttl (int): Seconds the state and participants of an open bet are cached.
+            participants_page (int): Participant indexes probed per bet and round.
+        """
+        self.rpc_url = rpc_url
+        self.multicall = to_checksum_address(multicall) if multicall else None
+        self.batch_size = batch_size
+        self.state_ttl = state_ttl
+        self.participants_page = participants_page
+        self.static_cache = TieredCache("csb_bet_static", redis_client, maxsize=4096)
+        self.state_cache = TieredCache("csb_bet_state", redis_client, maxsize=4096)
+
+    async def _rpc(self, payload):
+        client = http_clients.async_client("rpc")
+        response = await client.post(self.rpc_url, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    async def rpc(self, method: str, params: list):
+        """
+        Send a JSON-RPC request to the chain and return its result.
+
+        Raises:
+            RuntimeError: If the node answers with an error.
+        """
+        reply = await self._rpc({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+        if "error" in reply:
+            raise RuntimeError(f"{method} failed: {reply['error']}")
+        return reply["result"]
+
+    async def _multicall(self, calls: List[Tuple[str, bytes]]) -> List[Tuple[bool, bytes]]:
+        data = _AGGREGATE3 + encode(["(address,bool,bytes)[]"], [[(to, True, data) for to, data in calls]])
+        result = await self.rpc("eth_call", [{"to": self.multicall, "data": "0x" + data.hex()}, "latest"])
+        (results,) = decode(["(bool,bytes)[]"], bytes.fromhex(result[2:]))
+        return [(success, return_data) for success, return_data in results]
+
+    async def _batch(self, calls: List[Tuple[str, bytes]]) -> List[Tuple[bool, bytes]]:
+        replies = await self._rpc([
+            {"jsonrpc": "2.0", "id": i, "method": "eth_call", "params": [{"to": to, "data": "0x" + data.hex()}, "latest"]}
+            for i, (to, data) in enumerate(calls)
+        ])
+        if not isinstance(replies, list):
+            raise RuntimeError(f"JSON-RPC batch failed: {replies.get('error', replies)}")
+        by_id = {reply.get("id"): reply for reply in replies}
+        results = []
+        for i in range(len(calls)):
+            reply = by_id.get(i, {})
+            result = reply.get("result")
+            results.append((result is not None and "error" not in reply,
+                            bytes.fromhex(result[2:]) if result else b""))
+        return results
+
+    async def call_many(self, calls: List[Tuple[str, bytes]]) -> List[Tuple[bool, bytes]]:
+        """
+        Run view calls in as few requests as possible; requests run concurrently.
+
+        Args:
+            calls (List[Tuple[str, bytes]]): Target address and call data of each call.
+
+        Returns:
+            list: Whether each call succeeded and its return data, in order.
+        """
+        call = self._multicall if self.multicall else self._batch
+        chunks = [calls[start:start + self.batch_size] for start in range(0, len(calls), self.batch_size)]
+        with timed("rpc_call"):
+            replies = await asyncio.gather(*(call(chunk) for chunk in chunks))
+        return [result for reply in replies for result in reply]
+
+    async def _read_static(self, addresses: List[str]) -> Dict[str, Optional[Dict]]:
+        calls = [(address, _SELECTORS[name]) for address in addresses for name in IMMUTABLE_FIELDS]
+        results = iter(await self.call_many(calls))
+        fields = {}
+        for address in addresses:
+            values = {}
+            for name, (_, output) in IMMUTABLE_FIELDS.items():
+                success, data = next(results)
+                values[name] = decode([output], data)[0] if success and data else None
+            if values["minValue"] is not None:
+                # Token amounts overflow JSON numbers in most clients
+                values["minValue"] = str(values["minValue"])
+            # Not a bet contract, or not opened yet
+            fields[address] = values if values["initiator"] not in (None, _ZERO_ADDRESS) else None
+        return fields
+
+    async def _read_state(self, addresses: List[str]) -> Dict[str, Optional[Dict]]:
+        results = await self.call_many([(address, _STATE) for address in addresses])
+        states = {
+            address: {"state": decode(["uint8"], data)[0], "participants": []} if success and data else None
+            for address, (success, data) in zip(addresses, results)
+        }
+
+        # Probe participant indexes page by page until one reverts past the end of the array
+        probing = [address for address in addresses if states[address] is not None]
+        while probing:
+            calls = [
+                (address, _PARTICIPANTS + encode(["uint256"], [len(states[address]["participants"]) + offset]))
+                for address in probing for offset in range(self.participants_page)
+            ]
+            results = iter(await self.call_many(calls))
+            next_probing = []
+            for address in probing:
+                page = [next(results) for _ in range(self.participants_page)]
+                for success, data in page:
+                    if not success or not data:
+                        break
+                    states[address]["participants"].append(decode(["address"], data)[0])
+                else:
+                    next_probing.append(address)
+            probing = next_probing
+        return states
+
+    async def get_bets(self, addresses: List[str]) -> List[Dict]:
+        """
+        Return the state of many bets, reading only what is not cached.
+
+        Args:
+            addresses (List[str]): Addresses of the bet contracts.
+
+        Returns:
+            list: One entry per address, in order, with the bet fields, its
+                state and participants, or an error if it is not an opened bet.
+        """
+        addresses = [to_checksum_address(address) for address in addresses]
+        unique = list(dict.fromkeys(addresses))
+        static = dict(zip(unique, await self.static_cache.get_many(unique)))
+        state = dict(zip(unique, await self.state_cache.get_many(unique)))
+
+        missing_static = [address for address in unique if static[address] is None]
+        missing_state = [address for address in unique if state[address] is None]
+        read_static, read_state = await asyncio.gather(self._read_static(missing_static),
+                                                       self._read_state(missing_state))
+        for address, fields in read_static.items():
+            static[address] = fields
+            if fields is not None:
+                await self.static_cache.set(address, fields)
+        for address, fields in read_state.items():
+            state[address] = fields
+            if fields is not None:
+                # Closed and cancelled bets no longer change
+                ttl = None if fields["state"] in _FINAL_STATES else self.state_ttl
+                await self.state_cache.set(address, fields, ttl=ttl)
+
+        bets = []
+        for address in addresses:
+            if static[address] is None or state[address] is None:
+                bets.append({"address": address, "error": "Not an opened bet contract"})
+                continue
+            bets.append({
+                "address": address,
+                **static[address],
+                "state": BET_STATES[state[address]["state"]] if state[address]["state"] < len(BET_STATES)
+                else state[address]["state"],
+                "participants": state[address]["participants"],
+                "error": None,
+            })
+        return bets
+
+    async def get_bet(self, address: str) -> Dict:
+        """Return the state of a single bet, see `get_bets`."""
+        return (await self.get_bets([address]))[0]
+
+
+# Reader shared by the API endpoints
+bet_reader = BetReader(redis_client, rpc_url, multicall_address or None, batch_size=multicall_batch_size,
+                       state_ttl=bet_state_ttl)
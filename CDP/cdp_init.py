@@ -1,4 +1,3 @@
-from cdp_langchain.utils import CdpAgentkitWrapper
 import json
 import os
 
@@ -11,7 +10,9 @@ cdp_api_key_name = os.getenv('CDP_API_KEY_NAME')
 cdp_api_key_private_key = os.getenv('CDP_API_KEY_PRIVATE_KEY')
 
 
-def init_cdp_agent_kit() -> CdpAgentkitWrapper:
+def init_cdp_agent_kit():
+    from cdp_langchain.utils import CdpAgentkitWrapper
+
     conf = {
         "api_key_name": cdp_api_key_name,
         "api_key_private_key": cdp_api_key_private_key,
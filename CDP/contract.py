@@ -1,4 +1,6 @@
 
+import threading
+
 from CDP.cdp_init import init_cdp_agent_kit
 
 factory_abi = [
@@ -585,8 +587,9 @@ abi = [
 	}
 ]
 
-cdp = init_cdp_agent_kit()
-agent_wallet = cdp.wallet
+# CDP AgentKit wrapper, loaded on first use since it reads or creates wallet.json through the CDP API
+_cdp = None
+_cdp_lock = threading.Lock()
 # contract_addr = '0xB93138dA9c65e85d6d97c795029F1D269d512b65'
 contract_addr = '0x11165e9afa37d76c6d032961c63d14ee8efd68c7'
 
@@ -595,8 +598,42 @@ contract_addr = '0x11165e9afa37d76c6d032961c63d14ee8efd68c7'
 #         contract_address=contract_address, contract_abi=abi, method=method, args=args)
 #     invocation.wait()
 
-def create_bet(message, token, min_value, judge, end_time):
-    args = {
+# ABIs addressable by name, e.g. from queued transactions
+abis = {
+    "factory": factory_abi,
+    "bet": abi,
+}
+
+
+def get_cdp():
+    """Return the shared CDP AgentKit wrapper, initializing it on the first call."""
+    global _cdp
+    with _cdp_lock:
+        if _cdp is None:
+            _cdp = init_cdp_agent_kit()
+    return _cdp
+
+
+def get_agent_wallet():
+    """Return the agent wallet that signs contract invocations."""
+    return get_cdp().wallet
+
+
+def wallet_id() -> str:
+    """Return the address of the agent wallet that signs contract invocations."""
+    return get_agent_wallet().default_address.address_id
+
+
+def invoke_contract(contract_address: str, abi_name: str, method: str, args: dict):
+    """
+    Invoke a contract method from the agent wallet and return the invocation.
+    """
+    return get_agent_wallet().invoke_contract(
+        contract_address=contract_address, abi=abis[abi_name], method=method, args=args)
+
+
+def create_bet_args(message, token, min_value, judge, end_time) -> dict:
+    return {
         '_message': message,
         '_token': token,
         '_minValue': str(min_value),
@@ -604,19 +641,8 @@ def create_bet(message, token, min_value, judge, end_time):
         '_endTime': str(end_time)
     }
 
-    invocation = agent_wallet.invoke_contract(
-        contract_address=contract_addr, abi=factory_abi, method='createBet', args=args)
-    print(invocation)
-    # res = invocation.wait()
 
-
-def set_bet_result(address: str, result: int):
-    args = {
+def set_bet_result_args(result: int) -> dict:
+    return {
         '_result': str(result)
     }
-
-    invocation = agent_wallet.invoke_contract(
-        contract_address=address, abi=abi, method='setResult', args=args)
-    # res = invocation.wait()
-    # print(res)
-
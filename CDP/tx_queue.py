@@ -0,0 +1,406 @@
+# CDP/tx_queue.py
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from eth_utils import function_signature_to_4byte_selector
+
+from CDP.bet_reader import BetReader, bet_reader
+from CDP.contract import invoke_contract, wallet_id, contract_addr, abis, create_bet_args, set_bet_result_args
+from config.config import redis_client, tx_confirm_workers, tx_max_attempts
+from utils.lease import Lease, decode as _decode
+from utils.metrics import timed, stage_duration
+
+TX_QUEUED = "queued"
+TX_SUBMITTING = "submitting"
+TX_SUBMITTED = "submitted"
+TX_CONFIRMED = "confirmed"
+TX_FAILED = "failed"
+# Sent or not, the chain no longer tells: the nonce was used but its transaction could not be found
+TX_UNKNOWN = "unknown"
+
+# Finished transactions are kept for a week so their status stays queryable
+FINISHED_TX_TTL = 7 * 24 * 60 * 60
+
+
+def _selector(abi_name: str, method: str) -> str:
+    """Hex call data prefix of a contract method."""
+    for entry in abis[abi_name]:
+        if entry.get("type") == "function" and entry["name"] == method:
+            types = ",".join(arg["type"] for arg in entry["inputs"])
+            return "0x" + function_signature_to_4byte_selector(f"{method}({types})").hex()
+    raise ValueError(f"Unknown method {method} in ABI {abi_name}")
+
+
+class TransactionQueue:
+    """
+    A Redis-backed queue of contract invocations submitted in the background.
+
+    Invocations of one wallet are submitted strictly in enqueue order by a
+    single submitter, so the wallet's nonces are consumed in order. When
+    several processes run the queue, a Redis lease elects the one process
+    that submits for the wallet.
+    Before each invocation the wallet's next nonce and the current block are
+    recorded with the `submitting` status. An attempt that did not return,
+    e.g. after a crash, is only sent again while its nonce is unused. Once
+    the nonce is used, the transaction that used it is looked up on chain:
+    the wallet is shared with the agent's toolkit, so it is only taken as
+    ours if it calls the same contract method. A transaction whose nonce
+    went to another one is queued again, and one that cannot be found is
+    marked `unknown` rather than guessed.
+    Submitted transactions are kept in a Redis set until their receipt is
+    found, so confirmations survive restarts; a transaction only fails once
+    it reverted or its nonce was used by another transaction.
+    Transient submission failures are retried in place with exponential backoff.
+    """
+
+    def __init__(self, redis_client, reader: BetReader, wallet: Optional[str] = None, confirm_workers: int = 4,
+                 max_attempts: int = 5, retry_base_delay: float = 2.0, confirm_interval: float = 3,
+                 lease_ttl: int = 120):
+        """
+        Initialize the queue.
+
+        Args:
+            redis_client: The async Redis client persisting the queue and statuses.
+            reader (BetReader): Reads nonces, blocks and receipts from the chain.
+            wallet (str): Address of the signing wallet; queues are kept per wallet.
+                Defaults to the agent wallet, looked up on first use.
+            confirm_workers (int): Number of receipts checked concurrently.
+            max_attempts (int): Submission attempts before a transaction is marked failed.
+            retry_base_delay (float): Backoff before the first retry, doubled on each attempt.
+            confirm_interval (float): Seconds between two checks of the submitted transactions.
+            lease_ttl (int): Lifetime in seconds of the submitter lease of the wallet.
+        """
+        self.redis_client = redis_client
+        self.reader = reader
+        self.wallet = None
+        self.confirm_workers = confirm_workers
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.confirm_interval = confirm_interval
+        self.lease_ttl = lease_ttl
+        if wallet is not None:
+            self._set_wallet(wallet)
+        self._leader = False
+        self._tasks = []
+        self._stopping = asyncio.Event()
+        self._failure_callbacks: List[Callable[[dict], Awaitable[None]]] = []
+
+    @staticmethod
+    def _tx_key(tx_id: str) -> str:
+        return f"csb_tx:{tx_id}"
+
+    def _set_wallet(self, wallet: str):
+        self.wallet = wallet
+        self.queue_key = f"csb_tx_queue:{wallet}"
+        self.processing_key = f"csb_tx_processing:{wallet}"
+        self.pending_key = f"csb_tx_pending:{wallet}"
+        self.lease = Lease(self.redis_client, f"csb_tx_submitter:{wallet}", ttl=self.lease_ttl)
+
+    def on_failed(self, callback: Callable[[dict], Awaitable[None]]):
+        """
+        Register a coroutine function called with the stored transaction each
+        time a transaction ends `failed`, in the process that submits it.
+        """
+        self._failure_callbacks.append(callback)
+
+    async def _fail(self, tx: dict, **fields):
+        await self._update(tx["id"], status=TX_FAILED, **fields)
+        for callback in self._failure_callbacks:
+            try:
+                await callback(tx)
+            except Exception as e:
+                print(f"Failure callback of transaction {tx['id']} failed: {e}")
+
+    async def _ensure_wallet(self):
+        # Loading the agent wallet calls the CDP API, so keep it off the event loop
+        if self.wallet is None:
+            self._set_wallet(await asyncio.to_thread(wallet_id))
+
+    async def enqueue(self, contract_address: str, abi_name: str, method: str, args: dict) -> str:
+        """
+        Persist a contract invocation and queue it for submission.
+
+        Returns:
+            str: The transaction id used to query its status.
+        """
+        await self._ensure_wallet()
+        tx_id = uuid.uuid4().hex
+        now = time.time()
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._tx_key(tx_id), mapping={
+                "id": tx_id,
+                "wallet": self.wallet,
+                "contract_address": contract_address,
+                "abi": abi_name,
+                "method": method,
+                "args": json.dumps(args),
+                "status": TX_QUEUED,
+                "attempts": 0,
+                "created_at": now,
+                "updated_at": now,
+            })
+            pipe.lpush(self.queue_key, tx_id)
+            await pipe.execute()
+        return tx_id
+
+    async def get(self, tx_id: str) -> Optional[dict]:
+        """
+        Return the stored state of a transaction, or None if it is unknown.
+        """
+        raw = await self.redis_client.hgetall(self._tx_key(tx_id))
+        if not raw:
+            return None
+        tx = {_decode(k): _decode(v) for k, v in raw.items()}
+        tx["args"] = json.loads(tx["args"])
+        tx["attempts"] = int(tx["attempts"])
+        tx["nonce"] = int(tx["nonce"]) if tx.get("nonce") else None
+        tx["sent_block"] = int(tx["sent_block"]) if tx.get("sent_block") else None
+        return tx
+
+    async def _update(self, tx_id: str, **fields):
+        fields["updated_at"] = time.time()
+        fields = {k: ("" if v is None else v) for k, v in fields.items()}
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._tx_key(tx_id), mapping=fields)
+            if fields.get("status") == TX_SUBMITTED:
+                pipe.zadd(self.pending_key, {tx_id: fields["updated_at"]})
+            if fields.get("status") in (TX_CONFIRMED, TX_FAILED, TX_UNKNOWN):
+                pipe.expire(self._tx_key(tx_id), FINISHED_TX_TTL)
+                pipe.zrem(self.pending_key, tx_id)
+            await pipe.execute()
+
+    async def _nonce(self, block: str = "pending") -> int:
+        """Return the number of transactions sent by the wallet up to `block`."""
+        return int(await self.reader.rpc("eth_getTransactionCount", [self.wallet, block]), 16)
+
+    async def _find_mined(self, tx: dict) -> Optional[Dict]:
+        """
+        Return the mined transaction of the wallet that used the nonce of `tx`,
+        or None if it is not mined yet or cannot be found.
+
+        The nonce was unused when `sent_block` was recorded, so the block that
+        used it is found by bisecting the wallet's nonce over the later blocks.
+        """
+        nonce, low = tx["nonce"], tx["sent_block"]
+        if nonce is None or low is None:
+            return None
+        high = int(await self.reader.rpc("eth_blockNumber", []), 16)
+        if await self._nonce(hex(high)) <= nonce:
+            return None
+        while high - low > 1:
+            middle = (low + high) // 2
+            if await self._nonce(hex(middle)) > nonce:
+                high = middle
+            else:
+                low = middle
+        block = await self.reader.rpc("eth_getBlockByNumber", [hex(high), True])
+        for mined in block["transactions"]:
+            if mined["from"].lower() == self.wallet.lower() and int(mined["nonce"], 16) == nonce:
+                return mined
+        return None
+
+    @staticmethod
+    def _is_ours(tx: dict, mined: Dict) -> bool:
+        """Whether the transaction that used the nonce of `tx` is `tx` itself."""
+        if tx.get("tx_hash"):
+            return mined["hash"].lower() == tx["tx_hash"].lower()
+        return ((mined.get("to") or "").lower() == tx["contract_address"].lower()
+                and mined.get("input", "").lower().startswith(_selector(tx["abi"], tx["method"])))
+
+    async def start(self):
+        """
+        Start the submitter and confirmation workers.
+        """
+        await self._ensure_wallet()
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._submit_loop()), asyncio.create_task(self._confirm_loop())]
+
+    async def stop(self):
+        """
+        Stop the workers. Queued transactions stay in Redis for the next start.
+        """
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._leader = False
+        # Hand the wallet over to another process right away
+        if self.wallet is not None:
+            await self.lease.release()
+
+    async def _acquire_lease(self) -> bool:
+        """
+        Hold the wallet's submitter lease. A fresh leader first recovers the
+        transactions its predecessor left in the processing list.
+        """
+        if await self.lease.renew():
+            return True
+        if not await self.lease.acquire():
+            return False
+        # The predecessor stopped while handling these; put them back at the head of the
+        # queue, `_submit` then checks the chain before sending any of them again
+        while await self.redis_client.lmove(self.processing_key, self.queue_key, "RIGHT", "RIGHT"):
+            pass
+        return True
+
+    async def _keep_lease(self, tx_id: str) -> bool:
+        """
+        Renew the lease while a transaction is being submitted. Returns False,
+        and gives up the transaction, if another process took the wallet over;
+        the new leader recovers it from the processing list.
+        """
+        self._leader = await self.lease.renew()
+        if not self._leader:
+            print(f"Lost the submitter lease of wallet {self.wallet}, leaving transaction {tx_id} to the new leader")
+        return self._leader
+
+    async def _submit_loop(self):
+        while not self._stopping.is_set():
+            try:
+                self._leader = await self._acquire_lease()
+                if not self._leader:
+                    await asyncio.sleep(5)
+                    continue
+                tx_id = await self.redis_client.blmove(
+                    self.queue_key, self.processing_key, 1, src="RIGHT", dest="LEFT")
+                if tx_id is None:
+                    continue
+                await self._submit(_decode(tx_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Transaction submitter error: {e}")
+                await asyncio.sleep(1)
+
+    async def _submit(self, tx_id: str):
+        tx = await self.get(tx_id)
+        if tx is None or tx["status"] not in (TX_QUEUED, TX_SUBMITTING):
+            # Unknown, or already submitted before a restart interrupted the cleanup
+            await self.redis_client.lrem(self.processing_key, 0, tx_id)
+            return
+
+        attempts = tx["attempts"]
+        # Nonce of the last attempt, which may have been sent even if it did not return
+        sending = tx["nonce"] if tx["status"] == TX_SUBMITTING else None
+        while True:
+            if not await self._keep_lease(tx_id):
+                return
+            try:
+                # The last attempt may have gone out; `_confirm` finds out which transaction used its nonce
+                if sending is not None and await self._nonce() > sending:
+                    print(f"Nonce {sending} of transaction {tx_id} was used, waiting to see by which transaction")
+                    await self._update(tx_id, status=TX_SUBMITTED, submitted_at=time.time())
+                    break
+                if attempts >= self.max_attempts:
+                    await self._fail(tx)
+                    break
+                attempts += 1
+                sent_block = int(await self.reader.rpc("eth_blockNumber", []), 16)
+                sending = await self._nonce()
+                await self._update(tx_id, status=TX_SUBMITTING, attempts=attempts, nonce=sending,
+                                   sent_block=sent_block)
+                with timed("contract_call"):
+                    invocation = await asyncio.to_thread(
+                        invoke_contract, tx["contract_address"], tx["abi"], tx["method"], tx["args"])
+            except Exception as e:
+                print(f"Attempt {attempts} to submit transaction {tx_id} failed: {e}")
+                await self._update(tx_id, error=str(e))
+                if not await self._keep_lease(tx_id):
+                    return
+                # Retry in place so later transactions of this wallet keep their order
+                await asyncio.sleep(self.retry_base_delay * 2 ** max(attempts - 1, 0))
+                continue
+
+            await self._update(tx_id, status=TX_SUBMITTED, error=None, submitted_at=time.time(),
+                               tx_hash=getattr(invocation, "transaction_hash", None),
+                               tx_link=getattr(invocation, "transaction_link", None))
+            break
+
+        await self.redis_client.lrem(self.processing_key, 0, tx_id)
+
+    async def _confirm_loop(self):
+        semaphore = asyncio.Semaphore(self.confirm_workers)
+
+        async def check(tx_id: str):
+            async with semaphore:
+                try:
+                    await self._confirm(tx_id)
+                except Exception as e:
+                    print(f"Failed to check transaction {tx_id}: {e}")
+
+        while True:
+            await asyncio.sleep(self.confirm_interval)
+            if not self._leader:
+                continue
+            try:
+                tx_ids = await self.redis_client.zrange(self.pending_key, 0, -1)
+            except Exception as e:
+                print(f"Failed to load pending transactions: {e}")
+                continue
+            await asyncio.gather(*(check(_decode(tx_id)) for tx_id in tx_ids))
+
+    async def _confirm(self, tx_id: str):
+        tx = await self.get(tx_id)
+        if tx is None or tx["status"] != TX_SUBMITTED:
+            await self.redis_client.zrem(self.pending_key, tx_id)
+            return
+        if tx.get("tx_hash") and await self._finish(tx, tx["tx_hash"]):
+            return
+        if tx["nonce"] is None or await self._nonce("latest") <= tx["nonce"]:
+            # Not mined yet; a transaction only fails once it reverted or its nonce went to another one
+            return
+
+        mined = await self._find_mined(tx)
+        if mined is None:
+            await self._update(tx_id, status=TX_UNKNOWN,
+                               error=f"Nonce {tx['nonce']} was used but its transaction was not found")
+        elif self._is_ours(tx, mined):
+            if not tx.get("tx_hash"):
+                await self._finish(tx, mined["hash"])
+        elif tx.get("tx_hash"):
+            await self._fail(tx, error=f"Dropped, nonce {tx['nonce']} was used by {mined['hash']}")
+        else:
+            # The attempt never went out; send it again ahead of the queue
+            print(f"Nonce {tx['nonce']} of transaction {tx_id} was used by {mined['hash']}, queueing it again")
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.hset(self._tx_key(tx_id), mapping={
+                    "status": TX_QUEUED,
+                    "nonce": "",
+                    "error": f"Nonce {tx['nonce']} was used by {mined['hash']}",
+                    "updated_at": time.time(),
+                })
+                pipe.zrem(self.pending_key, tx_id)
+                pipe.rpush(self.queue_key, tx_id)
+                await pipe.execute()
+
+    async def _finish(self, tx: dict, tx_hash: str) -> bool:
+        """Record the outcome of a mined transaction. Returns False if it has no receipt yet."""
+        receipt = await self.reader.rpc("eth_getTransactionReceipt", [tx_hash])
+        if receipt is None:
+            return False
+        submitted_at = float(tx.get("submitted_at") or tx["updated_at"])
+        stage_duration.observe(time.time() - submitted_at, stage="contract_confirm")
+        if int(receipt["status"], 16) == 1:
+            await self._update(tx["id"], status=TX_CONFIRMED, tx_hash=tx_hash)
+        else:
+            await self._fail(tx, tx_hash=tx_hash, error="Transaction reverted")
+        return True
+
+    async def enqueue_create_bet(self, message, token, min_value, judge, end_time) -> str:
+        """Queue a `createBet` call on the bet factory."""
+        args = create_bet_args(message, token, min_value, judge, end_time)
+        return await self.enqueue(contract_addr, "factory", "createBet", args)
+
+    async def enqueue_set_bet_result(self, address: str, result: int) -> str:
+        """Queue a `setResult` call on a bet contract."""
+        return await self.enqueue(address, "bet", "setResult", set_bet_result_args(result))
+
+
+# Background submitter for the agent wallet, started by the FastAPI app
+tx_queue = TransactionQueue(redis_client, bet_reader, confirm_workers=tx_confirm_workers,
+                            max_attempts=tx_max_attempts)
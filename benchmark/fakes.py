@@ -0,0 +1,337 @@
+# benchmark/fakes.py
+
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List, Optional
+
+from llm.prefilter import _has_date, _BINARY_PATTERN
+
+
+class FakeServiceError(Exception):
+    """Error injected by a fake service."""
+
+
+class LatencyModel:
+    """
+    Log-normal latency with a given median and p99, plus a random error rate.
+    """
+
+    def __init__(self, median_ms: float, p99_ms: Optional[float] = None, error_rate: float = 0.0,
+                 rng: Optional[random.Random] = None):
+        """
+        Initialize the model.
+
+        Args:
+            median_ms (float): Median latency in milliseconds.
+            p99_ms (float): 99th percentile latency in milliseconds (defaults to the median, i.e. constant).
+            error_rate (float): Probability that a call fails with `FakeServiceError`.
+            rng (random.Random): Random source, seeded by the harness for reproducible runs.
+        """
+        self.median_ms = median_ms
+        self.p99_ms = max(p99_ms or median_ms, median_ms)
+        self.error_rate = error_rate
+        self.rng = rng or random.Random()
+        # z-score of the 99th percentile of the standard normal distribution
+        self.sigma = math.log(self.p99_ms / median_ms) / 2.326 if median_ms > 0 else 0.0
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def parse(cls, spec: str, rng: Optional[random.Random] = None) -> "LatencyModel":
+        """Build a model from a "median_ms[,p99_ms[,error_rate]]" string."""
+        values = [float(v) for v in spec.split(",")]
+        return cls(*values, rng=rng)
+
+    def _sample(self) -> float:
+        self.calls += 1
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise FakeServiceError("Injected fake service error")
+        if self.median_ms <= 0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(self.median_ms), self.sigma) / 1000
+
+    async def wait(self):
+        """Sleep for a sampled latency, or raise an injected error."""
+        await asyncio.sleep(self._sample())
+
+    def wait_sync(self):
+        """Blocking version of `wait`, for fakes called from worker threads."""
+        time.sleep(self._sample())
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _extract_description(query: str) -> str:
+    for marker in ('Description: "', 'Market Description: "'):
+        start = query.find(marker)
+        if start != -1:
+            start += len(marker)
+            return query[start:query.find('"', start)]
+    return query
+
+
+def _fake_extraction(description: str) -> dict:
+    """Deterministic stand-in for the LLM extraction of a market description."""
+    has_due_date = _has_date(description)
+    has_two_outcomes = bool(_BINARY_PATTERN.search(description))
+    due_date = (datetime.now() + timedelta(days=30)).replace(microsecond=0).isoformat() if has_due_date else None
+    return {
+        "has_due_date": has_due_date,
+        "due_date": due_date,
+        "has_two_outcomes": has_two_outcomes,
+        "outcomes": ["Yes", "No"] if has_two_outcomes else [],
+    }
+
+
+class FakeAgentExecutor:
+    """
+    Stand-in for the LangGraph agent: answers the extraction prompt with JSON
+    and the verdict prompt with "true"/"false".
+    """
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+
+    async def astream(self, inputs: dict, stream_mode="values"):
+        query = inputs["messages"][-1][1]
+        await self.latency.wait()
+        if "Relevant Information" in query:
+            content = "true" if "impossible" not in query.lower() else "false"
+        else:
+            content = json.dumps(_fake_extraction(_extract_description(query)))
+        message = SimpleNamespace(content=content, usage_metadata={
+            "input_tokens": _estimate_tokens(query),
+            "output_tokens": _estimate_tokens(content),
+        })
+        state = {"messages": [SimpleNamespace(content=query, usage_metadata=None), message]}
+        if isinstance(stream_mode, str):
+            yield state
+            return
+        # Several modes: (mode, chunk) pairs, with the tokens before the final state
+        if "messages" in stream_mode:
+            for token in re.findall(r"\S+\s*", content):
+                yield "messages", (SimpleNamespace(type="AIMessageChunk", content=token), {})
+        yield "values", state
+
+
+class _FakeStructuredModel:
+    def __init__(self, latency: LatencyModel, schema, include_raw: bool):
+        self.latency = latency
+        self.schema = schema
+        self.include_raw = include_raw
+
+    async def ainvoke(self, query: str):
+        await self.latency.wait()
+        if "judgments" in self.schema.model_fields:
+            # Bet judging: every bet of the batch is decided from the first evidence document
+            fields = {"judgments": [
+                {"bet": int(number), "outcome": "yes", "confidence": 0.9, "sources": ["E1"],
+                 "reasoning": "The evidence shows the target was reached."}
+                for number in re.findall(r"Bet (\d+):", query)
+            ]}
+        elif "markets" in self.schema.model_fields:
+            # Bulk validation: every numbered market of the batch is analyzed
+            fields = {"markets": [
+                {**_fake_extraction(description), "market": int(number),
+                 "is_valid": "impossible" not in description.lower()}
+                for number, description in re.findall(r'Market (\d+): "([^"]*)"', query)
+            ]}
+        else:
+            fields = _fake_extraction(_extract_description(query))
+            if "is_valid" in self.schema.model_fields:
+                fields["is_valid"] = "impossible" not in query.lower()
+        parsed = self.schema(**fields)
+        if not self.include_raw:
+            return parsed
+        raw = SimpleNamespace(content=parsed.model_dump_json(), usage_metadata={
+            "input_tokens": _estimate_tokens(query),
+            "output_tokens": _estimate_tokens(parsed.model_dump_json()),
+        })
+        return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+
+class FakeChatModel:
+    """Stand-in for `ChatOpenAI` supporting `with_structured_output(...).ainvoke(...)`."""
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+
+    def with_structured_output(self, schema, include_raw: bool = False):
+        return _FakeStructuredModel(self.latency, schema, include_raw)
+
+
+class _FakeEmbeddings:
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+
+    async def create(self, model: str, input: List[str], dimensions: int = 256, **kwargs):
+        await self.latency.wait()
+        data = []
+        for text in input:
+            # Hashed bag of words: paraphrases sharing most words come out similar
+            vector = [0.0] * dimensions
+            for word in re.findall(r"\w+", text.lower()):
+                vector[zlib.crc32(word.encode("utf-8")) % dimensions] += 1.0
+            data.append(SimpleNamespace(embedding=vector))
+        tokens = sum(_estimate_tokens(text) for text in input)
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+class FakeOpenAIClient:
+    """Stand-in for `AsyncOpenAI` supporting `embeddings.create(...)`."""
+
+    def __init__(self, latency: LatencyModel):
+        self.embeddings = _FakeEmbeddings(latency)
+
+
+class FakeTavilyClient:
+    """Stand-in for `TavilyClient` / `AsyncTavilyClient`; `search` is sync or async to match."""
+
+    def __init__(self, latency: LatencyModel, asynchronous: bool = True, results: int = 5):
+        self.latency = latency
+        self.asynchronous = asynchronous
+        self.results = results
+
+    def _response(self, query: str) -> dict:
+        return {"results": [
+            {
+                "title": f"Result {i} for {query[:40]}",
+                "url": f"https://example.com/{uuid.uuid4().hex[:8]}",
+                "content": f"Analysts expect prices to rise above the target; {query} " * 3,
+            }
+            for i in range(self.results)
+        ]}
+
+    def search(self, query: str, search_depth: str = "basic", **kwargs):
+        if self.asynchronous:
+            return self._asearch(query)
+        self.latency.wait_sync()
+        return self._response(query)
+
+    async def _asearch(self, query: str):
+        await self.latency.wait()
+        return self._response(query)
+
+    async def extract(self, urls: List[str]):
+        await self.latency.wait()
+        return {"results": [{"url": url, "raw_content": f"Contents of {url}: the target was reached."}
+                            for url in urls], "failed_results": []}
+
+
+class FakeInvocation:
+    """Stand-in for a CDP `ContractInvocation`."""
+
+    def __init__(self, confirm_latency: LatencyModel):
+        self.confirm_latency = confirm_latency
+        self.transaction_hash = "0x" + uuid.uuid4().hex * 2
+        self.transaction_link = f"https://sepolia.basescan.org/tx/{self.transaction_hash}"
+        self.status = "broadcast"
+
+    def wait(self, interval_seconds: float = 0.2, timeout_seconds: float = 20):
+        self.confirm_latency.wait_sync()
+        self.status = "complete"
+        return self
+
+
+class FakeWallet:
+    """Stand-in for the CDP wallet; contract calls are made from worker threads."""
+
+    def __init__(self, submit_latency: LatencyModel, confirm_latency: LatencyModel):
+        self.submit_latency = submit_latency
+        self.confirm_latency = confirm_latency
+        self.default_address = SimpleNamespace(address_id="0x00000000000000000000000000000000000bE4c1")
+        self.invocations = 0
+
+    def invoke_contract(self, contract_address: str, method: str, abi=None, args=None, **kwargs):
+        self.submit_latency.wait_sync()
+        self.invocations += 1
+        return FakeInvocation(self.confirm_latency)
+
+
+class _FakeResult(list):
+    """A page of twikit results with an awaitable `next` page, like `twikit.utils.Result`."""
+
+    def __init__(self, items: List, pages: List[List]):
+        super().__init__(items)
+        self.next = self._fetch_next if pages else None
+        self._pages = pages
+        self._latency = None
+
+    async def _fetch_next(self):
+        await self._latency.wait()
+        return _FakeResult.page(self._pages, self._latency)
+
+    @classmethod
+    def page(cls, pages: List[List], latency: LatencyModel) -> "_FakeResult":
+        result = cls(pages[0], pages[1:])
+        result._latency = latency
+        return result
+
+
+class FakeTwitterClient:
+    """
+    Stand-in for the twikit `Client` serving a fixed timeline of tweets, each
+    with `replies_per_tweet` replies split into pages of `page_size`.
+    """
+
+    def __init__(self, latency: LatencyModel, corpus: List[str], tweets: int = 10,
+                 replies_per_tweet: int = 20, page_size: int = 20):
+        self.latency = latency
+        self.run_id = uuid.uuid4().hex[:8]
+        now = datetime.now()
+        self.tweets = {}
+        for t in range(tweets):
+            tweet_id = f"bench-{self.run_id}-{t}"
+            replies = [
+                SimpleNamespace(
+                    id=f"{tweet_id}-{r}",
+                    full_text=f"@CryptoSageAI {corpus[(t * replies_per_tweet + r) % len(corpus)]}",
+                    created_at_datetime=now - timedelta(seconds=r),
+                )
+                for r in range(replies_per_tweet)
+            ]
+            pages = [replies[i:i + page_size] for i in range(0, len(replies), page_size)] or [[]]
+            self.tweets[tweet_id] = (SimpleNamespace(id=tweet_id, text=f"Benchmark tweet {t}"), pages)
+        self.posted = 0
+
+    @property
+    def total_replies(self) -> int:
+        return sum(len(page) for _, pages in self.tweets.values() for page in pages)
+
+    async def login(self, **kwargs):
+        return None
+
+    def load_cookies(self, path):
+        return None
+
+    def set_cookies(self, cookies):
+        return None
+
+    async def get_user_tweets(self, user_id, tweet_type, count: int = 40):
+        await self.latency.wait()
+        return [tweet for tweet, _ in self.tweets.values()]
+
+    async def get_tweet_by_id(self, tweet_id):
+        await self.latency.wait()
+        tweet, pages = self.tweets[tweet_id]
+        return SimpleNamespace(id=tweet.id, text=tweet.text, replies=_FakeResult.page(pages, self.latency))
+
+    async def upload_media(self, path):
+        await self.latency.wait()
+        return uuid.uuid4().hex
+
+    async def create_tweet(self, text: str = "", media_ids=None, **kwargs):
+        await self.latency.wait()
+        self.posted += 1
+        return SimpleNamespace(id=uuid.uuid4().hex, text=text)
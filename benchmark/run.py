@@ -0,0 +1,299 @@
+# benchmark/run.py
+
+"""
+Offline throughput benchmark.
+
+Replays a corpus of market descriptions through /validate_market, /judge_bet
+and the reply loop with OpenAI, Tavily, the CDP wallet and the twikit client
+replaced by in-process fakes with configurable latency and error rates, and
+reports p50/p99 latency and requests per second for each scenario. Only a
+local Redis is needed; benchmark data goes to REDIS_DB 15 unless set.
+
+    python -m benchmark.run --requests 200 --concurrency 16 --llm 800,2500,0.01
+    python -m benchmark.run --output bench.json --baseline main.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+SCENARIOS = ("validate_market", "judge_bet", "reply_loop")
+
+BENCH_ADDRESS = "0x000000000000000000000000000000000000bE7c"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of `values`, `q` in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    """Summarize the latencies (in seconds) of one scenario."""
+    count = len(latencies) + errors
+    return {
+        "requests": count,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "rps": round(count / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def load_corpus(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def install_fakes(args, rng: random.Random):
+    """
+    Import the app with every external service replaced by a fake.
+
+    The shared clients are created on first use, so the fakes are installed
+    in their place right after the import.
+
+    Returns:
+        tuple: The imported `main` module, the fake Twitter client and the latency model of each service.
+    """
+    from benchmark.fakes import (LatencyModel, FakeAgentExecutor, FakeChatModel, FakeOpenAIClient,
+                                 FakeTavilyClient, FakeWallet, FakeTwitterClient)
+
+    os.environ.setdefault("REDIS_DB", str(args.redis_db))
+    os.environ["VALIDATION_MODE"] = args.mode
+    # The bet indexer would poll the real chain
+    os.environ["INDEXER_ENABLED"] = "false"
+
+    llm_latency = LatencyModel.parse(args.llm, rng)
+    search_latency = LatencyModel.parse(args.tavily, rng)
+    twitter_latency = LatencyModel.parse(args.twitter, rng)
+    wallet = FakeWallet(LatencyModel.parse(args.cdp_submit, rng), LatencyModel.parse(args.cdp_confirm, rng))
+
+    import main
+    import CDP.contract
+    import config.config
+    import llm.dedupe
+    import llm.judge
+    import llm.validate
+    import twitter.client
+    import twitter.tweet
+    from utils.cache import TieredCache
+    from utils.rate_limiter import RateLimiter
+    from utils.tavily_search import search_util
+
+    CDP.contract._cdp = SimpleNamespace(wallet=wallet)
+    config.config._agent_executor = FakeAgentExecutor(llm_latency)
+    config.config._llm = FakeChatModel(llm_latency)
+    config.config._openai_client = FakeOpenAIClient(llm_latency)
+
+    search_util.client = FakeTavilyClient(search_latency, asynchronous=False)
+    search_util.async_client = FakeTavilyClient(search_latency)
+
+    twitter_client = FakeTwitterClient(twitter_latency, load_corpus(args.corpus), tweets=args.tweets,
+                                       replies_per_tweet=args.replies_per_tweet, page_size=args.page_size)
+    twitter.client._client = twitter_client
+    if not args.twitter_budgets:
+        twitter.client.twitter_limiter = RateLimiter({}, default_budget=(10 ** 9, 1))
+
+    if not args.with_cache:
+        llm.validate.validation_cache = TieredCache("csb_bench_validation", None, maxsize=0)
+        llm.judge.evidence_cache = TieredCache("csb_bench_evidence", None, maxsize=0)
+        search_util.cache = None
+        llm.validate.semantic_dedupe_enabled = False
+        twitter.tweet.semantic_dedupe_enabled = False
+    # Semantic indexes stay in memory so benchmark markets never reach the shared ones
+    llm.dedupe.market_index.redis_client = None
+    llm.dedupe.bet_index.redis_client = None
+
+    fakes = {
+        "llm": llm_latency,
+        "tavily": search_latency,
+        "twitter": twitter_latency,
+        "cdp_submit": wallet.submit_latency,
+        "cdp_confirm": wallet.confirm_latency,
+    }
+    return main, twitter_client, fakes
+
+
+async def run_requests(http, path: str, payloads: List[Dict], concurrency: int) -> Dict:
+    """
+    Send every payload to `path` with `concurrency` closed-loop clients.
+    """
+    latencies, errors = [], 0
+    pending = iter(payloads)
+
+    async def client():
+        nonlocal errors
+        for payload in pending:
+            started = time.perf_counter()
+            try:
+                response = await http.post(path, json=payload)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors += 1
+                print(f"{path} failed: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_reply_loop(twitter_client, workers: int, timeout: float) -> Dict:
+    """
+    Validate every reply of the fake timeline through the reply pipeline.
+    """
+    import twitter.tweet
+
+    total = twitter_client.total_replies
+    latencies, errors = [], 0
+    done = asyncio.Event()
+    validate_reply = twitter.tweet._validate_reply
+
+    async def timed_validate_reply(full_text: str):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            await validate_reply(full_text)
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            errors += 1
+            raise
+        finally:
+            if len(latencies) + errors >= total:
+                done.set()
+
+    twitter.tweet._validate_reply = timed_validate_reply
+    stop_event = asyncio.Event()
+    started = time.perf_counter()
+    task = asyncio.create_task(
+        twitter.tweet.fetch_and_validate_replies("benchmark", stop_event, workers=workers))
+    try:
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        print(f"Reply loop timed out after {timeout}s with {len(latencies) + errors}/{total} replies validated")
+    elapsed = time.perf_counter() - started
+    stop_event.set()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    twitter.tweet._validate_reply = validate_reply
+    return summarize(latencies, errors, elapsed)
+
+
+async def run_benchmark(args) -> Dict:
+    rng = random.Random(args.seed)
+    main, twitter_client, fakes = install_fakes(args, rng)
+    import httpx
+
+    corpus = load_corpus(args.corpus)
+    descriptions = [corpus[i % len(corpus)] for i in range(args.requests)]
+    results = {}
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as http:
+            if "validate_market" in args.scenarios:
+                results["validate_market"] = await run_requests(
+                    http, "/validate_market", [{"description": d} for d in descriptions], args.concurrency)
+            if "judge_bet" in args.scenarios:
+                results["judge_bet"] = await run_requests(
+                    http, "/judge_bet", [{"description": d, "urls": [], "address": BENCH_ADDRESS}
+                                         for d in descriptions], args.concurrency)
+        if "reply_loop" in args.scenarios:
+            results["reply_loop"] = await run_reply_loop(twitter_client, args.reply_workers, args.timeout)
+
+    return {
+        "results": results,
+        "fake_calls": {name: {"calls": model.calls, "errors": model.errors} for name, model in fakes.items()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("baseline", "output")},
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{'scenario':<16}{'requests':>10}{'errors':>8}{'p50_ms':>10}{'p99_ms':>10}{'mean_ms':>10}{'req/s':>10}")
+    for name, r in report["results"].items():
+        print(f"{name:<16}{r['requests']:>10}{r['errors']:>8}{r['p50_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['mean_ms']:>10}{r['rps']:>10}")
+    print()
+
+
+def find_regressions(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """
+    Compare a report with a baseline report; p99 latency may grow and
+    throughput may drop by at most `max_regression` (a fraction).
+    """
+    regressions = []
+    for name, current in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        if previous["p99_ms"] and current["p99_ms"] > previous["p99_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p99 {previous['p99_ms']}ms -> {current['p99_ms']}ms")
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - max_regression):
+            regressions.append(f"{name}: throughput {previous['rps']} -> {current['rps']} req/s")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark CryptoSage offline against fake services.")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run: {', '.join(SCENARIOS)} (default: all).")
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(__file__), "markets.txt"),
+                        help="Market descriptions, one per line.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint scenario.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients per endpoint scenario.")
+    parser.add_argument("--mode", choices=("agent", "lean"), default="agent", help="VALIDATION_MODE to benchmark.")
+    parser.add_argument("--with-cache", action="store_true",
+                        help="Keep the validation, evidence and search caches and semantic dedupe enabled.")
+    parser.add_argument("--twitter-budgets", action="store_true",
+                        help="Keep the production Twitter rate limit budgets in the reply loop.")
+    parser.add_argument("--tweets", type=int, default=10, help="Tweets in the fake timeline.")
+    parser.add_argument("--replies-per-tweet", type=int, default=20, help="Replies to each fake tweet.")
+    parser.add_argument("--page-size", type=int, default=20, help="Replies per fake reply page.")
+    parser.add_argument("--reply-workers", type=int, default=4, help="Reply validators in the reply loop.")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds allowed for the reply loop.")
+    # Latency of each fake service as "median_ms[,p99_ms[,error_rate]]"
+    parser.add_argument("--llm", default="800,2500,0", help="Fake OpenAI latency.")
+    parser.add_argument("--tavily", default="600,1500,0", help="Fake Tavily latency.")
+    parser.add_argument("--twitter", default="300,900,0", help="Fake Twitter latency.")
+    parser.add_argument("--cdp-submit", default="500,1500,0", help="Fake CDP contract invocation latency.")
+    parser.add_argument("--cdp-confirm", default="2000,5000,0", help="Fake CDP confirmation latency.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fake latency and error sampling.")
+    parser.add_argument("--redis-db", type=int, default=15, help="Redis database used when REDIS_DB is unset.")
+    parser.add_argument("--output", help="Write the report as JSON to this file.")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed p99 increase / throughput drop relative to the baseline.")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
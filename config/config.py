@@ -2,15 +2,9 @@ import os
 import ssl
 
 import redis.asyncio as redis
-from cdp_langchain.agent_toolkits import CdpToolkit
-from cdp_langchain.utils import CdpAgentkitWrapper
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import create_react_agent
 from CDP.cdp_init import cdp_api_key_private_key, cdp_api_key_name
 
-from CDP.contract import cdp
-
 # Load environment variables
 load_dotenv()
 
@@ -36,14 +30,129 @@ cdp_api_key_name = cdp_api_key_name
 cdp_api_key_private_key = cdp_api_key_private_key
 tavily_api_key = os.getenv("TAVILY_API_KEY")
 
+# Maximum number of market validations allowed in flight at once
+validation_concurrency = int(os.getenv("VALIDATION_CONCURRENCY", 8))
+
+# Bulk validation: markets per LLM call, maximum descriptions per /validate_markets request and
+# minimum cosine similarity of descriptions sharing one search
+validation_batch_size = int(os.getenv("VALIDATION_BATCH_SIZE", 10))
+validation_batch_max = int(os.getenv("VALIDATION_BATCH_MAX", 500))
+topic_cluster_threshold = float(os.getenv("TOPIC_CLUSTER_THRESHOLD", 0.8))
+
+# "agent" validates with the CDP ReAct agent, "lean" with a single structured chat model call
+validation_mode = os.getenv("VALIDATION_MODE", "agent").lower()
+
+# Reject clearly invalid market descriptions locally before calling the LLM
+prefilter_enabled = os.getenv("PREFILTER_ENABLED", "true").lower() == "true"
+
+# Maximum number of bets judged concurrently by /judge_bets and maximum bets per request
+judge_concurrency = int(os.getenv("JUDGE_CONCURRENCY", 8))
+judge_batch_max = int(os.getenv("JUDGE_BATCH_MAX", 100))
+
+# Bet judging: minimum confidence to settle a bet on-chain, bets per LLM call and evidence cache TTL in seconds
+judge_min_confidence = float(os.getenv("JUDGE_MIN_CONFIDENCE", 0.7))
+judge_batch_size = int(os.getenv("JUDGE_BATCH_SIZE", 8))
+judge_evidence_ttl = int(os.getenv("JUDGE_EVIDENCE_TTL", 30 * 60))
+
+# Reply watcher pipeline: number of validator workers and reply queue capacity
+reply_workers = int(os.getenv("REPLY_WORKERS", 4))
+reply_queue_size = int(os.getenv("REPLY_QUEUE_SIZE", 32))
+
+# Background contract transaction queue: receipts checked concurrently and submission attempts
+tx_confirm_workers = int(os.getenv("TX_CONFIRM_WORKERS", 4))
+tx_max_attempts = int(os.getenv("TX_MAX_ATTEMPTS", 5))
+
+# Durable job queue: deliveries per job and consumers per job kind in each worker process
+job_max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+job_worker_concurrency = int(os.getenv("JOB_WORKER_CONCURRENCY", 4))
+
+# Validation result cache: local LRU size and default / maximum TTL in seconds
+validation_cache_size = int(os.getenv("VALIDATION_CACHE_SIZE", 1024))
+validation_cache_ttl = int(os.getenv("VALIDATION_CACHE_TTL", 6 * 60 * 60))
+
+# Bet contract reads: JSON-RPC endpoint, Multicall3 address (empty to send plain JSON-RPC batches),
+# calls per request, seconds the mutable state of an open bet is cached and bets per /bets request
+rpc_url = os.getenv("RPC_URL", "https://base-sepolia.blockpi.network/v1/rpc/public")
+multicall_address = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+multicall_batch_size = int(os.getenv("MULTICALL_BATCH_SIZE", 200))
+bet_state_ttl = int(os.getenv("BET_STATE_TTL", 15))
+bet_read_max = int(os.getenv("BET_READ_MAX", 500))
+
+# BetCreated indexer: block to backfill from (when unset, indexing starts at the current head and
+# earlier bets are not backfilled), maximum blocks per eth_getLogs request, confirmations awaited
+# and seconds between polls once caught up
+indexer_enabled = os.getenv("INDEXER_ENABLED", "true").lower() == "true"
+indexer_start_block = int(os.getenv("INDEXER_START_BLOCK")) if os.getenv("INDEXER_START_BLOCK") else None
+indexer_max_blocks = int(os.getenv("INDEXER_MAX_BLOCKS", 2000))
+indexer_confirmations = int(os.getenv("INDEXER_CONFIRMATIONS", 5))
+indexer_poll_interval = float(os.getenv("INDEXER_POLL_INTERVAL", 5))
+
+# Semantic dedupe of paraphrased markets: embedding model and size, minimum cosine similarity of a
+# duplicate and maximum markets kept in each index (shared by all workers through Redis)
+semantic_dedupe_enabled = os.getenv("SEMANTIC_DEDUPE_ENABLED", "true").lower() == "true"
+embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", 256))
+semantic_threshold = float(os.getenv("SEMANTIC_THRESHOLD", 0.92))
+semantic_index_size = int(os.getenv("SEMANTIC_INDEX_SIZE", 10000))
+
+# Tavily search cache: local LRU size, TTL in seconds and whether to share it through Redis
+search_cache_size = int(os.getenv("SEARCH_CACHE_SIZE", 512))
+search_cache_ttl = int(os.getenv("SEARCH_CACHE_TTL", 15 * 60))
+search_cache_redis = os.getenv("SEARCH_CACHE_REDIS", "true").lower() == "true"
+
+# Feedback store: pending feedback entries per prompt refinement and maximum length of a feedback field
+feedback_window = int(os.getenv("FEEDBACK_WINDOW", 20))
+feedback_max_chars = int(os.getenv("FEEDBACK_MAX_CHARS", 500))
+
+# Shared outbound HTTP connection pools: size, idle keep-alive, timeouts in seconds and HTTP/2
+http_max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+http_max_keepalive = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+http_keepalive_expiry = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+http_connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+http_timeout = float(os.getenv("HTTP_TIMEOUT", 60))
+http2_enabled = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+
+# Shared clients, created on first use so that importing this module needs no credentials or network
+_llm = None
+_agent_executor = None
+_openai_client = None
+
+
+def get_llm():
+    """Return the shared chat model."""
+    global _llm
+    if _llm is None:
+        from langchain_openai import ChatOpenAI
+        from utils.http_clients import http_clients
+        _llm = ChatOpenAI(model="gpt-4o-mini", openai_api_key=openai_api_key,
+                          http_client=http_clients.client("openai"),
+                          http_async_client=http_clients.async_client("openai"))
+    return _llm
+
+
+def get_agent_executor():
+    """Return the shared LangGraph agent with the CDP toolkit, loading the CDP wallet if needed."""
+    global _agent_executor
+    if _agent_executor is None:
+        from cdp_langchain.agent_toolkits import CdpToolkit
+        from langgraph.prebuilt import create_react_agent
+        from CDP.contract import get_cdp
+
+        # Initialize CDP Toolkit and create Agent
+        toolkit = CdpToolkit.from_cdp_agentkit_wrapper(get_cdp())
+        _agent_executor = create_react_agent(get_llm(), toolkit.get_tools())
+    return _agent_executor
 
-# Initialize CDP Wrapper and Toolkit
-toolkit = CdpToolkit.from_cdp_agentkit_wrapper(cdp)
 
-# Initialize LLM and create Agent
-llm = ChatOpenAI(model="gpt-4o-mini", openai_api_key=openai_api_key)
-tools = toolkit.get_tools()
-agent_executor = create_react_agent(llm, tools)
+def get_openai_client():
+    """Return the shared async OpenAI client used for the feedback and introduction prompts."""
+    global _openai_client
+    if _openai_client is None:
+        from openai import AsyncOpenAI
+        from utils.http_clients import http_clients
+        _openai_client = AsyncOpenAI(api_key=openai_api_key, http_client=http_clients.async_client("openai"))
+    return _openai_client
 
 
 # set SSL 和 SNI
@@ -1,9 +1,8 @@
 import discord
 from discord.ext import commands
 
-from config.config import agent_executor, discord_token
-from llm.validate import validating_market
-from utils.tavily_search import search_util
+from config.config import discord_token
+from llm.validate import avalidating_market
 
 token = discord_token
 intents = discord.Intents.default()
@@ -24,7 +23,7 @@ async def on_message(message):
         channel = message.channel
         print(f"User {author} in {channel} mention: {content}")
 
-        result, steps = validating_market(content, agent_executor, search_util)
+        result, steps = await avalidating_market(content)
 
         if result.get("is_valid", False):
             # 回复或处理消息
@@ -42,6 +42,20 @@ type BetResponse struct {
 	Verdict bool `json:"verdict"`
 }
 
+type JudgeBetsRequest struct {
+	Bets []BetRequest `json:"bets"`
+}
+
+type JudgeBetsVerdict struct {
+	Address string  `json:"address"`
+	Verdict bool    `json:"verdict"`
+	Error   *string `json:"error"`
+}
+
+type JudgeBetsResponse struct {
+	Verdicts []JudgeBetsVerdict `json:"verdicts"`
+}
+
 func (t *AITrigger) triggerAI(bet *Bet) error {
 
 	println("Trigger AI for bet: ", bet.Address)
@@ -84,17 +98,75 @@ func (t *AITrigger) triggerAI(bet *Bet) error {
 	return t.betRepo.Instance(context.Background()).Save(bet, op.Eq("id", bet.ID))
 }
 
+// triggerAIBatch judges all bets in one /judge_bets call and marks the
+// successfully judged ones.
+func (t *AITrigger) triggerAIBatch(bets []*Bet) error {
+	requestData := JudgeBetsRequest{Bets: make([]BetRequest, 0, len(bets))}
+	for _, bet := range bets {
+		requestData.Bets = append(requestData.Bets, BetRequest{
+			Address:     bet.Address,
+			Description: bet.Message,
+			Urls:        []string{},
+		})
+	}
+
+	requestBody, err := json.Marshal(requestData)
+	if err != nil {
+		fmt.Printf("Error marshaling request data: %v\n", err)
+		return err
+	}
+
+	url := fmt.Sprintf("%s/judge_bets", AIServiceURL)
+	resp, err := http.Post(url, "application/json", bytes.NewBuffer(requestBody))
+	if err != nil {
+		fmt.Printf("Error making POST request: %v\n", err)
+		return err
+	}
+	defer resp.Body.Close()
+
+	if resp.StatusCode != http.StatusOK {
+		body, _ := ioutil.ReadAll(resp.Body)
+		return fmt.Errorf("received status code %d: %s", resp.StatusCode, string(body))
+	}
+
+	responseData := &JudgeBetsResponse{}
+	if err := json.NewDecoder(resp.Body).Decode(responseData); err != nil {
+		fmt.Printf("Error decoding response: %v\n", err)
+		return err
+	}
+
+	byAddress := make(map[string]*Bet, len(bets))
+	for _, bet := range bets {
+		byAddress[bet.Address] = bet
+	}
+	for _, verdict := range responseData.Verdicts {
+		if verdict.Error != nil {
+			log.Printf("Failed to judge bet %s: %s", verdict.Address, *verdict.Error)
+			continue
+		}
+		bet, ok := byAddress[verdict.Address]
+		if !ok {
+			continue
+		}
+		bet.Judged = true
+		if err := t.betRepo.Instance(context.Background()).Save(bet, op.Eq("id", bet.ID)); err != nil {
+			log.Printf("Failed to save bet %s: %v", bet.Address, err)
+		}
+	}
+	return nil
+}
+
 func (t *AITrigger) ScanAndTriggerAI() {
 	bets, err := t.scanBet()
 	if err != nil {
 		log.Printf("Failed to scan bets: %v", err)
 	}
+	if len(bets) == 0 {
+		return
+	}
 
-	for _, bet := range bets {
-		err := t.triggerAI(bet)
-		if err != nil {
-			log.Printf("Failed to trigger AI: %v", err)
-		}
+	if err := t.triggerAIBatch(bets); err != nil {
+		log.Printf("Failed to trigger AI: %v", err)
 	}
 }
 
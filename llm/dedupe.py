@@ -0,0 +1,309 @@
+# llm/dedupe.py
+
+import asyncio
+import json
+import math
+import re
+import time
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from config.config import get_openai_client, embedding_model, embedding_dimensions, semantic_threshold, \
+    semantic_index_size, redis_client
+from utils.cache import LRUCache
+from utils.lease import decode as _decode
+from utils.metrics import timed, record_token_usage
+
+# Embeddings of recently seen texts, so that a text is embedded once per process
+_embedding_cache = LRUCache(maxsize=4096)
+
+# Amounts such as "$5,000", "100k" or "2.5 million"; percent signs are ignored
+_NUMBER = re.compile(r"(\d[\d,]*(?:\.\d+)?)(?:\s*(thousand|million|billion|bn|k|m|b)\b)?", re.IGNORECASE)
+_MULTIPLIERS = {"thousand": 1e3, "k": 1e3, "million": 1e6, "m": 1e6, "billion": 1e9, "bn": 1e9, "b": 1e9}
+
+# Words that place a market in time: months, weekdays, holidays, periods and relative markers
+_DATE_WORD = re.compile(
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|mon|tue|wed|thu|fri|sat|sun)[a-z]*\b|"
+    r"\b(today|tonight|tomorrow|yesterday|christmas|xmas|thanksgiving|halloween|easter|eve|"
+    r"next|this|coming|last|end|early|late|mid|eod|eow|eom|eoy|q[1-4]|"
+    r"minute|hour|day|week|weekend|month|quarter|year|season)s?\b",
+    re.IGNORECASE,
+)
+
+# Capitalized words that do not name anything
+_FUNCTION_WORDS = {
+    "a", "an", "and", "are", "at", "be", "before", "by", "can", "could", "did", "do", "does", "for", "has",
+    "have", "i", "if", "in", "is", "it", "no", "of", "on", "or", "should", "that", "the", "this", "to", "was",
+    "what", "when", "which", "who", "whether", "will", "would", "yes",
+}
+
+
+def specifics(text: str) -> Tuple[FrozenSet[float], FrozenSet[str], FrozenSet[str]]:
+    """
+    The details a market turns on, which embeddings barely tell apart: its
+    amounts, its date words (months and weekdays shortened to three letters)
+    and its named entities (capitalized words and tickers, lower-cased).
+    """
+    numbers = frozenset(
+        float(number.replace(",", "")) * _MULTIPLIERS.get(unit.lower(), 1)
+        for number, unit in _NUMBER.findall(text)
+    )
+    dates = frozenset(
+        (short or match.group(0).rstrip("sS")).lower()
+        for match in _DATE_WORD.finditer(text) for short in [match.group(1)]
+    )
+    entities = frozenset(
+        word.lower() for word in re.findall(r"\b[A-Z][A-Za-z0-9]*", text)
+        if word.lower() not in _FUNCTION_WORDS and not _DATE_WORD.fullmatch(word)
+    )
+    return numbers, dates, entities
+
+
+def same_specifics(text: str, other: str) -> bool:
+    """
+    Whether two similar texts name the same amounts, dates and entities, e.g.
+    not "BTC above 100k by Friday" and "BTC above 150k by next Friday".
+    Entities are compared with the words of the other text, so that a
+    lower-cased paraphrase still matches.
+    """
+    numbers, dates, entities = specifics(text)
+    other_numbers, other_dates, other_entities = specifics(other)
+    if numbers != other_numbers or dates != other_dates:
+        return False
+    words, other_words = set(re.findall(r"\w+", text.lower())), set(re.findall(r"\w+", other.lower()))
+    return entities <= other_words and other_entities <= words
+
+
+async def embed(texts: List[str]) -> np.ndarray:
+    """
+    Return unit-length embeddings of `texts`, one row per text, embedding
+    every text missing from the cache in a single API call.
+    """
+    vectors = [_embedding_cache.get(text) for text in texts]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        with timed("embedding"):
+            response = await get_openai_client().embeddings.create(
+                model=embedding_model, input=[texts[i] for i in missing], dimensions=embedding_dimensions)
+        if response.usage:
+            record_token_usage("embedding", response.usage.prompt_tokens, 0)
+        for i, item in zip(missing, response.data):
+            vector = np.asarray(item.embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            vectors[i] = vector / norm if norm else vector
+            _embedding_cache.set(texts[i], vectors[i])
+    return np.vstack(vectors)
+
+
+async def cluster(texts: List[str], threshold: float) -> List[List[int]]:
+    """
+    Group texts by subject: each text joins the first cluster whose first
+    text is at least `threshold` similar to it, or starts a new cluster.
+
+    Returns:
+        list: The indexes of the texts of each cluster, in order.
+    """
+    if not texts:
+        return []
+    vectors = await embed(texts)
+    similarities = vectors @ vectors.T
+    clusters: List[List[int]] = []
+    for i in range(len(texts)):
+        for members in clusters:
+            if similarities[members[0], i] >= threshold:
+                members.append(i)
+                break
+        else:
+            clusters.append([i])
+    return clusters
+
+
+def _stream_order(entry_id: str) -> Tuple[int, int]:
+    milliseconds, sequence = entry_id.split("-")
+    return int(milliseconds), int(sequence)
+
+
+class SemanticIndex:
+    """
+    Vector index of texts and their payloads, shared by all worker processes through Redis.
+
+    Every addition and removal is appended to a Redis stream, which each
+    process replays into an in-memory matrix of unit-length embeddings
+    before a lookup. A lookup is then a single matrix-vector product, i.e. an
+    exact cosine similarity search, which stays in the low milliseconds for
+    the tens of thousands of entries the index holds.
+    Entries expire after their TTL; the stream keeps about the last
+    `max_items` changes and beyond `max_items` the oldest entries are dropped.
+    Without a Redis client the index is kept in the process memory only.
+    """
+
+    def __init__(self, name: str, redis_client=None, threshold: float = 0.92, max_items: int = 10000,
+                 namespace: str = "csb_semantic"):
+        """
+        Initialize the index.
+
+        Args:
+            name (str): Name of the index in the logs and in its Redis key.
+            redis_client: The async Redis client sharing the index, or None to keep it in memory only.
+            threshold (float): Minimum cosine similarity of a match.
+            max_items (int): Maximum number of entries kept.
+            namespace (str): Prefix of the Redis stream key.
+        """
+        self.name = name
+        self.redis_client = redis_client
+        self.key = f"{namespace}:{name}"
+        self.threshold = threshold
+        self.max_items = max_items
+        self._vectors: Optional[np.ndarray] = None
+        self._expires = np.empty(0)
+        self._entries: List[Dict] = []
+        # Id of the last stream entry replayed, or of the last local change without Redis
+        self._last_id = "0-0"
+        self._sync_lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def _sync(self):
+        """Replay the changes made since the last replay, by any process."""
+        if self.redis_client is None:
+            return
+        async with self._sync_lock:
+            while True:
+                response = await self.redis_client.xread({self.key: self._last_id}, count=1000)
+                if not response:
+                    return
+                _, changes = response[0]
+                added = []
+                for change_id, fields in changes:
+                    change_id = _decode(change_id)
+                    fields = {_decode(k): v for k, v in fields.items()}
+                    self._last_id = change_id
+                    if _decode(fields["op"]) == "add":
+                        added.append((change_id, fields))
+                    else:
+                        self._insert(added)
+                        added = []
+                        self._remove(_decode(fields.get("text", b"")), _decode(fields.get("ref", b"")))
+                self._insert(added)
+
+    def _insert(self, added: List[Tuple[str, Dict]]):
+        if not added:
+            return
+        self._entries.extend({"id": change_id, "text": _decode(fields["text"]),
+                              "payload": json.loads(fields["payload"])} for change_id, fields in added)
+        self._expires = np.append(self._expires, [float(fields["expires"]) for _, fields in added])
+        vectors = np.vstack([np.frombuffer(fields["vector"], dtype=np.float32) for _, fields in added])
+        self._vectors = vectors if self._vectors is None else np.vstack([self._vectors, vectors])
+        if len(self._entries) > self.max_items:
+            self._prune()
+
+    def _remove(self, text: str = "", ref: str = ""):
+        keep = [i for i, entry in enumerate(self._entries) if entry["text"] != text and entry["id"] != ref]
+        if len(keep) == len(self._entries):
+            return
+        self._entries = [self._entries[i] for i in keep]
+        self._expires = self._expires[keep]
+        self._vectors = self._vectors[keep] if keep else None
+
+    def _prune(self):
+        """Drop expired entries, then the oldest ones beyond `max_items`."""
+        keep = np.flatnonzero(self._expires > time.time())[-self.max_items:]
+        if len(keep) == len(self._entries):
+            return
+        self._entries = [self._entries[i] for i in keep]
+        self._expires = self._expires[keep]
+        self._vectors = self._vectors[keep] if len(keep) else None
+
+    async def _append(self, fields: Dict) -> str:
+        """Record a change and return its id; it is applied by the next replay."""
+        if self.redis_client is not None:
+            return _decode(await self.redis_client.xadd(self.key, fields, maxlen=self.max_items, approximate=True))
+        milliseconds, sequence = _stream_order(self._last_id)
+        self._last_id = f"{milliseconds}-{sequence + 1}"
+        fields = {k: v.encode("utf-8") if isinstance(v, str) else v for k, v in fields.items()}
+        if fields["op"] == b"add":
+            self._insert([(self._last_id, fields)])
+        else:
+            self._remove(_decode(fields.get("text", b"")), _decode(fields.get("ref", b"")))
+        return self._last_id
+
+    def nearest(self, vector: np.ndarray, accept: Optional[Callable[[Dict], bool]] = None
+                ) -> Optional[Tuple[Dict, float]]:
+        """
+        Return the most similar unexpired entry and its similarity, or None if
+        no entry reaches the threshold. Only entries for which `accept` returns
+        True are considered, when given.
+        """
+        if self._vectors is None:
+            return None
+        scores = self._vectors @ vector
+        scores[self._expires <= time.time()] = -math.inf
+        for i in np.argsort(-scores):
+            if scores[i] < self.threshold:
+                break
+            if accept is None or accept(self._entries[i]):
+                return self._entries[i], float(scores[i])
+        return None
+
+    async def search(self, text: str, accept: Optional[Callable[[Dict], bool]] = None
+                     ) -> Optional[Tuple[Dict, float]]:
+        """
+        Return the entry most similar to `text` and its similarity, or None if
+        no entry is similar enough; see `nearest`.
+        """
+        vector = (await embed([text]))[0]
+        await self._sync()
+        return self.nearest(vector, accept)
+
+    async def add(self, text: str, payload: Dict, ttl: Optional[float] = None) -> str:
+        """
+        Embed `text` and add it with its payload, expiring after `ttl` seconds
+        (never if None). Returns the id of the entry.
+        """
+        return await self._add(text, (await embed([text]))[0], payload, ttl)
+
+    async def _add(self, text: str, vector: np.ndarray, payload: Dict, ttl: Optional[float]) -> str:
+        return await self._append({
+            "op": "add",
+            "text": text,
+            "payload": json.dumps(payload),
+            "vector": vector.astype(np.float32).tobytes(),
+            "expires": time.time() + ttl if ttl else math.inf,
+        })
+
+    async def claim(self, text: str, payload: Dict, ttl: Optional[float] = None,
+                    accept: Optional[Callable[[Dict], bool]] = None) -> Optional[Tuple[Dict, float]]:
+        """
+        Add `text` unless a similar entry exists; see `nearest`. When processes
+        claim similar texts at the same time, the first one added to the stream
+        wins and the others withdraw their entry.
+
+        Returns:
+            tuple: The existing similar entry and its similarity, or None if `text` was added.
+        """
+        vector = (await embed([text]))[0]
+        await self._sync()
+        match = self.nearest(vector, accept)
+        if match is not None:
+            return match
+        entry_id = await self._add(text, vector, payload, ttl)
+        await self._sync()
+        order = _stream_order(entry_id)
+        match = self.nearest(vector, lambda entry: _stream_order(entry["id"]) < order
+                             and (accept is None or accept(entry)))
+        if match is not None:
+            await self._append({"op": "discard", "ref": entry_id})
+        return match
+
+    async def discard(self, text: str):
+        """Remove the entries added for `text`, e.g. a claim whose work failed."""
+        await self._append({"op": "discard", "text": text})
+
+
+# Validated markets, used to answer paraphrases of a market with its result
+market_index = SemanticIndex("markets", redis_client, threshold=semantic_threshold, max_items=semantic_index_size)
+
+# Markets a bet contract was queued for, used to avoid deploying paraphrases twice
+bet_index = SemanticIndex("bets", redis_client, threshold=semantic_threshold, max_items=semantic_index_size)
@@ -1,16 +1,194 @@
 # openai_api/emoticon_gen.py
+import hashlib
 import json
 import re
+import time
+from typing import Optional
 
-from openai import OpenAI
+from config.config import get_openai_client, redis_client, feedback_window, feedback_max_chars
+from utils.lease import Lease
+from utils.metrics import record_token_usage
 
-from config.config import openai_api_key
+SYSTEM_PROMPT = """
+                    You are an AI assistant refining validation prompts based on user feedback.
+                    Users provide feedback on two aspects:
+                    1. How clear and specific the description is.
+                    2. Suggestions for improvement.
+
+                    You receive the current summary and validation prompt, which already reflect all
+                    earlier feedback, together with the feedback received since. Based on them, generate
+                    a concise JSON object with:
+                    - "feedback_summary": A summary of common issues (10-30 words).
+                    - "improved_prompt": A revised validation prompt based on the feedback.
+
+                    Example output:
+                    {
+                        "feedback_summary": "The outcomes are too vague, and the due date is unclear.",
+                        "improved_prompt": "Ensure the market description specifies clear outcomes and includes a precise due date in ISO format."
+                    }
+                    """
+
+# Move the pending feedback to the processing list in one step, so entries
+# added meanwhile are never trimmed with the ones being summarized
+_TAKE_PENDING_SCRIPT = """
+local entries = redis.call('lrange', KEYS[1], 0, -1)
+for _, entry in ipairs(entries) do
+    redis.call('rpush', KEYS[2], entry)
+end
+redis.call('del', KEYS[1])
+redis.call('ltrim', KEYS[2], -tonumber(ARGV[1]), -1)
+return redis.call('lrange', KEYS[2], 0, -1)
+"""
+
+
+def _normalize(text) -> str:
+    return " ".join(str(text or "").split()).lower()
+
+
+class FeedbackStore:
+    """
+    Persistent feedback kept in Redis with a rolling summary.
+
+    New feedback is deduplicated on its normalized content and appended to a
+    pending window of at most `window` entries. Each refinement sends only the
+    previous summary and prompt plus the pending window to the LLM and then
+    clears the window, so the prompt size, and the cost of a feedback call,
+    stays bounded however much feedback has been collected.
+    """
 
-ai_client = OpenAI(api_key=openai_api_key)
+    def __init__(self, redis_client, window: int = 20, max_chars: int = 500, dedupe_size: int = 10000,
+                 namespace: str = "csb_feedback"):
+        """
+        Initialize the store.
+
+        Args:
+            redis_client: The async Redis client.
+            window (int): Maximum number of pending feedback entries sent in one refinement.
+            max_chars (int): Length at which each feedback field is truncated.
+            dedupe_size (int): Number of recent feedback fingerprints remembered for deduplication.
+            namespace (str): Prefix of the Redis keys.
+        """
+        self.redis_client = redis_client
+        self.window = window
+        self.max_chars = max_chars
+        self.dedupe_size = dedupe_size
+        self.pending_key = f"{namespace}:pending"
+        self.processing_key = f"{namespace}:processing"
+        self.seen_key = f"{namespace}:seen"
+        self.summary_key = f"{namespace}:summary"
+        self.lock_key = f"{namespace}:lock"
+        self._take_pending = redis_client.register_script(_TAKE_PENDING_SCRIPT)
+
+    def _clean(self, feedback: dict) -> dict:
+        return {
+            "clarity": str(feedback.get("clarity", ""))[:self.max_chars],
+            "suggestion": str(feedback.get("suggestion", ""))[:self.max_chars],
+        }
+
+    @staticmethod
+    def fingerprint(feedback: dict) -> str:
+        """Content hash of a feedback entry, ignoring case and whitespace."""
+        text = f"{_normalize(feedback.get('clarity'))}\n{_normalize(feedback.get('suggestion'))}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def add(self, feedback: dict) -> bool:
+        """
+        Store a feedback entry unless an identical one was already received.
+
+        Returns:
+            bool: False if the feedback is a duplicate.
+        """
+        feedback = self._clean(feedback)
+        if not await self.redis_client.zadd(self.seen_key, {self.fingerprint(feedback): time.time()}, nx=True):
+            return False
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(self.pending_key, json.dumps(feedback))
+            # Keep only the newest entries of the window and fingerprints
+            pipe.ltrim(self.pending_key, -self.window, -1)
+            pipe.zremrangebyrank(self.seen_key, 0, -self.dedupe_size - 1)
+            await pipe.execute()
+        return True
+
+    async def summary(self) -> Optional[dict]:
+        """Return the current feedback summary and improved prompt, or None if there is none yet."""
+        raw = await self.redis_client.get(self.summary_key)
+        return json.loads(raw) if raw else None
+
+    async def refine(self) -> Optional[dict]:
+        """
+        Fold the pending feedback into the summary with one LLM call.
+
+        Only one refinement runs at a time across processes; feedback arriving
+        meanwhile stays pending for the next one. The entries being summarized
+        sit in a processing list until the summary is stored, so a failed
+        refinement leaves them for the next one.
+
+        Returns:
+            dict: The updated summary, or the current one if there was nothing to refine.
+        """
+        lock = Lease(self.redis_client, self.lock_key, ttl=300)
+        if not await lock.acquire():
+            return await self.summary()
+        try:
+            taken = await self._take_pending(keys=[self.pending_key, self.processing_key], args=[self.window])
+            pending = [json.loads(raw) for raw in taken]
+            previous = await self.summary()
+            if not pending:
+                return previous
+
+            updated = await _summarize(previous, pending)
+            updated["feedback_count"] = (previous or {}).get("feedback_count", 0) + len(pending)
+            updated["updated_at"] = time.time()
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.set(self.summary_key, json.dumps(updated))
+                pipe.delete(self.processing_key)
+                await pipe.execute()
+            return updated
+        finally:
+            await lock.release()
+
+
+async def _summarize(previous: Optional[dict], pending: list) -> dict:
+    feedback_messages = "\n".join([
+        f"Feedback {i + 1}:\n"
+        f"1. Clarity: {fb['clarity']}\n"
+        f"2. Suggestion: {fb['suggestion']}\n"
+        for i, fb in enumerate(pending)
+    ])
+    if previous:
+        context = (f"Current summary: {previous.get('feedback_summary')}\n"
+                   f"Current validation prompt: {previous.get('improved_prompt')}\n\n")
+    else:
+        context = "There is no summary yet.\n\n"
+
+    # Send the previous summary and the new feedback to the AI model to generate a new prompt
+    response = await get_openai_client().chat.completions.create(
+        model="o1-model",
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": f"{context}Here is the new feedback:\n{feedback_messages}\n"
+                           f"Please generate an improved validation prompt."
+            }
+        ]
+    )
+
+    if response.usage:
+        record_token_usage("llm_feedback", response.usage.prompt_tokens, response.usage.completion_tokens)
+
+    # Extract the improved prompt from the response
+    content = response.choices[0].message.content
+    cleaned_content = re.sub(r"```(?:json)?", "", content).strip()
+    feedback_data = json.loads(cleaned_content)
+    return {
+        "feedback_summary": feedback_data.get("feedback_summary"),
+        "improved_prompt": feedback_data.get("improved_prompt"),
+    }
 
 
-# In-memory storage for user feedback
-feedback_storage = []
+# Feedback shared by every process through Redis
+feedback_store = FeedbackStore(redis_client, window=feedback_window, max_chars=feedback_max_chars)
 
 
 async def collect_feedback_and_improve(new_feedback: dict):
@@ -26,7 +204,7 @@ async def collect_feedback_and_improve(new_feedback: dict):
             }
 
     Returns:
-        dict: A dictionary containing the original feedback and the improved validation prompt.
+        dict: A dictionary containing the feedback summary and the improved validation prompt.
         Example output:
         {
             "feedback_summary": "The outcomes are too vague, and the due date is unclear.",
@@ -34,54 +212,11 @@ async def collect_feedback_and_improve(new_feedback: dict):
         }
     """
     try:
-        # Add the new feedback to the in-memory storage
-        feedback_storage.append(new_feedback)
-
-        # Construct a dynamic prompt by aggregating all feedback
-        feedback_messages = "\n".join([
-            f"Feedback {i + 1}:\n"
-            f"1. Clarity: {fb['clarity']}\n"
-            f"2. Suggestion: {fb['suggestion']}\n"
-            for i, fb in enumerate(feedback_storage)
-        ])
-
-        # Send the aggregated feedback to the AI model to generate a new prompt
-        response = ai_client.chat.completions.create(
-            model="o1-model",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """
-                    You are an AI assistant refining validation prompts based on user feedback.
-                    Users provide feedback on two aspects:
-                    1. How clear and specific the description is.
-                    2. Suggestions for improvement.
-
-                    Based on the provided feedback, generate a concise JSON object with:
-                    - "feedback_summary": A summary of common issues (10-30 words).
-                    - "improved_prompt": A revised validation prompt based on the feedback.
-
-                    Example output:
-                    {
-                        "feedback_summary": "The outcomes are too vague, and the due date is unclear.",
-                        "improved_prompt": "Ensure the market description specifies clear outcomes and includes a precise due date in ISO format."
-                    }
-                    """
-                },
-                {
-                    "role": "user",
-                    "content": f"Here is the accumulated feedback:\n{feedback_messages}\nPlease generate an improved validation prompt."
-                }
-            ]
-        )
-
-        # Extract the improved prompt from the response
-        content = response.choices[0].message.content
-        cleaned_content = re.sub(r"```(?:json)?", "", content).strip()
-        feedback_data = json.loads(cleaned_content)
-
-        return feedback_data
+        if not await feedback_store.add(new_feedback):
+            # Duplicate feedback does not change the summary
+            return await feedback_store.summary()
+        return await feedback_store.refine()
 
     except Exception as e:
         print("Error generating feedback:", e)
-        return None
\ No newline at end of file
+        return None
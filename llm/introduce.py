@@ -2,10 +2,8 @@
 import json
 import re
 
-from openai import OpenAI
-from config.config import openai_api_key
-
-ai_client = OpenAI(api_key=openai_api_key)
+from config.config import get_openai_client
+from utils.metrics import record_token_usage
 
 
 # Generate self-introduction tweet with specified prompt
@@ -16,7 +14,7 @@ async def generate_self_intro_tweet():
         :param prompt: The user's specific input for tailoring the self-introduction.
         :return: Parsed JSON data of the tweet or None if parsing fails.
         """
-    response = ai_client.chat.completions.create(
+    response = await get_openai_client().chat.completions.create(
         model="gpt-4o",
         messages=[
             {"role": "system",
@@ -33,6 +31,8 @@ async def generate_self_intro_tweet():
              }
         ]
     )
+    if response.usage:
+        record_token_usage("llm_introduce", response.usage.prompt_tokens, response.usage.completion_tokens)
     content = response.choices[0].message.content
 
     # Parse the content as JSON
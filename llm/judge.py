@@ -0,0 +1,252 @@
+# llm/judge.py
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from CDP.bet_indexer import bet_indexer
+from CDP.tx_queue import tx_queue
+from config.config import judge_concurrency, judge_min_confidence, judge_batch_size, judge_evidence_ttl, \
+    redis_client, get_llm
+from llm.validate import topic_key
+from utils.cache import TieredCache
+from utils.metrics import timed, record_message_usage
+from utils.tavily_search import search_util
+
+# Evidence gathered for each bet, keyed on its contract address
+evidence_cache = TieredCache("csb_evidence", redis_client, maxsize=1024)
+
+# Characters of each evidence document sent to the LLM
+EVIDENCE_MAX_CHARS = 1500
+
+
+class BetJudgment(BaseModel):
+    """Outcome of one bet decided from the evidence."""
+    bet: int = Field(description="Number of the bet being judged.")
+    outcome: Literal["yes", "no", "undetermined"] = Field(
+        description='"yes" if the evidence shows the bet came true, "no" if it shows it did not, '
+                    '"undetermined" if the evidence is insufficient or the event has not resolved yet.')
+    confidence: float = Field(description="Confidence in the outcome, from 0 to 1.")
+    sources: List[str] = Field(description='Ids of the evidence documents supporting the outcome, e.g. ["E1"].')
+    reasoning: str = Field(description="One or two sentences explaining the outcome.")
+
+
+class BetJudgments(BaseModel):
+    """Judgments of a batch of bets."""
+    judgments: List[BetJudgment]
+
+
+def _documents(results: List[Dict], content_field: str) -> List[Dict]:
+    return [
+        {"url": result.get("url", ""), "content": (result.get(content_field) or "")[:EVIDENCE_MAX_CHARS]}
+        for result in results if result.get(content_field)
+    ]
+
+
+async def _gather_evidence(bets: List[Dict]) -> List[List[Dict]]:
+    """
+    Return the evidence documents of each bet of a topic batch. Cached
+    evidence is reused; otherwise one search serves every bet of the batch
+    and the pages listed in each bet's `urls` are extracted.
+    """
+    evidence = [await evidence_cache.get(bet["address"]) for bet in bets]
+    missing = [i for i, documents in enumerate(evidence) if documents is None]
+    if not missing:
+        return evidence
+
+    shared = []
+    try:
+        with timed("tavily_search"):
+            shared = _documents(await search_util.asearch(bets[missing[0]]["description"]), "content")
+    except Exception as e:
+        print(f"Evidence search failed: {e}")
+
+    async def extract(bet: Dict) -> List[Dict]:
+        try:
+            with timed("tavily_extract"):
+                return _documents(await search_util.aextract(bet.get("urls") or []), "raw_content")
+        except Exception as e:
+            print(f"Failed to extract evidence for bet {bet['address']}: {e}")
+            return []
+
+    extracted = await asyncio.gather(*(extract(bets[i]) for i in missing))
+    for i, documents in zip(missing, extracted):
+        # The bet's own data sources come first
+        evidence[i] = documents + shared
+        if evidence[i]:
+            await evidence_cache.set(bets[i]["address"], evidence[i], ttl=judge_evidence_ttl)
+    return evidence
+
+
+async def _score(bets: List[Dict], evidence: List[List[Dict]]) -> List[Dict]:
+    """
+    Judge a batch of bets against their evidence in one structured LLM call.
+    """
+    ids = {}
+    documents = []
+    bet_lines = []
+    for number, (bet, bet_evidence) in enumerate(zip(bets, evidence), start=1):
+        refs = []
+        for document in bet_evidence:
+            key = (document["url"], document["content"])
+            if key not in ids:
+                ids[key] = f"E{len(ids) + 1}"
+                documents.append(f"[{ids[key]}] {document['url']}\n{document['content']}")
+            refs.append(ids[key])
+        bet_lines.append(f"Bet {number}: \"{bet['description']}\" (evidence: {', '.join(refs) or 'none'})")
+
+    query = f"""
+    Today is {datetime.now(timezone.utc).date().isoformat()}. Judge whether each of the following bets came true,
+    using only the listed evidence documents of each bet. Answer "undetermined" with a low confidence when
+    the evidence does not settle the bet or the event has not happened yet.
+
+    {chr(10).join(bet_lines)}
+
+    Evidence:
+    {chr(10).join(documents) or "No evidence was found."}
+    """
+    with timed("llm_judgment"):
+        answer = await get_llm().with_structured_output(BetJudgments, include_raw=True).ainvoke(query)
+    record_message_usage("llm_judgment", [answer["raw"]])
+    if answer["parsed"] is None:
+        raise ValueError(f"Unparseable structured output: {answer['parsing_error']}")
+
+    urls = {doc_id: url for (url, _), doc_id in ids.items()}
+    by_bet = {judgment.bet: judgment for judgment in answer["parsed"].judgments}
+    results = []
+    for number, bet in enumerate(bets, start=1):
+        judgment = by_bet.get(number)
+        if judgment is None:
+            results.append({"outcome": "undetermined", "confidence": 0.0, "sources": [],
+                            "reasoning": "The bet was not judged."})
+            continue
+        results.append({
+            "outcome": judgment.outcome,
+            "confidence": max(0.0, min(1.0, judgment.confidence)),
+            "sources": [urls[doc_id] for doc_id in judgment.sources if doc_id in urls],
+            "reasoning": judgment.reasoning,
+        })
+    return results
+
+
+async def _settle(bet: Dict, judgment: Dict) -> Dict:
+    """
+    Queue the `setResult` transaction of a confidently judged bet.
+    """
+    result = {
+        "address": bet["address"],
+        "verdict": None,
+        "confidence": judgment["confidence"],
+        "sources": judgment["sources"],
+        "reasoning": judgment["reasoning"],
+        "tx_id": None,
+        "error": None,
+    }
+    if judgment["outcome"] == "undetermined" or judgment["confidence"] < judge_min_confidence:
+        # Left unjudged so that it is retried once more evidence is available
+        result["error"] = f"Insufficient evidence (outcome {judgment['outcome']}, confidence {judgment['confidence']:.2f})"
+        return result
+
+    result["verdict"] = judgment["outcome"] == "yes"
+    result["tx_id"] = await tx_queue.enqueue_set_bet_result(bet["address"], int(result["verdict"]) + 1)
+    return result
+
+
+async def _resolve(bet: Dict):
+    """
+    Complete a bet from the bet index, without a chain round trip: a missing
+    description is taken from the bet's message.
+
+    Raises:
+        ValueError: If the bet has no description or has not ended yet.
+    """
+    indexed = await bet_indexer.get(bet["address"])
+    if indexed is not None:
+        if not bet.get("description"):
+            bet["description"] = indexed.get("message") or ""
+        if indexed.get("endTime") and indexed["endTime"] > time.time():
+            raise ValueError(f"The bet ends at {indexed['endTime']} and cannot be judged yet")
+    if not bet.get("description"):
+        raise ValueError("The bet has no description and is not indexed")
+
+
+def _error_result(bet: Dict, error: Exception) -> Dict:
+    return {"address": bet["address"], "verdict": None, "confidence": 0.0, "sources": [], "reasoning": None,
+            "tx_id": None, "error": str(error)}
+
+
+async def ajudge_bets(bets: List[Dict], concurrency: int = judge_concurrency):
+    """
+    Judge many bets from gathered evidence. Bets sharing a topic are judged in
+    batches of at most `judge_batch_size` that share one search and one LLM
+    call, with at most `concurrency` batches in flight. A bet is only settled
+    on-chain when its outcome is decided with at least `judge_min_confidence`.
+    Missing descriptions are taken from the bet index, and indexed bets that
+    have not ended yet are not judged.
+
+    Args:
+        bets (List[Dict]): The bets to judge, each with "address" and optional "description" and "urls".
+        concurrency (int): Maximum number of batches judged at the same time.
+
+    Returns:
+        list: One entry per bet, in request order, with its verdict (None if
+            undecided), confidence, sources, queued transaction id or error.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results: List[Optional[Dict]] = [None] * len(bets)
+    bets = [dict(bet) for bet in bets]
+    topics: Dict[str, List[int]] = {}
+    for i, bet in enumerate(bets):
+        try:
+            await _resolve(bet)
+        except Exception as e:
+            results[i] = _error_result(bet, e)
+            continue
+        topics.setdefault(topic_key(bet["description"]), []).append(i)
+    batches = [
+        indexes[start:start + judge_batch_size]
+        for indexes in topics.values()
+        for start in range(0, len(indexes), judge_batch_size)
+    ]
+
+    async def judge_batch(indexes: List[int]):
+        batch = [bets[i] for i in indexes]
+        async with semaphore:
+            try:
+                print(f"Judging {len(batch)} bet(s) on: {batch[0]['description']}")
+                judgments = await _score(batch, await _gather_evidence(batch))
+            except Exception as e:
+                print(f"Error judging bets {[bet['address'] for bet in batch]}: {e}")
+                for i in indexes:
+                    results[i] = _error_result(bets[i], e)
+                return
+        for i, judgment in zip(indexes, judgments):
+            try:
+                results[i] = await _settle(bets[i], judgment)
+            except Exception as e:
+                print(f"Error settling bet {bets[i]['address']}: {e}")
+                results[i] = _error_result(bets[i], e)
+
+    await asyncio.gather(*(judge_batch(indexes) for indexes in batches))
+    return results
+
+
+async def ajudge_bet(description: str, address: str, urls: Optional[List[str]] = None) -> Dict:
+    """
+    Judge a single bet and queue its result for the chain, raising on failure.
+
+    Args:
+        description (str): The bet description, taken from the bet index if empty.
+        address (str): Address of the bet contract.
+        urls (List[str]): Optional data source URLs for the bet, used as evidence.
+
+    Returns:
+        dict: The verdict (None if undecided), confidence, sources and the id of the queued `setResult` transaction.
+    """
+    bet = {"description": description, "address": address, "urls": urls or []}
+    await _resolve(bet)
+    judgment = (await _score([bet], await _gather_evidence([bet])))[0]
+    return await _settle(bet, judgment)
@@ -0,0 +1,116 @@
+# llm/prefilter.py
+
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+
+from dateutil.parser import parse
+
+_MONTH = (r"(jan(uary)?|feb(ruary)?|mar(ch)?|apr(il)?|may|june?|july?|aug(ust)?|sep(t|tember)?|oct(ober)?|"
+          r"nov(ember)?|dec(ember)?)\.?")
+_WEEKDAY = r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+_PERIOD = r"(minutes?|hours?|days?|weeks?|weekends?|months?|quarters?|years?|seasons?)"
+_HOLIDAY = (r"(christmas|xmas|new year['’]?s( eve| day)?|thanksgiving|halloween|easter|black friday|"
+            r"valentine['’]?s( day)?|independence day|labor day|memorial day|election day)")
+
+# Any time expression: month names, weekdays, holidays, relative periods and deadlines, numeric dates and times
+_TIME_PATTERN = re.compile(
+    rf"\b({_MONTH}|{_WEEKDAY}|{_HOLIDAY}|{_PERIOD}|today|tonight|tomorrow|eod|eow|eom|eoy|q[1-4]|20\d\d|"
+    r"(by|before|until|till|within|after|through|ahead of) \w+|"
+    r"\d{4}[/-]\d{1,2}[/-]\d{1,2}|\d{1,2}[/-]\d{1,2}([/-]\d{2,4})?|\d{1,2}(:\d{2})?\s*(am|pm)|\d{1,2}:\d{2})\b",
+    re.IGNORECASE,
+)
+
+# A yes/no prediction: a will/whether or yes/no question, a predicate comparing the outcome with a threshold,
+# or a target such as "to 100k"
+_BINARY_PATTERN = re.compile(
+    r"\b(will|won'?t|whether|going to)\b|"
+    r"^\s*(is|are|does|do|did|can|could|has|have|should)\b.*\?|"
+    r"\b(exceed|surpass|reach|hit|beat|win|lose|pass|flip|top)(s|es)?\s+\w|"
+    r"\b(above|below|over|under|more than|less than|at least|at most|to)\s+\$?\d|[<>]=?\s*\$?\d",
+    re.IGNORECASE,
+)
+
+_MENTION_OR_URL = re.compile(r"@\w+|https?://\S+")
+
+_SENTINEL = datetime(1, 1, 1)
+
+
+def _has_date(text: str) -> bool:
+    if _TIME_PATTERN.search(text):
+        return True
+    try:
+        # A default far in the past reveals whether the date parser found any date component
+        return parse(text, fuzzy=True, default=_SENTINEL) != _SENTINEL
+    except (ValueError, OverflowError):
+        return False
+
+
+class MarketPrefilter:
+    """
+    A local classifier that rejects clearly invalid market descriptions before
+    they reach the LLM and search. It only rejects texts lacking the minimum a
+    market needs (enough words, a time reference, a binary outcome); any text
+    with a plausible time expression, even an uncertain one, is forwarded to
+    the full validation.
+    """
+
+    def __init__(self, min_words: int = 3, model: Optional[Callable[[str], float]] = None,
+                 model_threshold: float = 0.2):
+        """
+        Initialize the pre-filter.
+
+        Args:
+            min_words (int): Minimum number of words once mentions and URLs are removed.
+            model (Callable[[str], float]): Optional small local model returning the
+                probability that a text is a market; run after the heuristics.
+            model_threshold (float): Texts scored below this probability are rejected.
+        """
+        self.min_words = min_words
+        self.model = model
+        self.model_threshold = model_threshold
+        self.checked = 0
+        self.rejected = Counter()
+
+    def classify(self, description: str) -> Tuple[bool, Optional[str]]:
+        """
+        Decide whether a description is plausible enough to validate.
+
+        Returns:
+            Tuple[bool, Optional[str]]: Whether to forward it, and the rejection reason if not.
+        """
+        self.checked += 1
+        reason = self._reject_reason(description)
+        if reason:
+            self.rejected[reason] += 1
+            return False, reason
+        return True, None
+
+    def _reject_reason(self, description: str) -> Optional[str]:
+        text = " ".join(_MENTION_OR_URL.sub(" ", description).split())
+        if len(re.findall(r"\w+", text)) < self.min_words:
+            return "too_short"
+        if not _BINARY_PATTERN.search(text):
+            return "no_binary_outcome"
+        if not _has_date(text):
+            return "no_due_date"
+        if self.model is not None and self.model(text) < self.model_threshold:
+            return "model"
+        return None
+
+    def stats(self) -> dict:
+        """
+        Return how many descriptions were checked and how many LLM validations were saved.
+        """
+        saved = sum(self.rejected.values())
+        return {
+            "checked": self.checked,
+            "forwarded": self.checked - saved,
+            "rejected": saved,
+            "rejected_by_reason": dict(self.rejected),
+        }
+
+
+# Shared pre-filter used by the validation pipeline
+market_prefilter = MarketPrefilter()
@@ -1,17 +1,427 @@
+import asyncio
+import hashlib
 import re
 import json
+import time
 from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 from dateutil.parser import parse
+from pydantic import BaseModel, Field
+from config.config import validation_concurrency, redis_client, validation_cache_size, validation_cache_ttl, \
+    validation_mode, prefilter_enabled, validation_batch_size, semantic_dedupe_enabled, topic_cluster_threshold, \
+    get_llm, get_agent_executor
+from llm.dedupe import market_index, cluster, same_specifics
 from llm.feedback import collect_feedback_and_improve
+from llm.prefilter import market_prefilter
+from utils.cache import TieredCache
+from utils.metrics import timed, record_message_usage
+from utils.singleflight import SingleFlight
+from utils.tavily_search import search_util as default_search_util
 
+# Bounds how many validations may wait on the LLM / Tavily at the same time
+_validation_semaphore = asyncio.Semaphore(validation_concurrency)
 
-# Analyze the market description
-def validating_market(description: str, agent_executor, search_util):
+# Validation results keyed on the normalized description
+validation_cache = TieredCache("csb_validation", redis_client, maxsize=validation_cache_size)
+
+# Concurrent validations of equivalent descriptions share one analysis
+validation_flights = SingleFlight("validation")
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "before", "by", "did", "do", "does", "end", "for", "from", "has",
+    "have", "in", "is", "it", "its", "more", "of", "on", "or", "than", "that", "the", "this", "to", "was",
+    "what", "when", "which", "will", "with", "would",
+}
+
+
+def normalize_description(description: str) -> str:
+    """
+    Normalize a market description so that near-identical texts share a cache key.
+    Mentions are dropped, whitespace is collapsed and the text is lower-cased.
+    """
+    text = re.sub(r"@\w+", " ", description)
+    return " ".join(text.split()).lower()
+
+
+def validation_cache_key(description: str) -> str:
+    """Content-addressed cache key of a market description."""
+    return hashlib.sha256(normalize_description(description).encode("utf-8")).hexdigest()
+
+
+def topic_key(description: str) -> str:
+    """
+    Topic of a market or bet: its significant words without numbers, so that
+    descriptions of the same subject with different thresholds or dates share one search.
+    """
+    words = re.findall(r"[a-z]{2,}", normalize_description(description))
+    return " ".join(sorted({word for word in words if word not in _STOPWORDS}))
+
+
+def batch_search_query(descriptions: List[str], max_words: int = 12) -> str:
+    """
+    Search query covering a cluster of descriptions: the significant words
+    found in at least half of them, most common first. A single description,
+    or a cluster without such words, is searched as is.
+    """
+    if len(descriptions) == 1:
+        return descriptions[0]
+    counts: Dict[str, int] = {}
+    for description in descriptions:
+        for word in dict.fromkeys(re.findall(r"[a-z0-9$%]{2,}", normalize_description(description))):
+            if word not in _STOPWORDS:
+                counts[word] = counts.get(word, 0) + 1
+    shared = [word for word, count in counts.items() if count * 2 >= len(descriptions)]
+    shared.sort(key=lambda word: -counts[word])
+    return " ".join(shared[:max_words]) or descriptions[0]
+
+
+async def _cluster_topics(descriptions: List[str]) -> List[List[int]]:
+    """
+    Group descriptions that can share one search: by embedding similarity
+    when semantic dedupe is enabled, by `topic_key` otherwise or if embedding fails.
+    """
+    if semantic_dedupe_enabled:
+        try:
+            return await cluster([normalize_description(d) for d in descriptions], topic_cluster_threshold)
+        except Exception as e:
+            print(f"Embedding descriptions failed, clustering by topic words: {e}")
+    topics: Dict[str, List[int]] = {}
+    for i, description in enumerate(descriptions):
+        topics.setdefault(topic_key(description), []).append(i)
+    return list(topics.values())
+
+
+def _validation_ttl(analysis_result: dict) -> int:
+    """
+    Cache lifetime of a validation result: valid markets are kept until their
+    due date (capped at the default TTL), everything else for the default TTL.
+    Returns 0 for markets that are already past due.
+    """
+    due_date = analysis_result.get("due_date")
+    if not analysis_result.get("is_valid") or not due_date:
+        return validation_cache_ttl
+    try:
+        remaining = parse(due_date).timestamp() - time.time()
+    except Exception:
+        return validation_cache_ttl
+    return max(0, min(validation_cache_ttl, int(remaining)))
+
+
+class MarketExtraction(BaseModel):
+    """Due date and outcomes extracted from a market description."""
+    has_due_date: bool = Field(description="Whether the description contains a due date.")
+    due_date: Optional[str] = Field(description="The due date in ISO format, or null.")
+    has_two_outcomes: bool = Field(description="Whether the description is a binary question.")
+    outcomes: List[str] = Field(description='Up to two possible outcomes, e.g. ["Yes", "No"].')
+
+
+class MarketAnalysis(MarketExtraction):
+    """Extraction and verdict of a market description in a single answer."""
+    is_valid: bool = Field(description="Whether the bet is realistic and valid given the relevant information.")
+
+
+class NumberedMarketAnalysis(MarketAnalysis):
+    """Analysis of one market of a batch."""
+    market: int = Field(description="Number of the market being analyzed.")
+
+
+class MarketAnalyses(BaseModel):
+    """Analyses of a batch of market descriptions."""
+    markets: List[NumberedMarketAnalysis]
+
+
+def _apply_extraction(analysis_result: dict, extraction: dict):
+    """
+    Copy the extracted fields into `analysis_result`, standardizing the due date.
+    """
+    has_due_date = extraction.get("has_due_date", False)
+    due_date_str = extraction.get("due_date")
+
+    analysis_result["has_due_date"] = has_due_date
+    analysis_result["has_two_outcomes"] = extraction.get("has_two_outcomes", False)
+    analysis_result["outcomes"] = extraction.get("outcomes", [])
+
+    if has_due_date and due_date_str:
+        # Try to standardize the due date
+        try:
+            due_date = parse(due_date_str, fuzzy=True)
+            analysis_result["due_date"] = due_date.isoformat()
+        except Exception:
+            analysis_result["has_due_date"] = False
+            analysis_result["due_date"] = None
+    else:
+        analysis_result["due_date"] = None
+
+
+def _rejected_result(description: str, reason: str):
+    """
+    Analysis result and steps of a description rejected by the pre-filter.
+    """
+    analysis_result = {
+        "has_due_date": False,
+        "due_date": None,
+        "has_two_outcomes": False,
+        "outcomes": [],
+        "is_valid": False
+    }
+    steps = [{
+        "step": "Step 0: Pre-filter market description",
+        "input": description,
+        "output": f"Rejected locally: {reason}"
+    }]
+    return analysis_result, steps
+
+
+# Receives the progress events ("step", "token") of a validation as they happen
+EventCallback = Callable[[str, dict], Awaitable[None]]
+
+
+async def _emit(on_event: Optional[EventCallback], event: str, data: dict):
+    if on_event is not None:
+        await on_event(event, data)
+
+
+class _ReusedEvidence:
+    """Search utility answering every query with the relevant information found for another market."""
+
+    def __init__(self, content: str):
+        self.content = content
+
+    async def asearch(self, query: str, search_depth: str = "basic") -> List[Dict]:
+        return [{"content": self.content}]
+
+    def extract_content(self, results: List[Dict]) -> List[str]:
+        return [result["content"] for result in results]
+
+
+def _evidence(steps: list) -> Optional[str]:
+    """Relevant information the verdict of a validation was based on, if it got that far."""
+    for step in steps:
+        if step.get("step") == 3 and isinstance(step.get("input"), dict):
+            return step["input"].get("combined_content")
+    return None
+
+
+async def _semantic_match(description: str) -> Tuple[Optional[dict], Optional[_ReusedEvidence]]:
+    """
+    Look up the validated markets similar to a description.
+
+    Returns:
+        tuple: The validation of the most similar market naming the same
+            amounts, dates and entities, with a step recording the match, or
+            None. Otherwise the search evidence of the most similar market, if
+            any, so that only the extraction and verdict are run again.
+    """
+    text = normalize_description(description)
+    try:
+        match = await market_index.search(
+            text, lambda entry: same_specifics(description, entry["payload"].get("description", entry["text"])))
+        similar = match or await market_index.search(text)
+    except Exception as e:
+        print(f"Semantic lookup failed: {e}")
+        return None, None
+    if similar is None:
+        return None, None
+    entry, similarity = similar
+    if match is None:
+        evidence = _evidence(entry["payload"]["steps"])
+        return None, _ReusedEvidence(evidence) if evidence is not None else None
+    step = {
+        "step": "Step 0: Match a validated market",
+        "input": description,
+        "output": {"matched": entry["text"], "similarity": round(similarity, 4)}
+    }
+    return {"analysis_result": entry["payload"]["analysis_result"], "steps": [step] + entry["payload"]["steps"]}, None
+
+
+async def _remember(description: str, analysis_result: dict, steps: list, ttl: int):
+    """Add a validated market to the semantic index."""
+    try:
+        await market_index.add(normalize_description(description),
+                               {"description": description, "analysis_result": analysis_result, "steps": steps},
+                               ttl=ttl)
+    except Exception as e:
+        print(f"Failed to index validated market: {e}")
+
+
+def _elapsed_ms(started: float) -> float:
+    """Milliseconds since a `time.perf_counter()` reading, for the step records."""
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+async def _arun_agent(agent_executor, query: str, stage: str, on_event: Optional[EventCallback] = None) -> str:
+    """
+    Stream the agent asynchronously and return the content of its final message.
+
+    Args:
+        agent_executor: The LangGraph agent used to answer the query.
+        query (str): The user query sent to the agent.
+        stage (str): Pipeline stage the call is timed and its tokens counted under.
+        on_event (EventCallback): Optional callback receiving each LLM token as a "token" event.
+
+    Returns:
+        str: Content of the last message produced by the agent.
+    """
+    messages = []
+    with timed(stage):
+        if on_event is None:
+            async for event in agent_executor.astream(
+                    {"messages": [("user", query)]}, stream_mode="values"
+            ):
+                messages = event["messages"]
+        else:
+            # "messages" mode yields the LLM tokens, "values" mode the final state
+            async for mode, event in agent_executor.astream(
+                    {"messages": [("user", query)]}, stream_mode=["values", "messages"]
+            ):
+                if mode == "values":
+                    messages = event["messages"]
+                    continue
+                chunk, _ = event
+                if getattr(chunk, "type", None) == "AIMessageChunk" and isinstance(chunk.content, str) \
+                        and chunk.content:
+                    await on_event("token", {"stage": stage, "content": chunk.content})
+    record_message_usage(stage, messages)
+    return messages[-1].content if messages else ""
+
+
+# Analyze the market description without blocking the event loop
+async def avalidating_market(description: str, agent_executor=None, search_util=None, use_cache: bool = True,
+                             mode: Optional[str] = None, on_event: Optional[EventCallback] = None):
+    """
+    Analyze the market description and validate its components, reusing a
+    cached result for an equivalent description when one is available.
+    Concurrent calls for equivalent descriptions wait on a single analysis,
+    except when progress events are requested. When semantic dedupe is
+    enabled, paraphrases of a validated market naming the same amounts, dates
+    and entities are answered with its result, and other similar markets
+    reuse its search evidence.
+    Descriptions rejected by the local pre-filter skip the LLM and search.
+
+    Args:
+        description (str): The market description.
+        agent_executor: The LangGraph agent used for the LLM steps. Defaults to the shared agent.
+        search_util (TavilySearchUtil): The search utility used for step 2. Defaults to the shared one.
+        use_cache (bool): Whether to read and write the validation cache.
+        mode (str): "agent" to use the tool-bearing agent, "lean" to use a plain
+            chat model with structured output. Defaults to VALIDATION_MODE.
+        on_event (EventCallback): Optional callback receiving each step as a
+            "step" event and each LLM token as a "token" event as they are produced.
+
+    Returns:
+        dict: Analysis results including completeness, outcomes, and verifiability.
+    """
+    if prefilter_enabled:
+        plausible, reason = market_prefilter.classify(description)
+        if not plausible:
+            analysis_result, steps = _rejected_result(description, reason)
+            await _emit(on_event, "step", steps[0])
+            return analysis_result, steps
+
+    search_util = search_util or default_search_util
+    mode = mode or validation_mode
+    key = validation_cache_key(description)
+
+    async def analyze(search=None):
+        search = search or search_util
+        if mode == "lean":
+            return await _analyze_market_lean(description, get_llm(), search, on_event)
+        # Building the shared agent loads the CDP wallet the first time, so keep it off the event loop
+        executor = agent_executor or await asyncio.to_thread(get_agent_executor)
+        return await _analyze_market(description, executor, search, on_event)
+
+    async def validate():
+        if not use_cache:
+            return await analyze()
+
+        cached = await validation_cache.get(key)
+        evidence = None
+        if cached is None and semantic_dedupe_enabled:
+            cached, evidence = await _semantic_match(description)
+            # Later lookups of this exact description skip the semantic search
+            ttl = _validation_ttl(cached["analysis_result"]) if cached is not None else 0
+            if ttl > 0:
+                await validation_cache.set(key, cached, ttl=ttl)
+        if cached is not None:
+            for step in cached["steps"]:
+                await _emit(on_event, "step", step)
+            return cached["analysis_result"], cached["steps"]
+
+        # A similar market with other amounts, dates or entities only lends its search evidence
+        analysis_result, steps = await analyze(evidence)
+
+        # Do not cache results of failed analyses so they can be retried
+        ttl = _validation_ttl(analysis_result)
+        if ttl > 0 and not any("error" in step for step in steps):
+            await validation_cache.set(key, {"analysis_result": analysis_result, "steps": steps}, ttl=ttl)
+            if semantic_dedupe_enabled:
+                await _remember(description, analysis_result, steps, ttl)
+        return analysis_result, steps
+
+    if on_event is not None:
+        # A coalesced caller would miss the progress of the shared analysis
+        return await validate()
+    return await validation_flights.do(f"{mode}:{use_cache}:{key}", validate)
+
+
+async def astream_validating_market(description: str, agent_executor=None, search_util=None,
+                                    use_cache: bool = True, mode: Optional[str] = None
+                                    ) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Validate the market description, yielding its progress as it is produced.
+
+    Yields a "step" event for each recorded step and a "token" event for each
+    LLM token of the agent, then a final "result" event with the analysis
+    result and all steps, or an "error" event if the validation failed.
+    Closing the iterator cancels the validation.
+
+    Args:
+        description (str): The market description.
+        agent_executor: The LangGraph agent used for the LLM steps. Defaults to the shared agent.
+        search_util (TavilySearchUtil): The search utility used for step 2. Defaults to the shared one.
+        use_cache (bool): Whether to read and write the validation cache.
+        mode (str): "agent" or "lean". Defaults to VALIDATION_MODE.
+
+    Yields:
+        tuple: The event name and its data.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def on_event(event: str, data: dict):
+        events.put_nowait((event, data))
+
+    async def run():
+        try:
+            analysis_result, steps = await avalidating_market(
+                description, agent_executor, search_util, use_cache, mode, on_event)
+            events.put_nowait(("result", {"analyze_result": analysis_result, "steps": steps}))
+        except Exception as e:
+            print(f"Error streaming validation: {e}")
+            events.put_nowait(("error", {"error": str(e)}))
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            event, data = await events.get()
+            yield event, data
+            if event in ("result", "error"):
+                return
+    finally:
+        task.cancel()
+
+
+async def _analyze_market(description: str, agent_executor, search_util, on_event: Optional[EventCallback] = None):
     """
     Analyze the market description and validate its components.
 
+    The LLM and search calls are awaited, so concurrent validations overlap
+    their network waits instead of serializing on the event loop.
+
     Args:
         description (str): The market description.
+        agent_executor: The LangGraph agent used for the LLM steps.
+        search_util (TavilySearchUtil): The search utility used for step 2.
+        on_event (EventCallback): Optional callback receiving the steps and LLM tokens.
 
     Returns:
         dict: Analysis results including completeness, outcomes, and verifiability.
@@ -38,115 +448,410 @@ def validating_market(description: str, agent_executor, search_util):
     Description: "{description}"
     """
 
-    try:
-        # Use the `stream` method to process LLM response
-        analyze_event = agent_executor.stream(
-            {"messages": [("user", analyze_query)]}, stream_mode="values"
-        )
-        analyze_response = [event["messages"][-1].content for event in analyze_event]
-        response_text = analyze_response[-1]
-
-        cleaned_content = re.sub(r"```(?:json)?", "", response_text).strip()
-        parsed_response = json.loads(cleaned_content)
-
-        # Extract fields from parsed response
-        has_due_date = parsed_response.get("has_due_date", False)
-        has_two_outcomes = parsed_response.get("has_two_outcomes", False)
-        due_date_str = parsed_response.get("due_date")
-        outcomes = parsed_response.get("outcomes", [])
-
-        analysis_result["has_due_date"] = has_due_date
-        analysis_result["has_two_outcomes"] = has_two_outcomes
-        analysis_result["outcomes"] = outcomes
-
-        if has_due_date and due_date_str:
-            # Try to standardize the due date
-            try:
-                due_date = parse(due_date_str, fuzzy=True)
-                analysis_result["due_date"] = due_date.isoformat()
-            except Exception:
-                analysis_result["has_due_date"] = False
-                analysis_result["due_date"] = None
-        else:
-            analysis_result["due_date"] = None
-        # Record Step 1
-        steps.append({
-            "step": 1,
-            "input": description,
-            "description": "Check if the market description is valid.",
-            "output": {
-                "has_due_date": analysis_result["has_due_date"],
-                "due_date": analysis_result["due_date"],
-            }
-        })
-        print(steps[0])
-        # Proceed only if both due date and two outcomes are valid
-        if has_due_date and has_two_outcomes:
-            # Step 2: Use TavilySearchUtil to perform an online search
-            search_results = search_util.search(description)
-            content_list = search_util.extract_content(search_results)
-            combined_content = " ".join(content_list)
+    async with _validation_semaphore:
+        try:
+            step_started = time.perf_counter()
+            response_text = await _arun_agent(agent_executor, analyze_query, "llm_extraction", on_event)
+
+            cleaned_content = re.sub(r"```(?:json)?", "", response_text).strip()
+            parsed_response = json.loads(cleaned_content)
 
+            # Extract fields from parsed response
+            has_due_date = parsed_response.get("has_due_date", False)
+            has_two_outcomes = parsed_response.get("has_two_outcomes", False)
+            with timed("date_parsing"):
+                _apply_extraction(analysis_result, parsed_response)
+            # Record Step 1
             steps.append({
-                "step": 2,
+                "step": 1,
                 "input": description,
-                "description": "Check if the market has only two outcomes.",
+                "description": "Check if the market description is valid.",
                 "output": {
-                    "has_two_outcomes": analysis_result["has_two_outcomes"],
-                }
+                    "has_due_date": analysis_result["has_due_date"],
+                    "due_date": analysis_result["due_date"],
+                },
+                "duration_ms": _elapsed_ms(step_started)
             })
-            print(steps[1])
+            print(steps[0])
+            await _emit(on_event, "step", steps[0])
+            # Proceed only if both due date and two outcomes are valid
+            if has_due_date and has_two_outcomes:
+                # Step 2: Use TavilySearchUtil to perform an online search
+                step_started = time.perf_counter()
+                with timed("tavily_search"):
+                    search_results = await search_util.asearch(description)
+                content_list = search_util.extract_content(search_results)
+                combined_content = " ".join(content_list)
 
-            # Step 3: Pass the search results to LLM to judge if the bet is valid
-            validation_query = f"""
-                Given the following market description and relevant information, determine if the bet is realistic and valid.
+                steps.append({
+                    "step": 2,
+                    "input": description,
+                    "description": "Check if the market has only two outcomes.",
+                    "output": {
+                        "has_two_outcomes": analysis_result["has_two_outcomes"],
+                    },
+                    "duration_ms": _elapsed_ms(step_started)
+                })
+                print(steps[1])
+                await _emit(on_event, "step", steps[1])
 
-                Market Description: "{description}"
+                # Step 3: Pass the search results to LLM to judge if the bet is valid
+                validation_query = f"""
+                    Given the following market description and relevant information, determine if the bet is realistic and valid.
 
-                Relevant Information: "{combined_content}"
+                    Market Description: "{description}"
 
-                Please answer with "true" if the bet is realistic and valid, or "false" if the bet is unrealistic or invalid.
-                """
+                    Relevant Information: "{combined_content}"
 
-            validation_event = agent_executor.stream(
-                {"messages": [("user", validation_query)]},
-                stream_mode="values"
-            )
-            validation_response = [
-                event["messages"][-1].content for event in validation_event
-            ]
-            validation_text = validation_response[-1].strip().lower()
+                    Please answer with "true" if the bet is realistic and valid, or "false" if the bet is unrealistic or invalid.
+                    """
+
+                step_started = time.perf_counter()
+                validation_response = await _arun_agent(agent_executor, validation_query, "llm_verdict", on_event)
+                validation_text = validation_response.strip().lower()
+
+                if "true" in validation_text:
+                    analysis_result["is_valid"] = True
+                else:
+                    analysis_result["is_valid"] = False
 
-            if "true" in validation_text:
-                analysis_result["is_valid"] = True
+                # Record Step 3
+                steps.append({
+                    "step": 3,
+                    "input": {"description": description, "combined_content": combined_content},
+                    "output": {
+                        "is_verifable": analysis_result["is_valid"],
+                    },
+                    "duration_ms": _elapsed_ms(step_started)
+                })
+                print(steps[2])
+                await _emit(on_event, "step", steps[2])
             else:
                 analysis_result["is_valid"] = False
+                steps.append({
+                    "step": "Step 2: Perform online search",
+                    "input": description,
+                    "output": "Skipped due to incomplete analysis result."
+                })
+                await _emit(on_event, "step", steps[-1])
 
-            # Record Step 3
+        except Exception as e:
+            print(f"Error during analysis: {e}")
+            error_message = f"Error during analysis: {e}"
             steps.append({
-                "step": 3,
-                "input": {"description": description, "combined_content": combined_content},
-                "output": {
-                    "is_verifable": analysis_result["is_valid"],
-                }
+                "step": "Step 1: Analyze market description",
+                "input": description,
+                "error": error_message
             })
-            print(steps[2])
-        else:
-            analysis_result["is_valid"] = False
+            await _emit(on_event, "step", steps[-1])
+    print(analysis_result)
+    return analysis_result, steps
+
+
+async def _analyze_market_lean(description: str, chat_model, search_util,
+                               on_event: Optional[EventCallback] = None):
+    """
+    Analyze the market description with a plain chat model and structured output.
+
+    The search runs first so that extraction and verdict are answered in a
+    single LLM call. If the search fails, only the extraction is requested
+    and the market is left invalid.
+
+    Args:
+        description (str): The market description.
+        chat_model: The chat model used for the structured LLM call.
+        search_util (TavilySearchUtil): The search utility providing the relevant information.
+        on_event (EventCallback): Optional callback receiving the steps. The
+            structured answer arrives whole, so no tokens are streamed.
+
+    Returns:
+        dict: Analysis results including completeness, outcomes, and verifiability.
+    """
+    steps = []
+
+    analysis_result = {
+        "has_due_date": False,
+        "due_date": None,
+        "has_two_outcomes": False,
+        "outcomes": [],
+        "is_valid": False  # Indicates if the bet is realistic and valid
+    }
+
+    async with _validation_semaphore:
+        combined_content = None
+        search_started = time.perf_counter()
+        try:
+            with timed("tavily_search"):
+                search_results = await search_util.asearch(description)
+            combined_content = " ".join(search_util.extract_content(search_results))
+            search_ms = _elapsed_ms(search_started)
+        except Exception as e:
+            print(f"Search failed, validating without relevant information: {e}")
             steps.append({
                 "step": "Step 2: Perform online search",
                 "input": description,
-                "output": "Skipped due to incomplete analysis result."
+                "error": f"Error during search: {e}"
+            })
+            await _emit(on_event, "step", steps[-1])
+
+        try:
+            if combined_content is not None:
+                query = f"""
+                Analyze the following market description using the relevant information.
+                Extract whether it has a due date (in ISO format) and whether it is a binary question
+                with up to two outcomes, then decide whether the bet is realistic and valid.
+
+                Market Description: "{description}"
+
+                Relevant Information: "{combined_content}"
+                """
+                schema = MarketAnalysis
+            else:
+                query = f"""
+                Analyze the following market description. Extract whether it has a due date (in ISO format)
+                and whether it is a binary question with up to two outcomes.
+
+                Description: "{description}"
+                """
+                schema = MarketExtraction
+
+            llm_started = time.perf_counter()
+            with timed("llm_analysis"):
+                answer = await chat_model.with_structured_output(schema, include_raw=True).ainvoke(query)
+            record_message_usage("llm_analysis", [answer["raw"]])
+            if answer["parsed"] is None:
+                raise ValueError(f"Unparseable structured output: {answer['parsing_error']}")
+
+            parsed_response = answer["parsed"].model_dump()
+            with timed("date_parsing"):
+                _apply_extraction(analysis_result, parsed_response)
+            steps.insert(0, {
+                "step": 1,
+                "input": description,
+                "description": "Check if the market description is valid.",
+                "output": {
+                    "has_due_date": analysis_result["has_due_date"],
+                    "due_date": analysis_result["due_date"],
+                },
+                "duration_ms": _elapsed_ms(llm_started)
+            })
+            await _emit(on_event, "step", steps[0])
+
+            if combined_content is not None:
+                steps.append({
+                    "step": 2,
+                    "input": description,
+                    "description": "Check if the market has only two outcomes.",
+                    "output": {
+                        "has_two_outcomes": analysis_result["has_two_outcomes"],
+                    },
+                    "duration_ms": search_ms
+                })
+                await _emit(on_event, "step", steps[-1])
+                # A verdict only counts for complete binary markets
+                analysis_result["is_valid"] = bool(
+                    parsed_response.get("is_valid")
+                    and analysis_result["has_due_date"]
+                    and analysis_result["has_two_outcomes"]
+                )
+                steps.append({
+                    "step": 3,
+                    "input": {"description": description, "combined_content": combined_content},
+                    "output": {
+                        "is_verifable": analysis_result["is_valid"],
+                    }
+                })
+                await _emit(on_event, "step", steps[-1])
+
+        except Exception as e:
+            print(f"Error during analysis: {e}")
+            steps.append({
+                "step": "Step 1: Analyze market description",
+                "input": description,
+                "error": f"Error during analysis: {e}"
             })
+            await _emit(on_event, "step", steps[-1])
+    print(analysis_result)
+    return analysis_result, steps
+
+
+async def _analyze_batch(descriptions: List[str], chat_model, search_util) -> List[tuple]:
+    """
+    Analyze markets of one topic with a single search and a single structured
+    LLM call. The search runs on a query built from all the descriptions, see
+    `batch_search_query`, and serves as relevant information for all of them;
+    if it fails, every market is left invalid.
 
+    Returns:
+        list: The analysis result and steps of each description, in order.
+    """
+    combined_content = None
+    search_query = batch_search_query(descriptions)
+    search_started = time.perf_counter()
+    search_error = None
+    try:
+        with timed("tavily_search"):
+            search_results = await search_util.asearch(search_query)
+        combined_content = " ".join(search_util.extract_content(search_results))
     except Exception as e:
-        print(f"Error during analysis: {e}")
-        error_message = f"Error during analysis: {e}"
+        print(f"Batch search failed, validating without relevant information: {e}")
+        search_error = f"Error during search: {e}"
+    search_ms = _elapsed_ms(search_started)
+
+    market_lines = "\n".join(f'Market {number}: "{description}"'
+                             for number, description in enumerate(descriptions, start=1))
+    query = f"""
+    Analyze each of the following market descriptions. For each market, extract whether it has a due date
+    (in ISO format) and whether it is a binary question with up to two outcomes, then decide whether the bet
+    is realistic and valid given the relevant information. Answer once per market, using its number.
+
+    {market_lines}
+
+    Relevant Information: "{combined_content or 'None available.'}"
+    """
+
+    llm_started = time.perf_counter()
+    try:
+        with timed("llm_analysis"):
+            answer = await chat_model.with_structured_output(MarketAnalyses, include_raw=True).ainvoke(query)
+        record_message_usage("llm_analysis", [answer["raw"]])
+        if answer["parsed"] is None:
+            raise ValueError(f"Unparseable structured output: {answer['parsing_error']}")
+        by_market = {analysis.market: analysis.model_dump() for analysis in answer["parsed"].markets}
+        llm_error = None
+    except Exception as e:
+        print(f"Error during batch analysis: {e}")
+        by_market = {}
+        llm_error = f"Error during analysis: {e}"
+    llm_ms = _elapsed_ms(llm_started)
+
+    results = []
+    for number, description in enumerate(descriptions, start=1):
+        analysis_result = {
+            "has_due_date": False,
+            "due_date": None,
+            "has_two_outcomes": False,
+            "outcomes": [],
+            "is_valid": False  # Indicates if the bet is realistic and valid
+        }
+        steps = []
+        parsed_response = by_market.get(number)
+        if parsed_response is None:
+            steps.append({
+                "step": "Step 1: Analyze market description",
+                "input": description,
+                "error": llm_error or "Error during analysis: the market was not analyzed."
+            })
+            results.append((analysis_result, steps))
+            continue
+
+        with timed("date_parsing"):
+            _apply_extraction(analysis_result, parsed_response)
         steps.append({
-            "step": "Step 1: Analyze market description",
+            "step": 1,
             "input": description,
-            "error": error_message
+            "description": "Check if the market description is valid.",
+            "output": {
+                "has_due_date": analysis_result["has_due_date"],
+                "due_date": analysis_result["due_date"],
+            },
+            "duration_ms": llm_ms
         })
-    print(analysis_result)
-    return analysis_result, steps
+        if search_error is not None:
+            steps.append({
+                "step": "Step 2: Perform online search",
+                "input": search_query,
+                "error": search_error
+            })
+        else:
+            steps.append({
+                "step": 2,
+                "input": search_query,
+                "description": "Check if the market has only two outcomes.",
+                "output": {
+                    "has_two_outcomes": analysis_result["has_two_outcomes"],
+                },
+                "duration_ms": search_ms
+            })
+            # A verdict only counts for complete binary markets
+            analysis_result["is_valid"] = bool(
+                parsed_response.get("is_valid")
+                and analysis_result["has_due_date"]
+                and analysis_result["has_two_outcomes"]
+            )
+            steps.append({
+                "step": 3,
+                "input": {"description": description, "combined_content": combined_content},
+                "output": {
+                    "is_verifable": analysis_result["is_valid"],
+                }
+            })
+        results.append((analysis_result, steps))
+    return results
+
+
+async def avalidating_markets(descriptions: List[str], concurrency: int = validation_concurrency,
+                              search_util=None, use_cache: bool = True) -> List[Dict]:
+    """
+    Validate many market descriptions for backfills and moderation sweeps.
+
+    Pre-filtered and cached descriptions are answered directly. The rest are
+    deduplicated, clustered by topic and analyzed in batches of at most
+    `validation_batch_size` descriptions that share one search and one
+    structured LLM call, with at most `concurrency` batches in flight.
+
+    Args:
+        descriptions (List[str]): The market descriptions.
+        concurrency (int): Maximum number of batches analyzed at the same time.
+        search_util (TavilySearchUtil): The search utility. Defaults to the shared one.
+        use_cache (bool): Whether to read and write the validation cache.
+
+    Returns:
+        list: One entry per description, in request order, with its analysis result and steps.
+    """
+    search_util = search_util or default_search_util
+    results: List[Optional[tuple]] = [None] * len(descriptions)
+
+    # Indexes of the descriptions sharing each cache key
+    pending: Dict[str, List[int]] = {}
+    for i, description in enumerate(descriptions):
+        if prefilter_enabled:
+            plausible, reason = market_prefilter.classify(description)
+            if not plausible:
+                results[i] = _rejected_result(description, reason)
+                continue
+        pending.setdefault(validation_cache_key(description), []).append(i)
+
+    if use_cache and pending:
+        keys = list(pending)
+        for key, cached in zip(keys, await validation_cache.get_many(keys)):
+            if cached is not None:
+                for i in pending.pop(key):
+                    results[i] = cached["analysis_result"], cached["steps"]
+
+    keys = list(pending)
+    topics = await _cluster_topics([descriptions[pending[key][0]] for key in keys])
+    batches = [
+        [keys[member] for member in members[start:start + validation_batch_size]]
+        for members in topics
+        for start in range(0, len(members), validation_batch_size)
+    ]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def validate_batch(keys: List[str]):
+        async with semaphore:
+            analyses = await _analyze_batch([descriptions[pending[key][0]] for key in keys], get_llm(), search_util)
+        for key, (analysis_result, steps) in zip(keys, analyses):
+            for i in pending[key]:
+                results[i] = analysis_result, steps
+            # Do not cache results of failed analyses so they can be retried
+            ttl = _validation_ttl(analysis_result)
+            if use_cache and ttl > 0 and not any("error" in step for step in steps):
+                await validation_cache.set(key, {"analysis_result": analysis_result, "steps": steps}, ttl=ttl)
+
+    await asyncio.gather(*(validate_batch(keys) for keys in batches))
+    return [
+        {"description": description, "analyze_result": analysis_result, "steps": steps}
+        for description, (analysis_result, steps) in zip(descriptions, results)
+    ]
 
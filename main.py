@@ -1,43 +1,93 @@
 # main.py
 
+import json
 import re
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from dateutil.parser import parse
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-
-from CDP.contract import set_bet_result
-from config.config import agent_executor
+from typing import List, Optional
+
+from CDP.bet_indexer import bet_indexer
+from CDP.bet_reader import bet_reader
+from CDP.tx_queue import tx_queue
+from config.config import judge_concurrency, judge_batch_max, validation_concurrency, validation_batch_max, \
+    bet_read_max, indexer_enabled
+from llm.dedupe import bet_index, same_specifics
 from llm.feedback import collect_feedback_and_improve
 from llm.introduce import generate_self_intro_tweet
-from llm.validate import validating_market
-from twitter.tweet import fetch_and_validate_replies, get_is_fetch_and_validate_active, \
-    set_is_fetch_and_validate_active, get_fetch_and_validate_stop_event, post_tweet
+from llm.judge import ajudge_bet, ajudge_bets
+from llm.prefilter import market_prefilter
+from llm.validate import avalidating_market, avalidating_markets, astream_validating_market, normalize_description
+from twitter.tweet import post_tweet
+from twitter.watcher import reply_watcher
+from utils.http_clients import http_clients
+from utils.job_queue import job_queue
+from utils.metrics import registry
 from utils.tavily_search import search_util
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await tx_queue.start()
+    await reply_watcher.start()
+    if indexer_enabled:
+        await bet_indexer.start()
+    try:
+        yield
+    finally:
+        if indexer_enabled:
+            await bet_indexer.stop()
+        await reply_watcher.stop()
+        await tx_queue.stop()
+        await http_clients.aclose()
+
+
 # FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Request data model
 class BetRequest(BaseModel):
-    description: str  # Bet description (e.g., weather in Bangkok tomorrow)
+    description: str = ""  # Bet description (e.g., weather in Bangkok tomorrow), looked up in the bet index if empty
     urls: list = []  # Optional list of data source URLs for LLM to query
     address: str
 
+# Request model for judge_bets API
+class JudgeBetsRequest(BaseModel):
+    bets: List[BetRequest]
+    concurrency: Optional[int] = None  # Defaults to JUDGE_CONCURRENCY
+
 #  Request model for validate_market API
 class ValidateMarketRequest(BaseModel):
     description: str  # Market description as input
 
 
+# Request model for validate_markets API
+class ValidateMarketsRequest(BaseModel):
+    descriptions: List[str]
+    concurrency: Optional[int] = None  # Defaults to VALIDATION_CONCURRENCY
+
+
 class FetchAndAnalyzeRepliesRequest(BaseModel):
     user_id: str
 
 
+class StopFetchAndValidateRequest(BaseModel):
+    user_id: Optional[str] = None  # Stop every watched user when omitted
+
+
 class PostTweetRequest(BaseModel):
     address: str
     message: str
 
+class BetsRequest(BaseModel):
+    addresses: List[str]
+
+
 class FeedbackRequest(BaseModel):
     message_json: str
 
@@ -77,38 +127,22 @@ def extract_urls(search_results):
     return urls
 
 
-async def run_fetch_and_validate_task(user_id):
-    """
-    Run fetch and validate task in an asyncio loop.
-    """
-    try:
-        await fetch_and_validate_replies(user_id)
-    finally:
-        set_is_fetch_and_validate_active(False)
-
-
-def judge_bet(request: BetRequest):
+async def judge_bet(request: BetRequest):
     """
-    Use Tavily search to directly determine the correctness of a bet.
+    Judge a bet from the evidence found by search and in its data source URLs.
 
     Args:
         request (BetRequest): Contains the bet description and optional URLs.
 
     Returns:
-        bool: True if the bet is deemed valid, False otherwise.
+        dict: The verdict (None if undecided), confidence, sources and queued transaction id.
     """
     try:
-        # Use Tavily search to perform judgment based on description
-        print("Performing Tavily search for:", request.description)
-        keywords = ["rise", "fall", "increase", "decrease", "exceed", "below"]  # Example keywords for market bets
-        is_valid = search_util.search_and_judge(query=request.description, keywords=keywords)
-        print(is_valid)
-        result = int(is_valid) + 1
-        set_bet_result(request.address, result)
-        return is_valid
+        return await ajudge_bet(request.description, request.address, request.urls)
     except Exception as e:
         print(f"Error in judge_bet: {e}")
-        return False
+        return {"address": request.address, "verdict": None, "confidence": 0.0, "sources": [],
+                "reasoning": None, "tx_id": None, "error": str(e)}
 
 
 @app.post("/validate_market")
@@ -124,7 +158,7 @@ async def validate_market(request: ValidateMarketRequest):
     """
     try:
         # Call analyze_market function to process the description
-        analyze_result, steps = validating_market(request.description, agent_executor, search_util)
+        analyze_result, steps = await avalidating_market(request.description)
 
         # Return the analysis result and steps
         return {
@@ -135,85 +169,328 @@ async def validate_market(request: ValidateMarketRequest):
         # Handle and return any exceptions
         raise HTTPException(status_code=500, detail=f"Error processing request: {e}")
 
+
+@app.post("/validate_markets")
+async def validate_markets(request: ValidateMarketsRequest):
+    """
+    Validate many market descriptions at once, sharing searches and LLM calls
+    between descriptions of the same topic.
+
+    Args:
+        request (ValidateMarketsRequest): The descriptions and an optional concurrency limit.
+
+    Returns:
+        dict: Per-description analysis results and steps in request order.
+    """
+    if len(request.descriptions) > validation_batch_max:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {validation_batch_max} descriptions can be validated per request")
+    concurrency = min(request.concurrency or validation_concurrency, validation_concurrency)
+    return {"results": await avalidating_markets(request.descriptions, concurrency)}
+
+
+async def _validation_events(description: str):
+    """
+    Format the progress of a validation as Server-Sent Events.
+    """
+    # Sent immediately so the client sees the first byte before any LLM call
+    yield "event: started\ndata: {}\n\n"
+    async for event, data in astream_validating_market(description):
+        yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _validation_stream(description: str) -> StreamingResponse:
+    return StreamingResponse(
+        _validation_events(description),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/validate_market/stream")
+async def validate_market_stream(request: ValidateMarketRequest):
+    """
+    Validate the market description, streaming its progress as Server-Sent Events.
+
+    Emits a "started" event, then a "step" event per validation step and a
+    "token" event per LLM token as they are produced, and finally a "result"
+    event with the same body as /validate_market, or an "error" event.
+
+    Args:
+        request (ValidateMarketRequest): Contains the market description.
+
+    Returns:
+        StreamingResponse: The text/event-stream of the validation.
+    """
+    return _validation_stream(request.description)
+
+
+@app.get("/validate_market/stream")
+async def validate_market_stream_get(description: str):
+    """
+    Same as POST /validate_market/stream, for browser `EventSource` clients.
+    """
+    return _validation_stream(description)
+
+
+@app.get("/bets/{address}")
+async def get_bet_endpoint(address: str):
+    """
+    Return the on-chain state of a bet contract.
+
+    Args:
+        address (str): Address of the bet contract.
+
+    Returns:
+        dict: The bet fields, its state ("none", "open", "closed" or "cancelled") and participants.
+    """
+    try:
+        bet = await bet_reader.get_bet(address)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid address: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Error reading bet: {e}")
+    if bet["error"]:
+        raise HTTPException(status_code=404, detail=bet["error"])
+    return {"status": 200, "message": "success", "data": bet}
+
+
+@app.post("/bets")
+async def get_bets_endpoint(request: BetsRequest):
+    """
+    Return the on-chain state of many bet contracts, read with batched calls.
+
+    Args:
+        request (BetsRequest): Addresses of the bet contracts.
+
+    Returns:
+        dict: One entry per address in request order, with an error for addresses that are not opened bets.
+    """
+    if len(request.addresses) > bet_read_max:
+        raise HTTPException(status_code=400, detail=f"At most {bet_read_max} bets can be read per request")
+    try:
+        bets = await bet_reader.get_bets(request.addresses)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid address: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Error reading bets: {e}")
+    return {"status": 200, "message": "success", "data": bets}
+
+
+@app.post("/bets/duplicate")
+async def find_duplicate_bet(request: ValidateMarketRequest):
+    """
+    Check whether a bet contract was already created for a paraphrase of the
+    market description, before deploying a new one.
+
+    Args:
+        request (ValidateMarketRequest): Contains the market description.
+
+    Returns:
+        dict: Whether a duplicate exists, with its description and similarity.
+    """
+    try:
+        match = await bet_index.search(normalize_description(request.description),
+                                       lambda entry: same_specifics(request.description, entry["payload"]["description"]))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing request: {e}")
+    if match is None:
+        return {"duplicate": False, "description": None, "similarity": None}
+    entry, similarity = match
+    return {"duplicate": True, "description": entry["payload"]["description"], "similarity": round(similarity, 4)}
+
 # FastAPI endpoint
 @app.post("/judge_bet")
 async def judge_bet_endpoint(request: BetRequest):
     try:
-        verdict = judge_bet(request)
-        return {"verdict": verdict}
+        return await judge_bet(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/start_fetch_and_validate")
-async def start_fetch_and_validate_replies(request: FetchAndAnalyzeRepliesRequest, background_tasks: BackgroundTasks):
+@app.post("/judge_bets")
+async def judge_bets_endpoint(request: JudgeBetsRequest):
     """
-    Start fetching and validating replies as a background task.
+    Judge a batch of bets concurrently.
 
     Args:
-        user_id (str): The user ID to monitor.
-        background_tasks (BackgroundTasks): FastAPI's background task manager.
+        request (JudgeBetsRequest): The bets to judge and an optional concurrency limit.
 
     Returns:
-        dict: Status message.
+        dict: Per-bet verdicts in request order.
     """
-    is_fetch_and_validate_active = get_is_fetch_and_validate_active()
-    stop_fetch_and_validate_stop_event = get_fetch_and_validate_stop_event()
+    if len(request.bets) > judge_batch_max:
+        # Every bet costs searches and LLM calls
+        raise HTTPException(status_code=413, detail=f"At most {judge_batch_max} bets can be judged per request")
+    concurrency = min(request.concurrency or judge_concurrency, judge_concurrency)
+    verdicts = await ajudge_bets([bet.model_dump() for bet in request.bets], concurrency)
+    return {"verdicts": verdicts}
 
-    user_id = request.user_id
 
-    if is_fetch_and_validate_active:
-        return {"status": 400, "message": "Fetch and validate process is already running."}
+@app.get("/transactions/{tx_id}")
+async def get_transaction_endpoint(tx_id: str):
+    """
+    Return the status (queued/submitting/submitted/confirmed/failed/unknown) of a queued contract transaction.
+    """
+    tx = await tx_queue.get(tx_id)
+    if tx is None:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return {"status": 200, "message": "success", "data": tx}
 
-    set_is_fetch_and_validate_active(True)
-    stop_fetch_and_validate_stop_event.clear()  # Ensure stop event is clear
 
-    # Start the background task
-    background_tasks.add_task(run_fetch_and_validate_task, user_id)
+@app.post("/start_fetch_and_validate")
+async def start_fetch_and_validate_replies(request: FetchAndAnalyzeRepliesRequest):
+    """
+    Start fetching and validating replies of a user. The watcher runs on
+    whichever worker owns the user, not necessarily the one serving this request.
+
+    Args:
+        request (FetchAndAnalyzeRepliesRequest): The user ID to monitor.
+
+    Returns:
+        dict: Status message.
+    """
+    if not await reply_watcher.watch(request.user_id):
+        return {"status": 400, "message": "Fetch and validate process is already running."}
     return {"status": 200, "message": "Fetch and validate process started."}
 
 
 @app.post("/stop_fetch_and_validate")
-async def stop_fetch_and_validate():
+async def stop_fetch_and_validate(request: Optional[StopFetchAndValidateRequest] = None):
     """
-    Stop the fetch and validate background process.
+    Stop fetching and validating replies of a user, or of every user.
 
     Returns:
         dict: Status message.
     """
-    is_fetch_and_validate_active = get_is_fetch_and_validate_active()
-
-    if not is_fetch_and_validate_active:
+    stopped = await reply_watcher.unwatch(request.user_id if request else None)
+    if not stopped:
         return {"status": 400, "message": "Fetch and validate process is not running."}
+    return {"status": 200, "message": "Fetch and validate process stopped.", "data": stopped}
 
-    fetch_and_validate_stop_evnet = get_fetch_and_validate_stop_event()
-    fetch_and_validate_stop_evnet.set()  # Signal to stop the task
-    set_is_fetch_and_validate_active(False)
-    return {"status": 200, "message": "Fetch and validate process stopped."}
 
+@app.get("/fetch_and_validate_status")
+async def fetch_and_validate_status():
+    """
+    List the watched users and the worker running each watcher.
 
-@app.post("/post_tweet")
-async def post_tweet_endpoint(request: PostTweetRequest):
+    Returns:
+        dict: Status message and the watched users.
+    """
+    return {"status": 200, "message": "success", "data": await reply_watcher.status()}
+
+
+def format_bet_created_tweet(address: str, message: str) -> str:
+    """
+    Build the announcement tweet of a newly created bet.
+    """
     # get local time
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    message = (
+    return (
         f"🎉 Create Bet Successfully! 🎉\n"
-        f"🏠 Contract Address: {request.address}\n"
-        f"📜 Message: {request.message}\n"
+        f"🏠 Contract Address: {address}\n"
+        f"📜 Message: {message}\n"
         f"🔗 Explore: our product url\n"
         f"⏰ Timestamp: {current_time}\n\n"
         f"Powered by our platform 🚀"
     )
 
+
+@app.post("/post_tweet")
+async def post_tweet_endpoint(request: PostTweetRequest):
+    message = format_bet_created_tweet(request.address, request.message)
+
     result = await post_tweet(message)
     return {"status": 200, "message": "success", "data": result}
 
 
+@app.post("/jobs/validate_market")
+async def enqueue_validate_market_job(request: ValidateMarketRequest):
+    """
+    Queue a market validation for the worker processes.
+
+    Returns:
+        dict: The id of the job, to poll with /jobs/{job_id}.
+    """
+    job_id = await job_queue.enqueue("validate_market", {"description": request.description})
+    return {"status": 200, "message": "success", "data": {"job_id": job_id}}
+
+
+@app.post("/jobs/judge_bet")
+async def enqueue_judge_bet_job(request: BetRequest):
+    """
+    Queue a bet judgment for the worker processes.
+
+    Returns:
+        dict: The id of the job, to poll with /jobs/{job_id}.
+    """
+    job_id = await job_queue.enqueue("judge_bet", request.model_dump())
+    return {"status": 200, "message": "success", "data": {"job_id": job_id}}
+
+
+@app.post("/jobs/post_tweet")
+async def enqueue_post_tweet_job(request: PostTweetRequest):
+    """
+    Queue the announcement tweet of a created bet for the worker processes.
+
+    Returns:
+        dict: The id of the job, to poll with /jobs/{job_id}.
+    """
+    message = format_bet_created_tweet(request.address, request.message)
+    job_id = await job_queue.enqueue("post_tweet", {"message": message})
+    return {"status": 200, "message": "success", "data": {"job_id": job_id}}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_endpoint(job_id: str):
+    """
+    Return the status (queued/running/done/failed) and result of a job.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": 200, "message": "success", "data": job}
+
+
+registry.gauge(
+    "csb_prefilter_descriptions", "Market descriptions seen by the pre-filter, by outcome.",
+    lambda: {("forwarded",): market_prefilter.stats()["forwarded"],
+             **{(f"rejected_{reason}",): count for reason, count in market_prefilter.rejected.items()}},
+    ["outcome"])
+registry.gauge(
+    "csb_search_cache_lookups", "Tavily search cache lookups, by result.",
+    lambda: {("hit",): search_util.cache_hits, ("miss",): search_util.cache_misses},
+    ["result"])
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Expose stage latencies, LLM token usage and cache/pre-filter counters in the Prometheus text format.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/feed_back")
 async def feed_back_endpoint(request: FeedbackRequest):
-    message = request.message
-    await collect_feedback_and_improve(message)
-    return {"status": 200, "message": "success"}
+    """
+    Store user feedback and fold it into the rolling feedback summary.
+
+    Args:
+        request (FeedbackRequest): JSON object with "clarity" and "suggestion" fields.
+
+    Returns:
+        dict: The current feedback summary and improved validation prompt.
+    """
+    try:
+        message = json.loads(request.message_json)
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"message_json is not valid JSON: {e}")
+    if not isinstance(message, dict):
+        raise HTTPException(status_code=400, detail="message_json must be a JSON object")
+    result = await collect_feedback_and_improve(message)
+    return {"status": 200, "message": "success", "data": result}
 
 
 @app.post("/self_introduction")
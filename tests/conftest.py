@@ -0,0 +1,16 @@
+# tests/conftest.py
+
+import os
+import sys
+
+import pytest
+
+# Run the tests from a checkout without installing the service
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def redis_client():
+    """An in-memory async Redis client, with Lua scripting through lupa."""
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeAsyncRedis()
@@ -0,0 +1,65 @@
+# tests/test_cache.py
+
+import asyncio
+
+from utils.cache import LRUCache, TieredCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache()
+    cache.set("a", 1, ttl=-1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_tiered_cache_reads_redis_and_promotes_to_local(redis_client):
+    async def scenario():
+        writer = TieredCache("test_cache", redis_client)
+        reader = TieredCache("test_cache", redis_client)
+        await writer.set("key", {"value": 1}, ttl=60)
+        assert await reader.get("key") == {"value": 1}
+        assert reader.local.get("key") == {"value": 1}
+        assert await reader.get_many(["key", "missing"]) == [{"value": 1}, None]
+
+    asyncio.run(scenario())
+
+
+def test_tiered_cache_treats_corrupt_values_as_misses(redis_client):
+    async def scenario():
+        cache = TieredCache("test_cache", redis_client)
+        await redis_client.set("test_cache:corrupt", b"\xff not json")
+        await cache.set("good", [1, 2])
+        cache.local.clear()
+        assert await cache.get("corrupt") is None
+        assert await cache.get_many(["corrupt", "good"]) == [None, [1, 2]]
+
+    asyncio.run(scenario())
+
+
+def test_tiered_cache_treats_redis_errors_as_misses():
+    class BrokenRedis:
+        def pipeline(self, transaction=True):
+            raise ConnectionError("redis is down")
+
+        async def set(self, *args, **kwargs):
+            raise ConnectionError("redis is down")
+
+    async def scenario():
+        cache = TieredCache("test_cache", BrokenRedis())
+        await cache.set("key", 1)
+        cache.local.clear()
+        assert await cache.get("key") is None
+        assert await cache.get_many(["key"]) == [None]
+
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+# tests/test_checkpoint.py
+
+import asyncio
+
+import pytest
+
+from twitter.checkpoint import ReplyCheckpointStore
+
+
+def test_load_reads_stored_checkpoints_and_defaults(redis_client):
+    async def scenario():
+        await redis_client.set("csb_last_processed_time:1", 100.0)
+        store = ReplyCheckpointStore(redis_client)
+        await store.load([1, 2], default=50.0)
+        assert store.get(1) == 100.0
+        assert store.get("2") == 50.0
+
+    asyncio.run(scenario())
+
+
+def test_checkpoint_waits_for_paging_and_the_oldest_pending_reply(redis_client):
+    async def scenario():
+        store = ReplyCheckpointStore(redis_client)
+        await store.load(["t"], default=0.0)
+        store.start("t")
+        store.track("t", "r1", 10.0)
+        store.track("t", "r2", 20.0)
+        store.complete("t", "r2")
+        # Still paging: older replies may follow
+        assert store.get("t") == 0.0
+
+        store.finish("t")
+        assert store.get("t") == pytest.approx(9.999)
+        assert store.is_tracked("t", "r1") and store.is_tracked("t", "r2")
+
+        store.complete("t", "r1")
+        assert store.get("t") == 20.0
+        # Replies at or before the checkpoint are no longer tracked individually
+        assert not store.is_tracked("t", "r2")
+
+    asyncio.run(scenario())
+
+
+def test_flush_writes_updates_in_one_batch(redis_client):
+    async def scenario():
+        store = ReplyCheckpointStore(redis_client, flush_size=2)
+        await store.load(["a", "b"], default=0.0)
+        store.track("a", "r", 5.0)
+        store.complete("a", "r")
+        await store.maybe_flush()
+        assert await redis_client.get("csb_last_processed_time:a") is None
+
+        store.track("b", "r", 7.0)
+        store.complete("b", "r")
+        await store.maybe_flush()
+        assert float(await redis_client.get("csb_last_processed_time:a")) == 5.0
+        assert float(await redis_client.get("csb_last_processed_time:b")) == 7.0
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_keeps_updates_buffered(redis_client):
+    class BrokenPipeline:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        def set(self, key, value):
+            pass
+
+        async def execute(self):
+            raise ConnectionError("Redis unavailable")
+
+    async def scenario():
+        store = ReplyCheckpointStore(redis_client)
+        await store.load(["a"], default=0.0)
+        store.track("a", "r", 5.0)
+        store.complete("a", "r")
+        working = store.redis_client
+        store.redis_client = type("BrokenRedis", (), {"pipeline": lambda self, **kwargs: BrokenPipeline()})()
+        with pytest.raises(ConnectionError):
+            await store.flush()
+
+        store.redis_client = working
+        await store.flush()
+        assert float(await redis_client.get("csb_last_processed_time:a")) == 5.0
+
+    asyncio.run(scenario())
@@ -0,0 +1,115 @@
+# tests/test_dedupe.py
+
+import asyncio
+import re
+import zlib
+
+import numpy as np
+import pytest
+
+import llm.dedupe
+import llm.validate
+from llm.dedupe import SemanticIndex, same_specifics
+
+
+async def fake_embed(texts):
+    """Bag of the words without digits, so texts differing only in amounts embed alike."""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in re.findall(r"[a-z]+", text.lower()):
+            vectors[row, zlib.crc32(word.encode()) % 64] += 1
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(autouse=True)
+def embeddings(monkeypatch):
+    monkeypatch.setattr(llm.dedupe, "embed", fake_embed)
+
+
+@pytest.mark.parametrize("text, other, same", [
+    ("Will BTC be above 100k by Friday?", "will btc be above $100,000 by friday", True),
+    ("Will Bitcoin hit 2.5 million by 2030?", "Will Bitcoin reach 2,500,000 by 2030?", True),
+    ("Will BTC be above 100k by Friday?", "Will BTC be above 150k by Friday?", False),
+    ("Will BTC be above 100k by Friday?", "Will BTC be above 100k by next Friday?", False),
+    ("Will BTC be above 100k in June?", "Will BTC be above 100k in July?", False),
+    ("Will Trump win the election in November?", "Will Biden win the election in November?", False),
+])
+def test_same_specifics(text, other, same):
+    assert same_specifics(text, other) is same
+    assert same_specifics(other, text) is same
+
+
+def test_claims_are_shared_between_processes(redis_client):
+    async def scenario():
+        first = SemanticIndex("bets", redis_client, threshold=0.8)
+        second = SemanticIndex("bets", redis_client, threshold=0.8)
+        assert await first.claim("btc above 100k by friday", {"description": "a"}) is None
+        entry, similarity = await second.claim("btc above 100k friday", {"description": "b"})
+        assert entry["payload"] == {"description": "a"}
+        assert similarity > 0.8
+        assert len(second) == 1
+
+        await second.discard("btc above 100k by friday")
+        assert await first.search("btc above 100k by friday") is None
+        assert await first.claim("btc above 100k friday", {"description": "b"}) is None
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_claims_keep_the_first_one_added(redis_client):
+    async def scenario():
+        indexes = [SemanticIndex("bets", redis_client, threshold=0.8) for _ in range(3)]
+        results = await asyncio.gather(*(
+            index.claim("eth flips btc this year", {"worker": i}) for i, index in enumerate(indexes)))
+        assert sum(result is None for result in results) == 1
+        winner = results.index(None)
+        for result in results:
+            assert result is None or result[0]["payload"] == {"worker": winner}
+        reader = SemanticIndex("bets", redis_client, threshold=0.8)
+        await reader.search("eth flips btc this year")
+        assert len(reader) == 1
+
+    asyncio.run(scenario())
+
+
+def test_accept_skips_similar_entries_with_other_specifics():
+    async def scenario():
+        index = SemanticIndex("markets", threshold=0.8)
+        await index.add("btc above 100k by friday", {"description": "BTC above 100k by Friday"})
+        await index.add("btc above 150k by friday", {"description": "BTC above 150k by Friday"})
+
+        def accept(entry):
+            return same_specifics("BTC above 150k by Friday", entry["payload"]["description"])
+
+        entry, _ = await index.search("btc above 150k by friday", accept)
+        assert entry["payload"]["description"] == "BTC above 150k by Friday"
+        assert await index.search("btc above 200k by friday", lambda entry: False) is None
+
+    asyncio.run(scenario())
+
+
+def test_expired_entries_do_not_match():
+    async def scenario():
+        index = SemanticIndex("markets", threshold=0.8)
+        await index.add("btc above 100k by friday", {}, ttl=-1)
+        assert await index.search("btc above 100k by friday") is None
+
+    asyncio.run(scenario())
+
+
+def test_similar_market_with_other_amount_only_lends_its_evidence(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(llm.validate, "market_index", SemanticIndex("markets", threshold=0.8))
+        steps = [{"step": 1}, {"step": 2}, {"step": 3, "input": {"combined_content": "BTC trades at 95k"}}]
+        await llm.validate._remember("Will BTC be above 100k by Friday?", {"is_valid": True}, steps, ttl=60)
+
+        cached, evidence = await llm.validate._semantic_match("will btc be above 100k by friday?")
+        assert cached["analysis_result"] == {"is_valid": True}
+        assert evidence is None
+
+        cached, evidence = await llm.validate._semantic_match("Will BTC be above 150k by Friday?")
+        assert cached is None
+        results = await evidence.asearch("anything")
+        assert evidence.extract_content(results) == ["BTC trades at 95k"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,93 @@
+# tests/test_job_queue.py
+
+import asyncio
+
+from utils.job_queue import JobQueue, JOB_DONE, JOB_FAILED, JOB_QUEUED
+
+
+async def consume_until(queue: JobQueue, kind: str, handler, calls: int, consumer: str = "worker"):
+    """Consume jobs until the handler has been called `calls` times."""
+    stop_event = asyncio.Event()
+    seen = []
+
+    async def counting_handler(payload):
+        seen.append(payload)
+        if len(seen) >= calls:
+            stop_event.set()
+        return await handler(payload)
+
+    await asyncio.wait_for(queue.consume(kind, counting_handler, consumer, stop_event), timeout=10)
+    return seen
+
+
+def test_completed_job_stores_its_result_and_leaves_the_stream(redis_client):
+    async def scenario():
+        queue = JobQueue(redis_client)
+        job_id = await queue.enqueue("validate", {"description": "Will BTC hit 100k by Friday?"})
+        assert (await queue.get(job_id))["status"] == JOB_QUEUED
+
+        async def handler(payload):
+            return {"length": len(payload["description"])}
+
+        await consume_until(queue, "validate", handler, calls=1)
+        job = await queue.get(job_id)
+        assert job["status"] == JOB_DONE
+        assert job["attempts"] == 1
+        assert job["result"] == {"length": 28}
+        assert await redis_client.xlen(queue._stream("validate")) == 0
+
+    asyncio.run(scenario())
+
+
+def test_failed_job_is_retried_with_backoff_then_marked_failed(redis_client):
+    async def scenario():
+        queue = JobQueue(redis_client, max_attempts=3, retry_base_delay=0)
+        job_id = await queue.enqueue("judge", {"bet": 1})
+
+        async def handler(payload):
+            raise RuntimeError("LLM unavailable")
+
+        await consume_until(queue, "judge", handler, calls=3)
+        job = await queue.get(job_id)
+        assert job["status"] == JOB_FAILED
+        assert job["attempts"] == 3
+        assert job["error"] == "LLM unavailable"
+        assert await redis_client.xlen(queue._stream("judge")) == 0
+        assert await redis_client.zcard(queue._delayed("judge")) == 0
+
+    asyncio.run(scenario())
+
+
+def test_retry_waits_in_the_delayed_set_until_due(redis_client):
+    async def scenario():
+        queue = JobQueue(redis_client, retry_base_delay=60)
+        job_id = await queue.enqueue("judge", {"bet": 1})
+
+        async def handler(payload):
+            raise RuntimeError("LLM unavailable")
+
+        await consume_until(queue, "judge", handler, calls=1)
+        assert (await queue.get(job_id))["status"] == JOB_QUEUED
+        assert await redis_client.zscore(queue._delayed("judge"), job_id) is not None
+        assert await redis_client.xlen(queue._stream("judge")) == 0
+
+    asyncio.run(scenario())
+
+
+def test_job_of_a_crashed_consumer_is_reclaimed(redis_client):
+    async def scenario():
+        queue = JobQueue(redis_client, claim_idle_ms=0)
+        job_id = await queue.enqueue("validate", {"description": "x"})
+        await queue._ensure_group("validate")
+        # A consumer reads the job and dies before acknowledging it
+        await redis_client.xreadgroup(queue.group, "crashed", {queue._stream("validate"): ">"}, count=1)
+
+        async def handler(payload):
+            return "ok"
+
+        await consume_until(queue, "validate", handler, calls=1, consumer="survivor")
+        assert (await queue.get(job_id))["status"] == JOB_DONE
+        pending = await redis_client.xpending(queue._stream("validate"), queue.group)
+        assert pending["pending"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,48 @@
+# tests/test_prefilter.py
+
+import pytest
+
+from llm.prefilter import MarketPrefilter
+
+
+@pytest.mark.parametrize("description", [
+    "Will the Fed cut rates in December?",
+    "Will Trump win the election by November?",
+    "Will SpaceX launch Starship before March?",
+    "Will ETH be above $5000 by 12/31?",
+    "Will BTC hit 100k on 2025/01/01?",
+    "Will Bitcoin reach 100k by Christmas?",
+    "Will it snow in NYC on New Year's Eve?",
+    "Bitcoin to 100k by June?",
+    "Will BTC close above 100k on 2025-06-30?",
+    "Will ETH flip BTC within 3 months?",
+    "Is SOL above $300 at 5pm tomorrow?",
+    "@bot Will the Lakers beat the Celtics on Friday? https://t.co/abc",
+])
+def test_plausible_markets_are_forwarded(description):
+    assert MarketPrefilter().classify(description) == (True, None)
+
+
+@pytest.mark.parametrize("description, reason", [
+    ("lol", "too_short"),
+    ("@someone @other https://t.co/abc nice", "too_short"),
+    ("gm everyone, love this community", "no_binary_outcome"),
+    ("I think crypto is cool", "no_binary_outcome"),
+    ("Will BTC hit 100k?", "no_due_date"),
+    ("Will ETH flip BTC someday?", "no_due_date"),
+])
+def test_clearly_invalid_texts_are_rejected(description, reason):
+    assert MarketPrefilter().classify(description) == (False, reason)
+
+
+def test_model_rejects_low_scores_and_stats_count_reasons():
+    prefilter = MarketPrefilter(model=lambda text: 0.1 if "meme" in text else 0.9)
+    assert prefilter.classify("Will the meme coin hit $1 by Friday?") == (False, "model")
+    assert prefilter.classify("Will BTC hit 100k by Friday?") == (True, None)
+    assert prefilter.classify("lol") == (False, "too_short")
+    assert prefilter.stats() == {
+        "checked": 3,
+        "forwarded": 1,
+        "rejected": 2,
+        "rejected_by_reason": {"model": 1, "too_short": 1},
+    }
@@ -0,0 +1,72 @@
+# tests/test_rate_limiter.py
+
+import asyncio
+import time
+
+import pytest
+
+from utils.rate_limiter import RateLimiter, RedisTokenBucket, TokenBucket, backoff_delay
+
+
+def test_backoff_delay_grows_within_bounds():
+    for attempt in range(1, 6):
+        step = 2 ** (attempt - 1)
+        assert step / 2 <= backoff_delay(attempt) <= step
+    assert backoff_delay(30, cap=10) <= 10
+
+
+def test_local_bucket_bursts_then_throttles():
+    async def scenario():
+        bucket = TokenBucket(capacity=3, period=0.3)
+        started = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        # The burst is free, the fourth call waits for one token (0.1 s)
+        assert 0.05 <= time.monotonic() - started < 1
+
+    asyncio.run(scenario())
+
+
+def test_redis_buckets_share_one_budget_across_processes(redis_client):
+    async def scenario():
+        first = RedisTokenBucket(redis_client, "test_rate:endpoint", capacity=2, period=100)
+        second = RedisTokenBucket(redis_client, "test_rate:endpoint", capacity=2, period=100)
+        assert await first.try_acquire() == 0
+        assert await second.try_acquire() == 0
+        wait = await first.try_acquire()
+        assert wait == pytest.approx(50, rel=0.05)
+        assert await second.try_acquire() > 0
+
+    asyncio.run(scenario())
+
+
+def test_redis_bucket_block_pauses_every_process(redis_client):
+    async def scenario():
+        first = RedisTokenBucket(redis_client, "test_rate:endpoint", capacity=10, period=1)
+        second = RedisTokenBucket(redis_client, "test_rate:endpoint", capacity=10, period=1)
+        await first.block(30)
+        assert await second.try_acquire() == pytest.approx(30, abs=1)
+
+    asyncio.run(scenario())
+
+
+def test_limiter_retries_rate_limited_calls(redis_client):
+    class TooManyRequests(Exception):
+        pass
+
+    async def scenario():
+        limiter = RateLimiter({"search": (100, 1)}, rate_limit_errors=(TooManyRequests,),
+                              reset_time=lambda e: time.time(), redis_client=redis_client)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise TooManyRequests()
+            return "ok"
+
+        assert await limiter.call("search", flaky) == "ok"
+        assert len(calls) == 2
+        assert isinstance(limiter.bucket("other"), RedisTokenBucket)
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+# tests/test_singleflight.py
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.singleflight import SingleFlight, SyncSingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flights = SingleFlight("test")
+        calls = []
+
+        async def compute(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key.upper()
+
+        results = await asyncio.gather(
+            flights.do("a", lambda: compute("a")),
+            flights.do("a", lambda: compute("a")),
+            flights.do("b", lambda: compute("b")),
+        )
+        assert results == ["A", "A", "B"]
+        assert calls == ["a", "b"]
+        assert len(flights) == 0
+
+        # A finished flight is not reused
+        assert await flights.do("a", lambda: compute("a")) == "A"
+        assert calls == ["a", "b", "a"]
+
+    asyncio.run(scenario())
+
+
+def test_errors_are_shared_and_not_remembered():
+    async def scenario():
+        flights = SingleFlight("test")
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(flights.do("a", fail), flights.do("a", fail), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert len(flights) == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def scenario():
+        flights = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await asyncio.sleep(0.05)
+            return 42
+
+        first = asyncio.create_task(flights.do("a", compute))
+        await started.wait()
+        second = asyncio.create_task(flights.do("a", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 42
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(scenario())
+
+
+def test_sync_single_flight_coalesces_threads():
+    flights = SyncSingleFlight("test")
+    calls = []
+    entered, release = threading.Event(), threading.Event()
+
+    def compute():
+        calls.append(1)
+        entered.set()
+        release.wait()
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flights.do, "a", compute)
+        entered.wait()
+        followers = [pool.submit(flights.do, "a", compute) for _ in range(3)]
+        # Give the followers time to join the flight before it finishes
+        time.sleep(0.1)
+        release.set()
+        results = [leader.result()] + [future.result() for future in followers]
+    assert results == ["result"] * 4
+    assert len(calls) == 1
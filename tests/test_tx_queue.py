@@ -0,0 +1,268 @@
+# tests/test_tx_queue.py
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("eth_abi")
+
+from CDP import tx_queue as tx_queue_module
+from CDP.tx_queue import TransactionQueue, TX_QUEUED, TX_SUBMITTING, TX_SUBMITTED, TX_CONFIRMED, \
+    TX_FAILED, _selector
+
+WALLET = "0x00000000000000000000000000000000000000aa"
+
+
+class FakeChain:
+    """
+    A wallet's view of the chain: `invoke` sends a transaction with the next
+    nonce, `mine` includes the pending ones in a new block, and `rpc`
+    answers the JSON-RPC calls the queue makes through the bet reader.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.block = 0
+        self.fail_next = 0
+        self.lose_reply = False
+
+    def _send(self, to: str, data: str) -> str:
+        tx_hash = f"0x{len(self.sent):064x}"
+        self.sent.append({"hash": tx_hash, "from": WALLET, "nonce": hex(len(self.sent)), "to": to,
+                          "input": data, "block": None})
+        return tx_hash
+
+    def invoke(self, contract_address, abi_name, method, args):
+        if self.fail_next:
+            self.fail_next -= 1
+            raise RuntimeError("CDP API unavailable")
+        tx_hash = self._send(contract_address, _selector(abi_name, method) + "00" * 32)
+        if self.lose_reply:
+            raise TimeoutError("CDP API timed out after broadcasting")
+        return SimpleNamespace(transaction_hash=tx_hash, transaction_link=f"https://scan/{tx_hash}")
+
+    def send_other(self):
+        """A transaction of the agent's toolkit from the same wallet."""
+        return self._send("0x00000000000000000000000000000000000000bb", "0x")
+
+    def mine(self):
+        self.block += 1
+        for tx in self.sent:
+            if tx["block"] is None:
+                tx["block"] = self.block
+
+    def _count(self, block) -> int:
+        if block == "pending":
+            return len(self.sent)
+        number = self.block if block == "latest" else int(block, 16)
+        return sum(1 for tx in self.sent if tx["block"] is not None and tx["block"] <= number)
+
+    async def rpc(self, method, params):
+        if method == "eth_blockNumber":
+            return hex(self.block)
+        if method == "eth_getTransactionCount":
+            return hex(self._count(params[1]))
+        if method == "eth_getBlockByNumber":
+            return {"transactions": [tx for tx in self.sent if tx["block"] == int(params[0], 16)]}
+        if method == "eth_getTransactionReceipt":
+            for tx in self.sent:
+                if tx["hash"] == params[0] and tx["block"] is not None:
+                    return {"transactionHash": tx["hash"], "status": "0x1"}
+            return None
+        raise AssertionError(f"unexpected RPC call {method}")
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    chain = FakeChain()
+    monkeypatch.setattr(tx_queue_module, "invoke_contract", chain.invoke)
+    return chain
+
+
+def make_queue(redis_client, chain, **kwargs):
+    kwargs.setdefault("retry_base_delay", 0)
+    return TransactionQueue(redis_client, chain, wallet=WALLET, **kwargs)
+
+
+async def take_next(queue: TransactionQueue) -> str:
+    """Move the next queued transaction to the processing list, as the submit loop does."""
+    tx_id = await queue.redis_client.lmove(queue.queue_key, queue.processing_key, "RIGHT", "LEFT")
+    return tx_id.decode()
+
+
+def test_submits_in_order_and_confirms_from_receipts(redis_client, chain):
+    async def scenario():
+        queue = make_queue(redis_client, chain)
+        first = await queue.enqueue("0xfactory", "factory", "createBet", {})
+        second = await queue.enqueue("0xbet", "bet", "setResult", {})
+        assert await queue._acquire_lease()
+        await queue._submit(await take_next(queue))
+        await queue._submit(await take_next(queue))
+        assert [tx["to"] for tx in chain.sent] == ["0xfactory", "0xbet"]
+        assert (await queue.get(first))["status"] == TX_SUBMITTED
+
+        chain.mine()
+        await queue._confirm(first)
+        await queue._confirm(second)
+        assert (await queue.get(first))["status"] == TX_CONFIRMED
+        assert await redis_client.zcard(queue.pending_key) == 0
+
+    asyncio.run(scenario())
+
+
+def test_retries_failed_invocations_in_place(redis_client, chain):
+    async def scenario():
+        queue = make_queue(redis_client, chain)
+        tx_id = await queue.enqueue("0xfactory", "factory", "createBet", {})
+        assert await queue._acquire_lease()
+        chain.fail_next = 2
+        await queue._submit(await take_next(queue))
+        tx = await queue.get(tx_id)
+        assert tx["status"] == TX_SUBMITTED
+        assert tx["attempts"] == 3
+        assert len(chain.sent) == 1
+
+    asyncio.run(scenario())
+
+
+def test_failure_callbacks_receive_failed_transactions(redis_client, chain):
+    async def scenario():
+        queue = make_queue(redis_client, chain, max_attempts=2)
+        failed = []
+
+        async def on_failed(tx):
+            failed.append(tx["args"]["_message"])
+
+        queue.on_failed(on_failed)
+        tx_id = await queue.enqueue("0xfactory", "factory", "createBet", {"_message": "Will BTC hit 100k?"})
+        assert await queue._acquire_lease()
+        chain.fail_next = 2
+        await queue._submit(await take_next(queue))
+        assert (await queue.get(tx_id))["status"] == TX_FAILED
+        assert failed == ["Will BTC hit 100k?"]
+
+    asyncio.run(scenario())
+
+
+def test_submitter_that_lost_its_lease_does_not_send(redis_client, chain):
+    async def scenario():
+        old = make_queue(redis_client, chain)
+        new = make_queue(redis_client, chain)
+        tx_id = await old.enqueue("0xfactory", "factory", "createBet", {})
+        assert await old._acquire_lease()
+        assert await take_next(old) == tx_id
+
+        # The old leader stalls past its lease; the new one recovers the in-flight transaction
+        await redis_client.delete(old.lease.key)
+        assert await new._acquire_lease()
+        assert await redis_client.lrange(new.queue_key, 0, -1) == [tx_id.encode()]
+
+        await old._submit(tx_id)
+        assert chain.sent == []
+        assert (await old.get(tx_id))["status"] == TX_QUEUED
+
+        await new._submit(await take_next(new))
+        assert len(chain.sent) == 1
+        assert (await new.get(tx_id))["status"] == TX_SUBMITTED
+
+    asyncio.run(scenario())
+
+
+async def crash_during_invoke(queue: TransactionQueue, chain: FakeChain) -> str:
+    """Leave a transaction `submitting` as if the process died inside invoke_contract."""
+    await queue.enqueue("0xfactory", "factory", "createBet", {})
+    assert await queue._acquire_lease()
+    tx_id = await take_next(queue)
+    await queue._update(tx_id, status=TX_SUBMITTING, attempts=1, nonce=len(chain.sent), sent_block=chain.block)
+    await queue.redis_client.delete(queue.lease.key)
+    return tx_id
+
+
+def test_recovers_a_transaction_sent_before_a_crash_without_resending(redis_client, chain):
+    async def scenario():
+        crashed = make_queue(redis_client, chain)
+        tx_id = await crash_during_invoke(crashed, chain)
+        chain.invoke("0xfactory", "factory", "createBet", {})
+
+        successor = make_queue(redis_client, chain)
+        assert await successor._acquire_lease()
+        await successor._submit(await take_next(successor))
+        assert len(chain.sent) == 1
+        assert (await successor.get(tx_id))["status"] == TX_SUBMITTED
+
+        chain.mine()
+        await successor._confirm(tx_id)
+        tx = await successor.get(tx_id)
+        assert tx["status"] == TX_CONFIRMED
+        assert tx["tx_hash"] == chain.sent[0]["hash"]
+
+    asyncio.run(scenario())
+
+
+def test_resends_a_transaction_the_crash_prevented_from_going_out(redis_client, chain):
+    async def scenario():
+        crashed = make_queue(redis_client, chain)
+        tx_id = await crash_during_invoke(crashed, chain)
+
+        successor = make_queue(redis_client, chain)
+        assert await successor._acquire_lease()
+        await successor._submit(await take_next(successor))
+        assert len(chain.sent) == 1
+        assert (await successor.get(tx_id))["tx_hash"] == chain.sent[0]["hash"]
+
+    asyncio.run(scenario())
+
+
+def test_requeues_a_transaction_whose_nonce_another_sender_used(redis_client, chain):
+    async def scenario():
+        crashed = make_queue(redis_client, chain)
+        tx_id = await crash_during_invoke(crashed, chain)
+        chain.send_other()
+        chain.mine()
+
+        successor = make_queue(redis_client, chain)
+        assert await successor._acquire_lease()
+        await successor._submit(await take_next(successor))
+        # The used nonce alone does not prove the transaction went out
+        assert (await successor.get(tx_id))["status"] == TX_SUBMITTED
+        await successor._confirm(tx_id)
+        assert (await successor.get(tx_id))["status"] == TX_QUEUED
+
+        await successor._submit(await take_next(successor))
+        chain.mine()
+        await successor._confirm(tx_id)
+        tx = await successor.get(tx_id)
+        assert tx["status"] == TX_CONFIRMED
+        assert tx["tx_hash"] == chain.sent[1]["hash"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_reply_after_broadcast_is_not_sent_twice(redis_client, chain):
+    async def scenario():
+        queue = make_queue(redis_client, chain)
+        tx_id = await queue.enqueue("0xfactory", "factory", "createBet", {})
+        assert await queue._acquire_lease()
+        chain.lose_reply = True
+        await queue._submit(await take_next(queue))
+        assert len(chain.sent) == 1
+
+        chain.mine()
+        await queue._confirm(tx_id)
+        assert (await queue.get(tx_id))["status"] == TX_CONFIRMED
+
+    asyncio.run(scenario())
+
+
+def test_unmined_transactions_stay_pending(redis_client, chain):
+    async def scenario():
+        queue = make_queue(redis_client, chain)
+        tx_id = await queue.enqueue("0xfactory", "factory", "createBet", {})
+        assert await queue._acquire_lease()
+        await queue._submit(await take_next(queue))
+        await queue._confirm(tx_id)
+        assert (await queue.get(tx_id))["status"] == TX_SUBMITTED
+        assert await redis_client.zcard(queue.pending_key) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,125 @@
+# twitter/checkpoint.py
+
+from typing import Dict, Iterable, Optional
+
+
+class ReplyCheckpointStore:
+    """
+    Per-tweet reply checkpoints kept in Redis under `csb_last_processed_time:{tweet_id}`.
+
+    A checkpoint is the high-water mark of reply timestamps: every reply at or
+    before it has been validated. Checkpoints of a whole timeline page are
+    loaded with one MGET, and updates are buffered and written in batched
+    pipelines. A checkpoint does not move while a tweet's replies are still
+    being paged, and afterwards stays just below the oldest reply still being
+    validated, so a crash never skips an unvalidated reply.
+    """
+
+    def __init__(self, redis_client, flush_size: int = 50):
+        """
+        Initialize the store.
+
+        Args:
+            redis_client: The async Redis client.
+            flush_size (int): Number of buffered updates that triggers a flush in `maybe_flush`.
+        """
+        self.redis_client = redis_client
+        self.flush_size = flush_size
+        self._checkpoints: Dict[str, float] = {}
+        self._dirty = set()
+        # Replies handed to the validators since the checkpoint, by tweet: reply id -> timestamp
+        self._pending: Dict[str, Dict[str, float]] = {}
+        self._done: Dict[str, Dict[str, float]] = {}
+        self._paging = set()
+
+    @staticmethod
+    def _key(tweet_id) -> str:
+        return f"csb_last_processed_time:{tweet_id}"
+
+    async def load(self, tweet_ids: Iterable, default: float):
+        """
+        Load the checkpoints of many tweets in a single MGET.
+
+        Args:
+            tweet_ids (Iterable): The tweets of the timeline page.
+            default (float): Checkpoint of tweets never processed before.
+        """
+        tweet_ids = [str(tweet_id) for tweet_id in tweet_ids if str(tweet_id) not in self._checkpoints]
+        if not tweet_ids:
+            return
+        values = await self.redis_client.mget([self._key(tweet_id) for tweet_id in tweet_ids])
+        for tweet_id, value in zip(tweet_ids, values):
+            self._checkpoints[tweet_id] = float(value) if value is not None else default
+
+    def get(self, tweet_id) -> Optional[float]:
+        """Return the loaded checkpoint of a tweet."""
+        return self._checkpoints.get(str(tweet_id))
+
+    def is_tracked(self, tweet_id, reply_id) -> bool:
+        """Whether a reply newer than the checkpoint was already handed to the validators."""
+        tweet_id, reply_id = str(tweet_id), str(reply_id)
+        return reply_id in self._pending.get(tweet_id, {}) or reply_id in self._done.get(tweet_id, {})
+
+    def start(self, tweet_id):
+        """Mark that the replies of a tweet are being paged."""
+        self._paging.add(str(tweet_id))
+
+    def track(self, tweet_id, reply_id, reply_timestamp: float):
+        """Record a reply handed to the validators."""
+        self._pending.setdefault(str(tweet_id), {})[str(reply_id)] = reply_timestamp
+
+    def complete(self, tweet_id, reply_id):
+        """Record that a tracked reply has been validated."""
+        tweet_id, reply_id = str(tweet_id), str(reply_id)
+        reply_timestamp = self._pending.get(tweet_id, {}).pop(reply_id, None)
+        if reply_timestamp is not None:
+            self._done.setdefault(tweet_id, {})[reply_id] = reply_timestamp
+        self._advance(tweet_id)
+
+    def finish(self, tweet_id):
+        """Mark that every reply of the tweet has been paged and tracked."""
+        tweet_id = str(tweet_id)
+        self._paging.discard(tweet_id)
+        self._advance(tweet_id)
+
+    def _advance(self, tweet_id: str):
+        if tweet_id in self._paging:
+            # Later pages may still hold older replies
+            return
+        pending = self._pending.get(tweet_id)
+        done = self._done.get(tweet_id)
+        if pending:
+            # Stay just below the oldest reply still being validated
+            high_water = min(pending.values()) - 0.001
+        elif done:
+            high_water = max(done.values())
+        else:
+            return
+
+        if high_water > self._checkpoints.get(tweet_id, 0.0):
+            self._checkpoints[tweet_id] = high_water
+            self._dirty.add(tweet_id)
+        if done:
+            # Replies at or before the checkpoint are skipped by timestamp from now on
+            self._done[tweet_id] = {
+                reply_id: ts for reply_id, ts in done.items() if ts > self._checkpoints[tweet_id]
+            }
+
+    async def flush(self):
+        """Write all buffered checkpoint updates in one pipeline."""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for tweet_id in dirty:
+                    pipe.set(self._key(tweet_id), self._checkpoints[tweet_id])
+                await pipe.execute()
+        except Exception:
+            self._dirty |= dirty
+            raise
+
+    async def maybe_flush(self):
+        """Flush once enough updates are buffered."""
+        if len(self._dirty) >= self.flush_size:
+            await self.flush()
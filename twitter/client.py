@@ -4,14 +4,48 @@ import os
 from datetime import datetime, timedelta
 
 from config.config import cookies_path, twitter_cookies, twitter_email, twitter_username, twitter_password, \
-    agent_executor
+    redis_client
 from twikit import Client
+from twikit.errors import TooManyRequests
 
-from llm.validate import validating_market
-from utils.tavily_search import search_util
+from llm.validate import avalidating_market
+from utils.rate_limiter import RateLimiter
 
-client = Client('en-US',
-                    user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 14_6_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15')
+# twikit client, created on first use
+_client = None
+
+
+def get_client() -> Client:
+    """Return the shared twikit client."""
+    global _client
+    if _client is None:
+        _client = Client('en-US',
+                         user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 14_6_1) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15')
+    return _client
+
+# Calls allowed per 15 minute window for each Twitter endpoint used by the bot
+TWITTER_BUDGETS = {
+    "user_tweets": (50, 15 * 60),
+    "tweet_detail": (150, 15 * 60),
+    "notifications": (180, 15 * 60),
+    "create_tweet": (50, 15 * 60),
+    "upload_media": (50, 15 * 60),
+}
+
+# Limiter for every call made through the twikit client, shared through Redis by all
+# worker processes since they use the same Twitter account
+twitter_limiter = RateLimiter(
+    TWITTER_BUDGETS,
+    rate_limit_errors=(TooManyRequests,),
+    reset_time=lambda e: getattr(e, "rate_limit_reset", None),
+    redis_client=redis_client,
+    namespace="csb_rate_twitter",
+)
+
+
+async def twitter_call(endpoint: str, func, *args, **kwargs):
+    """Call a twikit coroutine within the rate limit budget of `endpoint`."""
+    return await twitter_limiter.call(endpoint, func, *args, **kwargs)
 
 
 def contains_mention(message: str) -> bool:
@@ -20,8 +54,8 @@ def contains_mention(message: str) -> bool:
 
 
 async def validate_market(description: str) -> bool:
-    """Wrapper for `validating_market` to validate the market description."""
-    analysis_result, _ = validating_market(description, agent_executor, search_util)
+    """Wrapper for `avalidating_market` to validate the market description."""
+    analysis_result, _ = await avalidating_market(description)
     return analysis_result.get("is_valid", False)
 
 
@@ -29,59 +63,104 @@ async def login():
     print(cookies_path)
     if os.path.exists(cookies_path) and os.path.getsize(cookies_path) > 0:
         print(cookies_path)
-        client.load_cookies(cookies_path)
+        get_client().load_cookies(cookies_path)
     elif twitter_cookies is not None and twitter_cookies != "":
         cookies = json.loads(twitter_cookies)
-        client.set_cookies(cookies)
+        get_client().set_cookies(cookies)
     else:
-        await client.login(auth_info_1=twitter_email, auth_info_2=twitter_username, password=twitter_password)
-        client.save_cookies(cookies_path)
+        await get_client().login(auth_info_1=twitter_email, auth_info_2=twitter_username, password=twitter_password)
+        get_client().save_cookies(cookies_path)
+
+
+# Redis keys of the notification cursor and of the processed notification ids
+NOTIFICATION_CURSOR_KEY = "csb_notification_cursor"
+PROCESSED_NOTIFICATIONS_KEY = "csb_processed_notifications"
+
+
+async def process_notification(notification):
+    """Validate the bet in a single notification and reply when it is valid."""
+    print(notification.message)
+    if notification.tweet:
+        print(notification.tweet.text)
+        # Check if the message contains an @ mention
+        if contains_mention(notification.tweet.text):
+            description = notification.tweet.text
+            print(f"Processing notification: {description}")
+
+            # Validate the bet
+            is_valid = await validate_market(description)
+            if is_valid:
+                # await notification.tweet.reply(description)
+                print(notification.tweet.text)
+                # # Create the bet
+                # bet = await create_bet(description)
+                print("Bet created")
+
+                # Reply to the user that the bet has been created
+                content = f"Your bet has been successfully created!"
+                await twitter_call("create_tweet", notification.tweet.reply, content)
+                # await post_tweet(content)
+            else:
+                print("Bet validation failed. No action taken.")
 
 
 async def process_notifications(notifications, time_window=240):
+    """
+    Process notifications newer than the persisted cursor, newest first.
+
+    Pages are fetched iteratively and paging stops at the first notification
+    that is older than the cursor or outside the time window. Processed ids
+    are remembered in Redis so a notification is never handled twice, and
+    the cursor only advances past notifications that were handled.
+
+    Args:
+        notifications: The first page of notifications returned by twikit.
+        time_window (int): Ignore notifications older than this many minutes.
+    """
     now = datetime.now()
-
-    # Iterate through the notifications and process them
-    for notification in notifications:
-        # if notification.tweet:
-        #     print(notification.tweet.text)
-        # Process only new notifications
-        notification_time = datetime.fromtimestamp(notification.timestamp_ms / 1000)
-        print(f"notification_time: {notification_time}")
-        print(f"stop_time: {now - timedelta(minutes=time_window)}")
-        if notification_time < now - timedelta(minutes=time_window):  # Adjust time window
-            print("Notification is outside the time window. Skipping.")
-            continue
-        print(notification.message)
-        if notification.tweet:
-            print(notification.tweet.text)
-            # Check if the message contains an @ mention
-            if contains_mention(notification.tweet.text):
-                description = notification.tweet.text
-                print(f"Processing notification: {description}")
-
-                # Validate the bet
-                is_valid = await validate_market(description)
-                if is_valid:
-                    # await notification.tweet.reply(description)
-                    print(notification.tweet.text)
-                    # # Create the bet
-                    # bet = await create_bet(description)
-                    print("Bet created")
-
-                    # Reply to the user that the bet has been created
-                    content = f"Your bet has been successfully created!"
-                    await notification.tweet.reply(content)
-                    # await post_tweet(content)
-                else:
-                    print("Bet validation failed. No action taken.")
-
-        print(notification)
-
+    window_start_ms = int((now - timedelta(minutes=time_window)).timestamp() * 1000)
+
+    cursor = await redis_client.get(NOTIFICATION_CURSOR_KEY)
+    cursor = int(cursor) if cursor else 0
+    newest_ms = cursor
+    oldest_failed_ms = None
+
+    while notifications:
+        reached_end = False
+        for notification in notifications:
+            # Notifications come newest first: everything after this one is already handled
+            if notification.timestamp_ms <= cursor or notification.timestamp_ms < window_start_ms:
+                print("Reached notifications older than the cursor. Stopping.")
+                reached_end = True
+                break
+
+            if await redis_client.zscore(PROCESSED_NOTIFICATIONS_KEY, notification.id) is not None:
+                continue
+
+            try:
+                await process_notification(notification)
+            except Exception as e:
+                print(f"Failed to process notification {notification.id}: {e}")
+                oldest_failed_ms = notification.timestamp_ms if oldest_failed_ms is None \
+                    else min(oldest_failed_ms, notification.timestamp_ms)
+                continue
+
+            await redis_client.zadd(PROCESSED_NOTIFICATIONS_KEY, {notification.id: notification.timestamp_ms})
+            newest_ms = max(newest_ms, notification.timestamp_ms)
+
+        if reached_end:
+            break
         # Check for additional pages of notifications
-    if await notifications.next():
         print("Fetching next batch of notifications...")
-        await process_notifications(await notifications.next(), time_window)
+        notifications = await twitter_call("notifications", notifications.next)
+
+    # Keep failed notifications ahead of the cursor so the next run retries them
+    if oldest_failed_ms is not None:
+        newest_ms = min(newest_ms, oldest_failed_ms - 1)
+    if newest_ms > cursor:
+        await redis_client.set(NOTIFICATION_CURSOR_KEY, newest_ms)
+    # Ids older than the time window can no longer be returned for processing
+    await redis_client.zremrangebyscore(PROCESSED_NOTIFICATIONS_KEY, 0, window_start_ms)
 
 
 async def fetch_notifications():
@@ -89,7 +168,7 @@ async def fetch_notifications():
     await login()
 
     # Retrieve initial batch of notifications
-    notifications = await client.get_notifications('All')
+    notifications = await twitter_call("notifications", get_client().get_notifications, 'All')
     print(notifications)
     await process_notifications(notifications)
 
@@ -1,160 +1,233 @@
 import asyncio
 import os
+import time
 from datetime import datetime
 
-from CDP.contract import create_bet
-from config.config import redis_client, agent_executor
-from llm.validate import validating_market
-from twitter.client import login, client
-from utils.tavily_search import search_util
+from CDP.bet_indexer import bet_indexer
+from CDP.tx_queue import tx_queue
+from config.config import redis_client, reply_workers, reply_queue_size, semantic_dedupe_enabled
+from llm.dedupe import bet_index, same_specifics
+from llm.validate import avalidating_market, normalize_description
+from twitter.checkpoint import ReplyCheckpointStore
+from twitter.client import login, get_client, twitter_call
+from utils.metrics import timed
+from utils.rate_limiter import backoff_delay
 from utils.time_util import iso_to_timestamp
 
-# Global variable to stop the loop
-_fetch_and_validate_stop_event = asyncio.Event()
-_is_fetch_and_validate_active = False
-
-# Getter for fetch_and_validate_stop_event
-def get_fetch_and_validate_stop_event():
-    global _fetch_and_validate_stop_event
-    return _fetch_and_validate_stop_event
-
-
-# Setter for fetch_and_validate_stop_event
-def set_fetch_and_validate_stop_event(event: asyncio.Event):
-    global _fetch_and_validate_stop_event
-    _fetch_and_validate_stop_event = event
-
-
-# Getter for is_fetch_and_validate_active
-def get_is_fetch_and_validate_active():
-    global _is_fetch_and_validate_active
-    return _is_fetch_and_validate_active
-
-
-# Setter for is_fetch_and_validate_active
-def set_is_fetch_and_validate_active(active: bool):
-    global _is_fetch_and_validate_active
-    _is_fetch_and_validate_active = active
-
-
 # resent
 async def post_tweet(content, image_paths=None, max_retries=10, retry_interval=20):
+    """
+    Post a tweet. Rate limits are handled by the shared limiter; other failures
+    are retried with exponential backoff starting at `retry_interval` seconds.
+    """
     await login()  # ensure login
     retries = 0
     while retries < max_retries:
         try:
-            if image_paths:
-                media_ids = [await client.upload_media(path) for path in image_paths]
-                await client.create_tweet(text=content, media_ids=media_ids)
-            else:
-                await client.create_tweet(text=content)
+            with timed("tweet_post"):
+                if image_paths:
+                    media_ids = [await twitter_call("upload_media", get_client().upload_media, path) for path in image_paths]
+                    await twitter_call("create_tweet", get_client().create_tweet, text=content, media_ids=media_ids)
+                else:
+                    await twitter_call("create_tweet", get_client().create_tweet, text=content)
             print("\n" + "=" * 30)
             print("Tweet sent successfully")
             print("=" * 30 + "\n")
             return {"success": True, "message": "Tweet sent successfully"}
         except Exception as e:
             retries += 1
+            delay = backoff_delay(retries, retry_interval)
             print("\n" + "=" * 30)
-            print(f"Attempt {retries} failed. Retrying in {retry_interval} seconds: {e}")
+            print(f"Attempt {retries} failed. Retrying in {delay:.1f} seconds: {e}")
             print("=" * 30 + "\n")
-            await asyncio.sleep(retry_interval)
+            await asyncio.sleep(delay)
     return {"success": False, "message": "Failed to send tweet after multiple attempts"}
 
 
-async def fetch_and_validate_replies(user_id):
-    await login()
+async def _is_duplicate_bet(full_text: str, timestamp) -> bool:
+    """
+    Whether a bet contract was already created for this market or queued
+    for a paraphrase of it naming the same amounts, dates and entities;
+    otherwise the market is claimed, see `_release_bet`.
+    """
+    try:
+        indexed = await bet_indexer.find_by_message(full_text)
+    except Exception as e:
+        print(f"Bet index lookup failed: {e}")
+        indexed = None
+    if indexed is not None:
+        print(f"Skipping bet already created at {indexed['address']}")
+        return True
+    if not semantic_dedupe_enabled:
+        return False
+    # Remember the bet until it is due
+    ttl = max(60, timestamp - time.time()) if timestamp else None
+    try:
+        match = await bet_index.claim(normalize_description(full_text), {"description": full_text}, ttl=ttl,
+                                      accept=lambda entry: same_specifics(full_text, entry["payload"]["description"]))
+    except Exception as e:
+        print(f"Duplicate bet check failed, creating the bet: {e}")
+        return False
+    if match is None:
+        return False
+    entry, similarity = match
+    print(f"Skipping duplicate of bet \"{entry['payload']['description']}\" (similarity {similarity:.2f})")
+    return True
+
+
+async def _release_bet(full_text: str):
+    """Drop the claim of a market whose bet was not created, so a later reply can create it."""
+    if not semantic_dedupe_enabled:
+        return
+    try:
+        await bet_index.discard(normalize_description(full_text))
+    except Exception as e:
+        print(f"Failed to release the duplicate bet claim: {e}")
+
+
+async def _release_failed_bet(tx: dict):
+    """Release the claim of a market whose createBet transaction failed."""
+    if tx["method"] == "createBet":
+        await _release_bet(tx["args"]["_message"])
+
+
+tx_queue.on_failed(_release_failed_bet)
+
+
+async def _validate_reply(full_text: str):
+    """
+    Validate one reply and queue a bet contract for it when it is a valid
+    market that is not a paraphrase of a bet already created.
+    """
+    result, _ = await avalidating_market(full_text)
+    if result.get("is_valid", False):
+        timestamp = iso_to_timestamp(result.get("due_date"))
+        if await _is_duplicate_bet(full_text, timestamp):
+            return
+        # create_bet
+        # bet_created = await create_bet(reply)
+        bet_created = True
+        if bet_created:
+            try:
+                tx_id = await tx_queue.enqueue_create_bet(full_text, "0x0000000000000000000000000000000000000000", 1, "0x0000000000000000000000000000000000000000", timestamp)
+            except Exception:
+                await _release_bet(full_text)
+                raise
+            print(f"Queued createBet transaction: {tx_id}")
+
+            # while True:
+            #     try:
+            #         await reply.reply(f"Create Bet Successfully! Url is as below: {contract_address}")
+            #         print(f"Replied to user: {reply.user.screen_name}")
+            #         break
+            #     except Exception as e:
+            #         print(f"Failed to send reply, retrying in 120 seconds: {e}")
+            #         await asyncio.sleep(120)
+
+        else:
+            print("Failed to create bet. Skipping reply.")
+
+
+async def _validate_replies_worker(queue: asyncio.Queue, checkpoints: ReplyCheckpointStore):
+    """
+    Consumer: validate replies taken from the queue until cancelled.
+    """
+    while True:
+        tweet_id, reply = await queue.get()
+        try:
+            try:
+                print("Reply:", reply.full_text)
+                await _validate_reply(reply.full_text)
+            except Exception as e:
+                print(f"Failed to validate reply {reply.id}: {e}")
+            # A cancelled validation skips this, so the reply is fetched again on the next run
+            checkpoints.complete(tweet_id, reply.id)
+        finally:
+            queue.task_done()
+
+
+async def _fetch_replies(user_id, queue: asyncio.Queue, checkpoints: ReplyCheckpointStore, stop_event: asyncio.Event):
+    """
+    Producer: page through the user's tweets and their replies and put every
+    unprocessed reply on the queue. A full queue blocks the producer, so
+    fetching never runs far ahead of validation.
+    """
     # Define an initial timestamp set to a year in the past
     initial_timestamp = datetime.now().timestamp() - 365 * 24 * 60 * 60
+    failures = 0
 
-    while not _fetch_and_validate_stop_event.is_set():
-        if not _is_fetch_and_validate_active:
-            print("Transfer environment setting or fetch mode is disabled. Pausing task.")
-            await asyncio.sleep(15)  # Wait before rechecking
-            return
-
+    while not stop_event.is_set():
         try:
-            tweets = await client.get_user_tweets(user_id, "Tweets")
-            await asyncio.sleep(1)
+            tweets = await twitter_call("user_tweets", get_client().get_user_tweets, user_id, "Tweets")
+            # Load the checkpoints of the whole timeline page at once
+            await checkpoints.load([tweet.id for tweet in tweets], initial_timestamp)
             for tweet in tweets:
                 tweet_id = tweet.id
                 print(tweet.text)
-                tweet = await client.get_tweet_by_id(tweet_id)
-                await asyncio.sleep(1)
-                replies_count = tweet.reply_count
-                now_count = 0
-
-                last_processed_time = await redis_client.get(f"csb_last_processed_time:{tweet_id}")
-                await asyncio.sleep(1)
-                if not last_processed_time:
-                    last_processed_time = initial_timestamp
-                    await redis_client.set(f"csb_last_processed_time:{tweet_id}", last_processed_time)
-                    # print(initial_timestamp)
-                else:
-                    last_processed_time = float(last_processed_time)
-                    # print(last_processed_time)
+                tweet = await twitter_call("tweet_detail", get_client().get_tweet_by_id, tweet_id)
 
+                last_processed_time = checkpoints.get(tweet_id)
                 replies = tweet.replies
-                # print(replies)
-
-                while replies:
-                    for reply in replies:
-                        # print(reply.text)
-                        if not _is_fetch_and_validate_active:
-                            return
-                        reply_timestamp = reply.created_at_datetime.timestamp()
-
-                        # Skip replies processed previously
-                        if reply_timestamp <= float(last_processed_time):
-                            continue
-
-                        print("Reply:", reply.full_text)
-                        # extract comment text
-                        full_text = reply.full_text
-
-                        # # process comments
-                        # if "@" in full_text:
-                        # processed_text = " ".join(
-                        #     [word for word in full_text.split() if not word.startswith("@")]
-                        # )
-
-                        result, _ = validating_market(full_text, agent_executor, search_util)
-                        if result.get("is_valid", False):
-                            timestamp = iso_to_timestamp(result.get("due_date"))
-                            # create_bet
-                            # bet_created = await create_bet(reply)
-                            bet_created = True
-                            if bet_created:
-                                contract_address = create_bet(full_text, "0x0000000000000000000000000000000000000000", 1, "0x0000000000000000000000000000000000000000", timestamp)
-
-                                # while True:
-                                #     try:
-                                #         await reply.reply(f"Create Bet Successfully! Url is as below: {contract_address}")
-                                #         print(f"Replied to user: {reply.user.screen_name}")
-                                #         break
-                                #     except Exception as e:
-                                #         print(f"Failed to send reply, retrying in 120 seconds: {e}")
-                                #         await asyncio.sleep(120)
-
-                            else:
-                                print("Failed to create bet. Skipping reply.")
-                        await asyncio.sleep(1)
-                    if replies.next:
-                        try:
-                            replies = await replies.next()
-                            await asyncio.sleep(60)
-                        except Exception as e:
-                            print(f"replies.next() error: {e} ")
-                            break
-                    else:
-                        break  # if no more, break it
-                # Update last processed time
-                last_processed_time = datetime.now().timestamp()
-                await redis_client.set(f"csb_last_processed_time:{tweet_id}", last_processed_time)
-            await asyncio.sleep(20)
+
+                checkpoints.start(tweet_id)
+                try:
+                    while replies:
+                        for reply in replies:
+                            if stop_event.is_set():
+                                return
+                            reply_timestamp = reply.created_at_datetime.timestamp()
+
+                            # Skip replies processed previously or still being validated
+                            if reply_timestamp <= last_processed_time or checkpoints.is_tracked(tweet_id, reply.id):
+                                continue
+
+                            checkpoints.track(tweet_id, reply.id, reply_timestamp)
+                            await queue.put((tweet_id, reply))
+                        if replies.next:
+                            try:
+                                replies = await twitter_call("tweet_detail", replies.next)
+                            except Exception as e:
+                                print(f"replies.next() error: {e} ")
+                                break
+                        else:
+                            break  # if no more, break it
+                finally:
+                    checkpoints.finish(tweet_id)
+                await checkpoints.maybe_flush()
+            await checkpoints.flush()
+            failures = 0
         except Exception as e:
-            await asyncio.sleep(10)
+            failures += 1
+            delay = backoff_delay(failures, 10)
             print("\n" + "=" * 30)
-            print(f"Failed to retrieve replies: {e}")
+            print(f"Failed to retrieve replies, retrying in {delay:.1f} seconds: {e}")
             print("=" * 30 + "\n")
+            await asyncio.sleep(delay)
             continue
 
+
+async def fetch_and_validate_replies(user_id, stop_event: asyncio.Event, workers: int = reply_workers,
+                                     queue_size: int = reply_queue_size):
+    """
+    Watch the user's tweets and validate new replies with a producer/consumer
+    pipeline: one fetcher pages through tweets and replies while `workers`
+    validators consume a bounded queue of at most `queue_size` replies.
+
+    Args:
+        user_id (str): The user ID to monitor.
+        stop_event (asyncio.Event): Set to stop watching the user.
+        workers (int): Number of concurrent reply validators.
+        queue_size (int): Capacity of the reply queue, which bounds how far fetching runs ahead.
+    """
+    await login()
+
+    queue = asyncio.Queue(maxsize=queue_size)
+    checkpoints = ReplyCheckpointStore(redis_client)
+    worker_tasks = [asyncio.create_task(_validate_replies_worker(queue, checkpoints)) for _ in range(workers)]
+    try:
+        await _fetch_replies(user_id, queue, checkpoints, stop_event)
+    finally:
+        for task in worker_tasks:
+            task.cancel()
+        await asyncio.gather(*worker_tasks, return_exceptions=True)
+        await checkpoints.flush()
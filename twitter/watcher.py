@@ -0,0 +1,150 @@
+# twitter/watcher.py
+
+import asyncio
+import hashlib
+import time
+from typing import Dict, List, Optional
+
+from config.config import redis_client
+from twitter.tweet import fetch_and_validate_replies
+from utils.lease import Lease, decode as _decode, instance_id
+
+# Redis keys shared by every worker process
+WATCHED_USERS_KEY = "csb_watch_users"
+WATCH_WORKERS_KEY = "csb_watch_workers"
+
+
+def _lease_key(user_id: str) -> str:
+    return f"csb_watch_lease:{user_id}"
+
+
+def _owner(user_id: str, workers: List[str]) -> Optional[str]:
+    """Rendezvous hashing: the live worker with the highest score for the user owns it."""
+    if not workers:
+        return None
+    return max(workers, key=lambda worker: hashlib.sha256(f"{worker}:{user_id}".encode("utf-8")).digest())
+
+
+class ReplyWatcherCoordinator:
+    """
+    Shards the reply watchers of many user ids across worker processes.
+
+    The set of watched user ids lives in Redis, so the start/stop endpoints
+    work on whichever worker receives the request. Every worker heartbeats
+    into a registry of live workers, claims the users it owns by rendezvous
+    hashing among them, and holds a Redis lease per user while its watcher
+    runs. Leases expire when a worker dies, and a worker hands users back
+    when a new worker joins and becomes their owner.
+    """
+
+    def __init__(self, redis_client, interval: float = 5, lease_ttl: int = 30):
+        """
+        Initialize the coordinator.
+
+        Args:
+            redis_client: The async Redis client shared by the workers.
+            interval (float): Seconds between two rebalancing rounds.
+            lease_ttl (int): Lifetime in seconds of worker heartbeats and user leases.
+        """
+        self.redis_client = redis_client
+        self.interval = interval
+        self.lease_ttl = lease_ttl
+        self.worker_id = instance_id()
+        self._watchers: Dict[str, tuple] = {}
+        self._task = None
+
+    def _lease(self, user_id: str) -> Lease:
+        return Lease(self.redis_client, _lease_key(user_id), owner=self.worker_id, ttl=self.lease_ttl)
+
+    async def watch(self, user_id: str) -> bool:
+        """Ask the cluster to watch a user. Returns False if it is already watched."""
+        return bool(await self.redis_client.sadd(WATCHED_USERS_KEY, user_id))
+
+    async def unwatch(self, user_id: Optional[str] = None) -> List[str]:
+        """Stop watching a user, or every user if `user_id` is None. Returns the stopped users."""
+        if user_id is None:
+            users = [_decode(u) for u in await self.redis_client.smembers(WATCHED_USERS_KEY)]
+            await self.redis_client.delete(WATCHED_USERS_KEY)
+            return users
+        return [user_id] if await self.redis_client.srem(WATCHED_USERS_KEY, user_id) else []
+
+    async def status(self) -> List[dict]:
+        """Return every watched user with the worker currently holding its lease."""
+        users = sorted(_decode(u) for u in await self.redis_client.smembers(WATCHED_USERS_KEY))
+        if not users:
+            return []
+        owners = await self.redis_client.mget([_lease_key(user_id) for user_id in users])
+        return [
+            {"user_id": user_id, "worker": _decode(owner), "active": owner is not None}
+            for user_id, owner in zip(users, owners)
+        ]
+
+    async def start(self):
+        """Start rebalancing in the background."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop every local watcher, release their leases and leave the worker registry."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        for user_id in list(self._watchers):
+            await self._stop_watcher(user_id)
+        await self.redis_client.zrem(WATCH_WORKERS_KEY, self.worker_id)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._rebalance()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Reply watcher rebalance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def _rebalance(self):
+        now = time.time()
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.zadd(WATCH_WORKERS_KEY, {self.worker_id: now})
+            pipe.zremrangebyscore(WATCH_WORKERS_KEY, 0, now - self.lease_ttl)
+            pipe.zrange(WATCH_WORKERS_KEY, 0, -1)
+            pipe.smembers(WATCHED_USERS_KEY)
+            _, _, workers, users = await pipe.execute()
+        workers = [_decode(w) for w in workers]
+        users = {_decode(u) for u in users}
+
+        # Drop users that were unwatched, crashed, lost their lease or moved to another worker
+        for user_id, (task, _) in list(self._watchers.items()):
+            keep = (
+                user_id in users
+                and not task.done()
+                and _owner(user_id, workers) == self.worker_id
+                and await self._lease(user_id).renew()
+            )
+            if not keep:
+                await self._stop_watcher(user_id)
+
+        # Claim the unleased users this worker owns
+        for user_id in users:
+            if user_id in self._watchers or _owner(user_id, workers) != self.worker_id:
+                continue
+            if await self._lease(user_id).acquire():
+                self._start_watcher(user_id)
+
+    def _start_watcher(self, user_id: str):
+        print(f"Worker {self.worker_id} starts watching {user_id}")
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(fetch_and_validate_replies(user_id, stop_event))
+        self._watchers[user_id] = (task, stop_event)
+
+    async def _stop_watcher(self, user_id: str):
+        print(f"Worker {self.worker_id} stops watching {user_id}")
+        task, stop_event = self._watchers.pop(user_id)
+        stop_event.set()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await self._lease(user_id).release()
+
+
+# Coordinator of this worker process, started by the FastAPI app
+reply_watcher = ReplyWatcherCoordinator(redis_client)
@@ -0,0 +1,152 @@
+# utils/cache.py
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+
+class LRUCache:
+    """
+    A small in-process LRU cache whose entries expire after a per-entry TTL.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize (int): Maximum number of entries kept before the least recently used is evicted.
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the cached value for `key`, or None if it is missing or expired.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Store `value` under `key`, expiring after `ttl` seconds (never if None).
+        """
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    A two-tier cache: an in-process LRU in front of an optional Redis backend.
+
+    Values must be JSON serializable. Redis errors and values that cannot be
+    decoded are logged and treated as misses so that the cache never breaks
+    the caller.
+    """
+
+    def __init__(self, namespace: str, redis_client=None, maxsize: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            namespace (str): Prefix used for the Redis keys, e.g. "csb_validation".
+            redis_client: An async Redis client, or None to use the local tier only.
+            maxsize (int): Size of the local LRU tier.
+        """
+        self.namespace = namespace
+        self.redis_client = redis_client
+        self.local = LRUCache(maxsize=maxsize)
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Look the key up in the local tier, then in Redis. Redis hits are
+        promoted to the local tier with the remaining Redis TTL.
+        """
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        if self.redis_client is None:
+            return None
+
+        try:
+            redis_key = self._redis_key(key)
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(redis_key)
+                pipe.ttl(redis_key)
+                raw, ttl = await pipe.execute()
+            if raw is None:
+                return None
+            value = json.loads(raw)
+        except Exception as e:
+            print(f"Cache read failed for {self.namespace}: {e}")
+            return None
+
+        self.local.set(key, value, ttl if ttl and ttl > 0 else None)
+        return value
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        Look several keys up at once, fetching every local miss from Redis in
+        a single round trip. Returns the values in the order of `keys`.
+        """
+        values = [self.local.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if not missing or self.redis_client is None:
+            return values
+
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for i in missing:
+                    redis_key = self._redis_key(keys[i])
+                    pipe.get(redis_key)
+                    pipe.ttl(redis_key)
+                replies = await pipe.execute()
+        except Exception as e:
+            print(f"Cache read failed for {self.namespace}: {e}")
+            return values
+
+        for i, raw, ttl in zip(missing, replies[0::2], replies[1::2]):
+            if raw is None:
+                continue
+            try:
+                values[i] = json.loads(raw)
+            except ValueError as e:
+                print(f"Cache read failed for {self.namespace}: {e}")
+                continue
+            self.local.set(keys[i], values[i], ttl if ttl and ttl > 0 else None)
+        return values
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """
+        Store the value in both tiers, expiring after `ttl` seconds (never if None).
+        """
+        self.local.set(key, value, ttl)
+        if self.redis_client is None:
+            return
+        try:
+            await self.redis_client.set(self._redis_key(key), json.dumps(value), ex=ttl)
+        except Exception as e:
+            print(f"Cache write failed for {self.namespace}: {e}")
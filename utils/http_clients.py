@@ -0,0 +1,100 @@
+# utils/http_clients.py
+
+import importlib.util
+from typing import Dict, Optional
+
+import httpx
+
+from config.config import http_max_connections, http_max_keepalive, http_keepalive_expiry, \
+    http_connect_timeout, http_timeout, http2_enabled
+
+
+class HttpClientRegistry:
+    """
+    Shared, pooled httpx clients for the outbound integrations, one per service.
+
+    Every caller of a service reuses the same client and therefore the same
+    keep-alive connections, so TLS handshakes are paid once per connection
+    rather than once per request. HTTP/2 is used when the optional `h2`
+    package is installed. An async client must only be used from the event
+    loop it was first used in.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20, keepalive_expiry: float = 30,
+                 connect_timeout: float = 10, timeout: float = 60, http2: bool = True):
+        """
+        Initialize the registry.
+
+        Args:
+            max_connections (int): Maximum open connections per client.
+            max_keepalive (int): Maximum idle connections kept alive per client.
+            keepalive_expiry (float): Seconds an idle connection is kept alive.
+            connect_timeout (float): Seconds allowed to establish a connection.
+            timeout (float): Default read/write/pool timeout in seconds.
+            http2 (bool): Whether to negotiate HTTP/2 when `h2` is available.
+        """
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            print("The h2 package is not installed, outbound HTTP clients use HTTP/1.1")
+        self._clients: Dict[str, httpx.Client] = {}
+        self._async_clients: Dict[str, httpx.AsyncClient] = {}
+
+    def _options(self, base_url: str, headers: Optional[Dict[str, str]], timeout: Optional[float]) -> dict:
+        return {
+            "base_url": base_url,
+            "headers": headers,
+            "limits": self.limits,
+            "timeout": httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout),
+            "http2": self.http2,
+        }
+
+    def async_client(self, name: str, base_url: str = "", headers: Optional[Dict[str, str]] = None,
+                     timeout: Optional[float] = None) -> httpx.AsyncClient:
+        """
+        Return the shared async client of a service, creating it on first use.
+
+        Args:
+            name (str): The service name, e.g. "openai" or "tavily".
+            base_url (str): Base URL of the service, applied when the client is created.
+            headers (Dict[str, str]): Default headers, applied when the client is created.
+            timeout (float): Read/write timeout overriding the registry default.
+
+        Returns:
+            httpx.AsyncClient: The pooled client.
+        """
+        if name not in self._async_clients:
+            self._async_clients[name] = httpx.AsyncClient(**self._options(base_url, headers, timeout))
+        return self._async_clients[name]
+
+    def client(self, name: str, base_url: str = "", headers: Optional[Dict[str, str]] = None,
+               timeout: Optional[float] = None) -> httpx.Client:
+        """
+        Return the shared synchronous client of a service, creating it on first use.
+        """
+        if name not in self._clients:
+            self._clients[name] = httpx.Client(**self._options(base_url, headers, timeout))
+        return self._clients[name]
+
+    async def aclose(self):
+        """Close every client and its connections."""
+        for client in self._async_clients.values():
+            await client.aclose()
+        for client in self._clients.values():
+            client.close()
+        self._async_clients.clear()
+        self._clients.clear()
+
+
+# Clients shared by every outbound integration of this process
+http_clients = HttpClientRegistry(
+    max_connections=http_max_connections,
+    max_keepalive=http_max_keepalive,
+    keepalive_expiry=http_keepalive_expiry,
+    connect_timeout=http_connect_timeout,
+    timeout=http_timeout,
+    http2=http2_enabled,
+)
@@ -0,0 +1,232 @@
+# utils/job_queue.py
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from redis.exceptions import ResponseError
+
+from config.config import redis_client, job_max_attempts
+from utils.lease import decode as _decode, instance_id
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Finished jobs are kept for a week so their results stay queryable
+FINISHED_JOB_TTL = 7 * 24 * 60 * 60
+
+# Move the retries that are due from the delayed set back to the stream
+_PROMOTE_SCRIPT = """
+local ids = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, id in ipairs(ids) do
+    redis.call('zrem', KEYS[1], id)
+    redis.call('xadd', KEYS[2], '*', 'job_id', id)
+end
+return #ids
+"""
+
+
+class JobQueue:
+    """
+    A durable job queue on Redis streams, one stream per job kind.
+
+    Jobs are appended to `csb_jobs:{kind}` and read by worker processes
+    through a consumer group. A job is acknowledged and deleted from the
+    stream only after its result has been stored, so the stream holds
+    unfinished jobs only and a worker crash leaves the job pending; pending
+    jobs idle longer than `claim_idle_ms` are claimed by another consumer.
+    A running job's message is claimed again every `claim_idle_ms / 3` to
+    keep it from being reclaimed while its handler is still working.
+    A failed job is scheduled in `csb_jobs_delayed:{kind}` and appended
+    again once its exponential backoff has elapsed. Delivery is
+    at-least-once and handlers should be safe to run twice.
+    """
+
+    def __init__(self, redis_client, group: str = "csb_workers", max_attempts: int = 3,
+                 claim_idle_ms: int = 5 * 60 * 1000, retry_base_delay: float = 5.0):
+        """
+        Initialize the queue.
+
+        Args:
+            redis_client: The async Redis client.
+            group (str): Name of the consumer group shared by the workers.
+            max_attempts (int): Deliveries of a job before it is marked failed.
+            claim_idle_ms (int): Idle time after which a pending job of a crashed consumer is reclaimed.
+            retry_base_delay (float): Backoff before the first retry of a failed job, doubled on each attempt.
+        """
+        self.redis_client = redis_client
+        self.group = group
+        self.max_attempts = max_attempts
+        self.claim_idle_ms = claim_idle_ms
+        self.retry_base_delay = retry_base_delay
+        self._promote = redis_client.register_script(_PROMOTE_SCRIPT)
+
+    @staticmethod
+    def _stream(kind: str) -> str:
+        return f"csb_jobs:{kind}"
+
+    @staticmethod
+    def _delayed(kind: str) -> str:
+        return f"csb_jobs_delayed:{kind}"
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"csb_job:{job_id}"
+
+    async def enqueue(self, kind: str, payload: Dict) -> str:
+        """
+        Persist a job and append it to the stream of its kind.
+
+        Returns:
+            str: The job id used to query its result.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping={
+                "id": job_id,
+                "kind": kind,
+                "payload": json.dumps(payload),
+                "status": JOB_QUEUED,
+                "attempts": 0,
+                "created_at": now,
+                "updated_at": now,
+            })
+            pipe.xadd(self._stream(kind), {"job_id": job_id})
+            await pipe.execute()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """
+        Return the stored state and result of a job, or None if it is unknown.
+        """
+        raw = await self.redis_client.hgetall(self._job_key(job_id))
+        if not raw:
+            return None
+        job = {_decode(k): _decode(v) for k, v in raw.items()}
+        job["payload"] = json.loads(job["payload"])
+        job["attempts"] = int(job["attempts"])
+        if "result" in job:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    async def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping=fields)
+            if fields.get("status") in (JOB_DONE, JOB_FAILED):
+                pipe.expire(self._job_key(job_id), FINISHED_JOB_TTL)
+            await pipe.execute()
+
+    async def _ensure_group(self, kind: str):
+        try:
+            await self.redis_client.xgroup_create(self._stream(kind), self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _ack(self, kind: str, message_id, retry_job_id: Optional[str] = None, retry_at: float = 0):
+        """Acknowledge and delete a message, scheduling its job again at `retry_at` if given."""
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.xack(self._stream(kind), self.group, message_id)
+            pipe.xdel(self._stream(kind), message_id)
+            if retry_job_id is not None:
+                pipe.zadd(self._delayed(kind), {retry_job_id: retry_at})
+            await pipe.execute()
+
+    async def _keep_claimed(self, kind: str, consumer: str, message_id):
+        """Reset the idle time of a running job's message so it is not reclaimed."""
+        while True:
+            await asyncio.sleep(self.claim_idle_ms / 3000)
+            try:
+                await self.redis_client.xclaim(self._stream(kind), self.group, consumer, 0, [message_id],
+                                               justid=True)
+            except Exception as e:
+                print(f"Failed to refresh job message {message_id} ({kind}): {e}")
+
+    async def _handle(self, kind: str, consumer: str, message_id, fields, handler: Callable[[Dict], Awaitable]):
+        if not fields:
+            # The message was deleted from the stream while pending
+            await self._ack(kind, message_id)
+            return
+        job_id = _decode(fields.get(b"job_id", fields.get("job_id")))
+        job = await self.get(job_id)
+        if job is None or job["status"] in (JOB_DONE, JOB_FAILED):
+            await self._ack(kind, message_id)
+            return
+
+        attempts = job["attempts"] + 1
+        await self._update(job_id, status=JOB_RUNNING, attempts=attempts)
+        heartbeat = asyncio.create_task(self._keep_claimed(kind, consumer, message_id))
+        try:
+            result = await handler(job["payload"])
+            await self._update(job_id, status=JOB_DONE, result=json.dumps(result), error="")
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed on attempt {attempts}: {e}")
+            if attempts < self.max_attempts:
+                await self._update(job_id, status=JOB_QUEUED, error=str(e))
+                delay = self.retry_base_delay * 2 ** (attempts - 1)
+                await self._ack(kind, message_id, retry_job_id=job_id, retry_at=time.time() + delay)
+                return
+            await self._update(job_id, status=JOB_FAILED, error=str(e))
+        finally:
+            heartbeat.cancel()
+        await self._ack(kind, message_id)
+
+    async def consume(self, kind: str, handler: Callable[[Dict], Awaitable], consumer: str,
+                      stop_event: Optional[asyncio.Event] = None, batch_size: int = 1):
+        """
+        Process jobs of one kind until `stop_event` is set.
+
+        Args:
+            kind (str): The job kind, i.e. the stream to read.
+            handler (Callable): Coroutine function called with the job payload; its return value is the result.
+            consumer (str): Unique name of this consumer within the group.
+            stop_event (asyncio.Event): Set to stop consuming.
+            batch_size (int): Number of messages read per call.
+        """
+        stop_event = stop_event or asyncio.Event()
+        stream = self._stream(kind)
+        await self._ensure_group(kind)
+
+        while not stop_event.is_set():
+            try:
+                await self._promote(keys=[self._delayed(kind), stream], args=[time.time(), 100])
+                # First retry jobs abandoned by crashed consumers
+                _, claimed, *_ = await self.redis_client.xautoclaim(
+                    stream, self.group, consumer, self.claim_idle_ms, start_id="0-0", count=batch_size)
+                messages = claimed
+                if not messages:
+                    response = await self.redis_client.xreadgroup(
+                        self.group, consumer, {stream: ">"}, count=batch_size, block=1000)
+                    messages = response[0][1] if response else []
+                for message_id, fields in messages:
+                    await self._handle(kind, consumer, message_id, fields, handler)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job consumer {consumer} ({kind}) error: {e}")
+                await asyncio.sleep(1)
+
+
+async def run_workers(job_queue: JobQueue, handlers: Dict[str, Callable[[Dict], Awaitable]],
+                      concurrency: int = 1, stop_event: Optional[asyncio.Event] = None):
+    """
+    Run `concurrency` consumers for every job kind in `handlers` until `stop_event` is set.
+    """
+    stop_event = stop_event or asyncio.Event()
+    base_name = instance_id()
+    consumers: List[Awaitable] = [
+        job_queue.consume(kind, handler, f"{base_name}:{kind}:{i}", stop_event)
+        for kind, handler in handlers.items()
+        for i in range(concurrency)
+    ]
+    await asyncio.gather(*consumers)
+
+
+# Job queue shared by the API and the worker processes
+job_queue = JobQueue(redis_client, max_attempts=job_max_attempts)
@@ -0,0 +1,74 @@
+# utils/lease.py
+
+import os
+import socket
+import uuid
+from typing import Optional
+
+# Only extend / delete a lease that is still held by the caller
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def decode(value):
+    """Decode a Redis reply to str, leaving other values untouched."""
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def instance_id() -> str:
+    """Unique name of a lease holder: host, process and a random suffix."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    """
+    A Redis key held by at most one owner until it expires.
+
+    The owner acquires it with SET NX and keeps it by renewing it before
+    `ttl` runs out; renewing and releasing only act on a lease still held by
+    the owner, so an owner whose lease expired cannot extend or delete the
+    lease of its successor.
+    """
+
+    def __init__(self, redis_client, key: str, owner: Optional[str] = None, ttl: int = 60):
+        """
+        Initialize the lease.
+
+        Args:
+            redis_client: The async Redis client.
+            key (str): The Redis key of the lease.
+            owner (str): Value identifying the holder. Defaults to a new `instance_id()`.
+            ttl (int): Lifetime of the lease in seconds.
+        """
+        self.redis_client = redis_client
+        self.key = key
+        self.owner = owner or instance_id()
+        self.ttl = ttl
+        self._renew = redis_client.register_script(_RENEW_SCRIPT)
+        self._release = redis_client.register_script(_RELEASE_SCRIPT)
+
+    async def acquire(self) -> bool:
+        """Take the lease if nobody holds it. Returns True if it was taken."""
+        return bool(await self.redis_client.set(self.key, self.owner, nx=True, ex=self.ttl))
+
+    async def renew(self) -> bool:
+        """Extend the lease. Returns False if it is no longer held by the owner."""
+        return bool(await self._renew(keys=[self.key], args=[self.owner, self.ttl]))
+
+    async def hold(self) -> bool:
+        """Renew the lease, or acquire it if it is free. Returns True while it is held."""
+        return await self.renew() or await self.acquire()
+
+    async def release(self) -> bool:
+        """Delete the lease if it is still held by the owner."""
+        return bool(await self._release(keys=[self.key], args=[self.owner]))
@@ -0,0 +1,169 @@
+# utils/metrics.py
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """Bucketed observations per label set, rendered with _bucket, _sum and _count series."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Gauge:
+    """A value read from a callback at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Dict[Tuple[str, ...], float]],
+                 labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self):
+        for key, value in sorted(self.collect().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class MetricsRegistry:
+    """
+    A minimal in-process metrics registry rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, collect, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, collect, labelnames))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Failed to collect metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+# Registry exposed by the FastAPI /metrics endpoint
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram(
+    "csb_stage_duration_seconds", "Duration of pipeline stages in seconds.", ["stage"])
+stage_errors = registry.counter(
+    "csb_stage_errors_total", "Pipeline stages that raised an error.", ["stage"])
+llm_tokens = registry.counter(
+    "csb_llm_tokens_total", "LLM tokens used, by stage and token type.", ["stage", "type"])
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Time a pipeline stage and record it in `csb_stage_duration_seconds`.
+
+    Yields a dict whose "seconds" entry holds the duration once the block exits.
+    """
+    timing = {}
+    start = time.perf_counter()
+    try:
+        yield timing
+    except Exception:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        timing["seconds"] = time.perf_counter() - start
+        stage_duration.observe(timing["seconds"], stage=stage)
+
+
+def record_token_usage(stage: str, input_tokens: Optional[int], output_tokens: Optional[int]):
+    """
+    Count the prompt and completion tokens used by an LLM call of a stage.
+    """
+    if input_tokens:
+        llm_tokens.inc(input_tokens, stage=stage, type="prompt")
+    if output_tokens:
+        llm_tokens.inc(output_tokens, stage=stage, type="completion")
+
+
+def record_message_usage(stage: str, messages):
+    """Count the tokens reported in the usage metadata of LangChain messages."""
+    input_tokens = output_tokens = 0
+    for message in messages:
+        usage = getattr(message, "usage_metadata", None) or {}
+        input_tokens += usage.get("input_tokens", 0)
+        output_tokens += usage.get("output_tokens", 0)
+    record_token_usage(stage, input_tokens, output_tokens)
@@ -0,0 +1,259 @@
+# utils/rate_limiter.py
+
+import asyncio
+import random
+import time
+from typing import Callable, Dict, Optional, Tuple, Type, Union
+
+# Take a token from a bucket stored in a Redis hash. Returns the seconds to
+# wait before a token is available, as a string since Redis truncates numbers
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('hmget', KEYS[1], 'tokens', 'updated_at', 'blocked_until')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+local blocked_until = tonumber(state[3]) or 0
+if blocked_until > now then
+    return tostring(blocked_until - now)
+end
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('expire', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+# Empty a bucket stored in Redis and refuse tokens until ARGV[2]
+_BLOCK_SCRIPT = """
+local now = tonumber(ARGV[1])
+local until_time = tonumber(ARGV[2])
+local blocked_until = tonumber(redis.call('hget', KEYS[1], 'blocked_until')) or 0
+if until_time > blocked_until then
+    blocked_until = until_time
+end
+redis.call('hset', KEYS[1], 'tokens', '0', 'updated_at', tostring(now), 'blocked_until', tostring(blocked_until))
+redis.call('expire', KEYS[1], math.ceil(blocked_until - now + tonumber(ARGV[3])) + 60)
+return 1
+"""
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 900.0) -> float:
+    """
+    Exponential backoff with jitter: a random delay between half and all of
+    the exponential step, so retries spread out but still grow.
+
+    Args:
+        attempt (int): Number of the retry, starting at 1.
+        base (float): Delay of the first retry in seconds.
+        cap (float): Upper bound of the delay in seconds.
+
+    Returns:
+        float: Seconds to wait before the retry.
+    """
+    step = min(cap, base * 2 ** (attempt - 1))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket: `capacity` calls may burst, refilled at `capacity / period` per second.
+    """
+
+    def __init__(self, capacity: int, period: float):
+        """
+        Initialize the bucket.
+
+        Args:
+            capacity (int): Number of calls allowed per period.
+            period (float): Length of the rate limit window in seconds.
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if self.blocked_until > now:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def block(self, seconds: float):
+        """
+        Empty the bucket and refuse calls for `seconds`, e.g. after a rate limit response.
+        """
+        self.tokens = 0
+        self.updated_at = time.monotonic()
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RedisTokenBucket:
+    """
+    A token bucket kept in Redis, so that every process calling an API with
+    the same account shares one budget. The bucket state is updated by a Lua
+    script, so concurrent callers never take the same token. If Redis is
+    unreachable, calls fall back to a local bucket with the same budget.
+    """
+
+    def __init__(self, redis_client, key: str, capacity: int, period: float):
+        """
+        Initialize the bucket.
+
+        Args:
+            redis_client: The async Redis client.
+            key (str): The Redis key of the bucket.
+            capacity (int): Number of calls allowed per period.
+            period (float): Length of the rate limit window in seconds.
+        """
+        self.redis_client = redis_client
+        self.key = key
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+        self.local = TokenBucket(capacity, period)
+        self._take = redis_client.register_script(_TAKE_SCRIPT)
+        self._block = redis_client.register_script(_BLOCK_SCRIPT)
+
+    async def try_acquire(self) -> float:
+        """
+        Take a token if one is available.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        wait = await self._take(keys=[self.key], args=[self.capacity, self.rate, time.time()])
+        return float(wait)
+
+    async def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+        while True:
+            try:
+                wait = await self.try_acquire()
+            except Exception as e:
+                print(f"Shared rate limit {self.key} unavailable, using the local budget: {e}")
+                await self.local.acquire()
+                return
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def block(self, seconds: float):
+        """
+        Empty the bucket and refuse calls for `seconds` in every process.
+        """
+        await self.local.block(seconds)
+        now = time.time()
+        try:
+            await self._block(keys=[self.key], args=[now, now + seconds, self.period])
+        except Exception as e:
+            print(f"Failed to pause shared rate limit {self.key}: {e}")
+
+
+class RateLimiter:
+    """
+    Per-endpoint token buckets shared by every caller of an API client.
+
+    With a Redis client the buckets are shared by every process, so workers
+    calling the API with the same account share its budget; otherwise they
+    are kept in the process. Calls run as fast as their endpoint's budget allows. When a call fails
+    with a rate limit error the endpoint is paused, until the reset time
+    reported by the server if known, otherwise with exponential backoff and
+    jitter, and the call is retried.
+    """
+
+    def __init__(self, budgets: Dict[str, Tuple[int, float]], rate_limit_errors: Tuple[Type[Exception], ...] = (),
+                 reset_time: Optional[Callable[[Exception], Optional[float]]] = None, max_retries: int = 5,
+                 backoff_base: float = 5.0, default_budget: Tuple[int, float] = (50, 15 * 60),
+                 redis_client=None, namespace: str = "csb_rate"):
+        """
+        Initialize the limiter.
+
+        Args:
+            budgets (Dict[str, Tuple[int, float]]): Calls allowed per window, in seconds, for each endpoint.
+            rate_limit_errors (Tuple[Type[Exception], ...]): Exceptions signalling a rate limit response.
+            reset_time (Callable): Returns the UNIX time at which a rate limit error resets, if known.
+            max_retries (int): Retries of a rate limited call before the error is raised.
+            backoff_base (float): First backoff delay in seconds when no reset time is known.
+            default_budget (Tuple[int, float]): Budget of endpoints missing from `budgets`.
+            redis_client: The async Redis client sharing the buckets across processes, or None.
+            namespace (str): Prefix of the Redis keys of the buckets.
+        """
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.buckets = {endpoint: self._new_bucket(endpoint, budget) for endpoint, budget in budgets.items()}
+        self.rate_limit_errors = rate_limit_errors
+        self.reset_time = reset_time
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.default_budget = default_budget
+
+    def _new_bucket(self, endpoint: str, budget: Tuple[int, float]) -> Union[TokenBucket, RedisTokenBucket]:
+        if self.redis_client is None:
+            return TokenBucket(*budget)
+        return RedisTokenBucket(self.redis_client, f"{self.namespace}:{endpoint}", *budget)
+
+    def bucket(self, endpoint: str) -> Union[TokenBucket, RedisTokenBucket]:
+        if endpoint not in self.buckets:
+            self.buckets[endpoint] = self._new_bucket(endpoint, self.default_budget)
+        return self.buckets[endpoint]
+
+    def _is_rate_limited(self, error: Exception) -> bool:
+        if isinstance(error, self.rate_limit_errors):
+            return True
+        return "429" in str(error) or "rate limit" in str(error).lower()
+
+    async def call(self, endpoint: str, func, *args, **kwargs):
+        """
+        Await `func(*args, **kwargs)` within the endpoint's budget.
+
+        Args:
+            endpoint (str): Name of the budget the call counts against.
+            func: The coroutine function to call.
+
+        Returns:
+            The result of the call.
+        """
+        bucket = self.bucket(endpoint)
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if not self._is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+
+                reset_at = self.reset_time(e) if self.reset_time else None
+                if reset_at:
+                    delay = max(0.0, reset_at - time.time()) + random.uniform(0, 1)
+                else:
+                    delay = backoff_delay(attempt, self.backoff_base)
+                print(f"Rate limited on {endpoint}, retrying in {delay:.1f} seconds")
+                await bucket.block(delay)
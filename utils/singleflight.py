@@ -0,0 +1,94 @@
+# utils/singleflight.py
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+from utils.metrics import registry
+
+coalesced_calls = registry.counter(
+    "csb_singleflight_coalesced_total", "Calls that shared the result of an identical in-flight call.", ["name"])
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls with the same key into one execution.
+
+    The first caller of a key starts the computation as a task; callers
+    arriving while it runs await the same task and receive its result or
+    exception. The computation is shielded, so a cancelled caller does not
+    cancel it for the others. Coalescing is per process and per event loop.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the group.
+
+        Args:
+            name (str): Label of the group in the coalesced calls metric.
+        """
+        self.name = name
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the result of `func()`, sharing it with concurrent calls of the same key.
+
+        Args:
+            key (str): Identifies equivalent calls.
+            func (Callable): Coroutine function computing the result.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(func())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            coalesced_calls.inc(name=self.name)
+        return await asyncio.shield(flight)
+
+    def __len__(self):
+        return len(self._flights)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SyncSingleFlight:
+    """
+    Thread-based version of `SingleFlight` for blocking calls.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        """
+        Return the result of `func()`, sharing it with concurrent calls of the same key.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            coalesced_calls.inc(name=self.name)
+            call.done.wait()
+        else:
+            try:
+                call.result = func()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
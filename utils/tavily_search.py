@@ -1,30 +1,134 @@
 # utils/tavily_search.py
 
+import hashlib
 import os
 
 from dotenv import load_dotenv
-from tavily import TavilyClient
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-from config.config import tavily_api_key
+from config.config import tavily_api_key, redis_client, search_cache_size, search_cache_ttl, search_cache_redis
+from utils.cache import TieredCache
+from utils.http_clients import http_clients
+from utils.singleflight import SingleFlight, SyncSingleFlight
 
 # Load environment variables
 load_dotenv()
 
+TAVILY_API_URL = "https://api.tavily.com"
+
+
+def _tavily_request(api_key: str, query: str, search_depth: str, **kwargs):
+    headers = {"Authorization": f"Bearer {api_key}"}
+    payload = {"api_key": api_key, "query": query, "search_depth": search_depth, **kwargs}
+    return headers, payload
+
+
+class TavilyHttpClient:
+    """
+    Calls the Tavily search API over the shared, pooled "tavily" HTTP client
+    instead of opening a new connection per request as the SDK does.
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.http = http_clients.client("tavily", base_url=TAVILY_API_URL)
+
+    def search(self, query: str, search_depth: str = "basic", **kwargs) -> Dict:
+        headers, payload = _tavily_request(self.api_key, query, search_depth, **kwargs)
+        response = self.http.post("/search", json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+
+class AsyncTavilyHttpClient:
+    """
+    Async version of `TavilyHttpClient`.
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.http = http_clients.async_client("tavily", base_url=TAVILY_API_URL)
+
+    async def search(self, query: str, search_depth: str = "basic", **kwargs) -> Dict:
+        headers, payload = _tavily_request(self.api_key, query, search_depth, **kwargs)
+        response = await self.http.post("/search", json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def extract(self, urls: List[str]) -> Dict:
+        response = await self.http.post("/extract", json={"api_key": self.api_key, "urls": urls},
+                                        headers={"Authorization": f"Bearer {self.api_key}"})
+        response.raise_for_status()
+        return response.json()
+
 
 class TavilySearchUtil:
     """
     A utility for performing searches using the Tavily API and processing the results.
     """
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, cache: Optional[TieredCache] = None, cache_ttl: Optional[int] = None):
         """
         Initialize the TavilySearchUtil with the provided API key.
 
         Args:
             api_key (str): The Tavily API key for authenticating requests.
+            cache (TieredCache): Optional cache for search results. The synchronous
+                `search` only uses its local tier; `asearch` also uses Redis.
+            cache_ttl (int): Lifetime of cached search results in seconds.
+        """
+        self.api_key = api_key
+        self._client = None
+        self._async_client = None
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Identical searches running concurrently share one API call
+        self._flights = SingleFlight("tavily_search")
+        self._sync_flights = SyncSingleFlight("tavily_search")
+
+    @property
+    def client(self) -> TavilyHttpClient:
+        """The synchronous Tavily client, created on first use."""
+        if self._client is None:
+            self._client = TavilyHttpClient(self.api_key)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def async_client(self) -> AsyncTavilyHttpClient:
+        """The asynchronous Tavily client, created on first use."""
+        if self._async_client is None:
+            self._async_client = AsyncTavilyHttpClient(self.api_key)
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, client):
+        self._async_client = client
+
+    @staticmethod
+    def cache_key(query: str, search_depth: str = "basic") -> str:
+        """
+        Build the cache key of a search from its normalized query and depth.
         """
-        self.client = TavilyClient(api_key=api_key)
+        normalized = " ".join(query.split()).lower().rstrip("?!. ")
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{search_depth}:{digest}"
+
+    def cache_stats(self) -> Dict:
+        """
+        Return the hit/miss counters of the search cache.
+        """
+        total = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": self.cache_hits / total if total else 0.0,
+        }
 
     def search(self, query: str, search_depth: str = "basic") -> List[Dict]:
         """
@@ -37,12 +141,77 @@ class TavilySearchUtil:
         Returns:
             List[Dict]: A list of search results with titles, URLs, and content.
         """
+        key = self.cache_key(query, search_depth)
+        if self.cache is not None:
+            cached = self.cache.local.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+            self.cache_misses += 1
+
+        return self._sync_flights.do(key, lambda: self._search(key, query, search_depth))
+
+    def _search(self, key: str, query: str, search_depth: str) -> List[Dict]:
         try:
             response = self.client.search(query, search_depth=search_depth)
-            return response.get("results", [])
+            results = response.get("results", [])
+        except Exception as e:
+            raise RuntimeError(f"Failed to perform search: {str(e)}")
+
+        if self.cache is not None:
+            self.cache.local.set(key, results, self.cache_ttl)
+        return results
+
+    async def asearch(self, query: str, search_depth: str = "basic") -> List[Dict]:
+        """
+        Perform a search query using the Tavily API without blocking the event loop.
+
+        Args:
+            query (str): The search query string.
+            search_depth (str): Depth of the search. Options: "basic", "advanced".
+
+        Returns:
+            List[Dict]: A list of search results with titles, URLs, and content.
+        """
+        key = self.cache_key(query, search_depth)
+        if self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+            self.cache_misses += 1
+
+        return await self._flights.do(key, lambda: self._asearch(key, query, search_depth))
+
+    async def _asearch(self, key: str, query: str, search_depth: str) -> List[Dict]:
+        try:
+            response = await self.async_client.search(query, search_depth=search_depth)
+            results = response.get("results", [])
         except Exception as e:
             raise RuntimeError(f"Failed to perform search: {str(e)}")
 
+        if self.cache is not None:
+            await self.cache.set(key, results, self.cache_ttl)
+        return results
+
+    async def aextract(self, urls: List[str]) -> List[Dict]:
+        """
+        Fetch the content of web pages with the Tavily extract API.
+
+        Args:
+            urls (List[str]): The pages to fetch.
+
+        Returns:
+            List[Dict]: One entry per page that could be fetched, with its "url" and "raw_content".
+        """
+        if not urls:
+            return []
+        try:
+            response = await self.async_client.extract(urls)
+        except Exception as e:
+            raise RuntimeError(f"Failed to extract content: {str(e)}")
+        return response.get("results", [])
+
     def extract_urls(self, results: List[Dict]) -> List[str]:
         """
         Extract URLs from the Tavily search results.
@@ -67,43 +236,11 @@ class TavilySearchUtil:
         """
         return [result.get("content", "") for result in results if "content" in result]
 
-    def search_and_judge(self, query: str, keywords: List[str], search_depth: str = "basic") -> bool:
-        """
-        Perform a search query and judge whether the content matches the specified keywords.
-
-        Args:
-            query (str): The search query string.
-            keywords (List[str]): A list of keywords to look for in the search content.
-            search_depth (str): Depth of the search. Options: "basic", "advanced".
-
-        Returns:
-            bool: True if any of the keywords are found in the search content; otherwise, False.
-        """
-        results = self.search(query, search_depth=search_depth)
-        print(results)
-        content_list = self.extract_content(results)
-        print(content_list)
-        combined_content = " ".join(content_list)
-        return any(keyword in combined_content for keyword in keywords)
-
 
 # Initialize Tavily Search Utility
-search_util = TavilySearchUtil(api_key=tavily_api_key)
-
-# Example usage:
-if __name__ == "__main__":
-    # Replace with your Tavily API key
-    TAVILY_API_KEY = tavily_api_key
-
-    # Initialize the utility
-    search_util = TavilySearchUtil(api_key=TAVILY_API_KEY)
-
-    # Define a query and keywords
-    query = "What is the weather in Bangkok tomorrow?"
-    keywords = ["sunny", "clear skies", "rain"]
-
-    # Perform the search and judgment
-    is_sunny = search_util.search_and_judge(query=query, keywords=keywords)
-
-    # Output the judgment result
-    print("Judgment result:", "Yes, it matches the keywords." if is_sunny else "No, it doesn't match the keywords.")
+search_cache = TieredCache(
+    "csb_search",
+    redis_client if search_cache_redis else None,
+    maxsize=search_cache_size,
+)
+search_util = TavilySearchUtil(api_key=tavily_api_key, cache=search_cache, cache_ttl=search_cache_ttl)
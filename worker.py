@@ -0,0 +1,50 @@
+# worker.py
+
+import argparse
+import asyncio
+
+from config.config import job_worker_concurrency
+from llm.judge import ajudge_bet
+from llm.validate import avalidating_market
+from twitter.tweet import post_tweet
+from utils.job_queue import job_queue, run_workers
+
+
+async def handle_validate_market(payload: dict):
+    analyze_result, steps = await avalidating_market(payload["description"])
+    return {"analyze_result": analyze_result, "steps": steps}
+
+
+async def handle_judge_bet(payload: dict):
+    return await ajudge_bet(payload.get("description", ""), payload["address"], payload.get("urls"))
+
+
+async def handle_post_tweet(payload: dict):
+    result = await post_tweet(payload["message"])
+    if not result.get("success"):
+        raise RuntimeError(result.get("message"))
+    return result
+
+
+# Job kinds served by the worker processes
+HANDLERS = {
+    "validate_market": handle_validate_market,
+    "judge_bet": handle_judge_bet,
+    "post_tweet": handle_post_tweet,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run CryptoSage job workers.")
+    parser.add_argument("kinds", nargs="*", help=f"Job kinds to process: {', '.join(HANDLERS)} (default: all).")
+    parser.add_argument("--concurrency", type=int, default=job_worker_concurrency,
+                        help="Concurrent consumers per job kind.")
+    args = parser.parse_args()
+
+    unknown = set(args.kinds) - set(HANDLERS)
+    if unknown:
+        parser.error(f"unknown job kinds: {', '.join(sorted(unknown))}")
+
+    handlers = {kind: HANDLERS[kind] for kind in (args.kinds or HANDLERS)}
+    print(f"Starting workers for: {', '.join(handlers)}")
+    asyncio.run(run_workers(job_queue, handlers, concurrency=args.concurrency))